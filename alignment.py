@@ -0,0 +1,170 @@
+import os
+import json
+import numpy as np
+from audio_io import iter_wav_blocks, wav_info
+
+# Alinhamento temporal (atraso e ganho) entre uma referência e um sinal processado,
+# antes das métricas. O atraso é estimado pela correlação cruzada via FFT sobre o
+# áudio decimado e refinado na taxa original em torno da estimativa.
+#
+# Convenção: lag > 0 significa que o processado está atrasado, isto é,
+# processed[n + lag] ~ gain_inv * reference[n]; `gain` escala o processado para
+# o nível da referência (mínimos quadrados).
+
+DECIMATION = 8 # Fator de decimação da busca grosseira
+REFINE_SAMPLES = 1 << 19 # Trecho (~12 s a 44.1 kHz) usado no refinamento em taxa cheia
+CACHE_PATH = "output/cache/alignment.json"
+
+# Cache em memória dos pares de arquivos (espelha o arquivo CACHE_PATH)
+_file_cache = {}
+
+def _decimate_mean(x, factor):
+    """Decimação por média de grupos de `factor` amostras (filtro caixa, suficiente para a busca grosseira)."""
+    n = len(x) - len(x) % factor
+    return np.asarray(x[:n], dtype=np.float64).reshape(-1, factor).mean(axis=1)
+
+def xcorr_lag(reference, processed, max_lag=None):
+    """
+    Atraso de `processed` em relação a `reference` pelo pico da correlação cruzada (FFT).
+
+    Args:
+        max_lag: Limita a busca a |lag| <= max_lag (None = qualquer atraso).
+    """
+    n_fft = 1 << int(np.ceil(np.log2(len(reference) + len(processed))))
+    xcorr = np.fft.irfft(np.fft.rfft(processed, n_fft) * np.conj(np.fft.rfft(reference, n_fft)), n_fft)
+
+    # Índices >= n_fft/2 correspondem a atrasos negativos
+    lags = np.arange(n_fft)
+    lags[n_fft // 2:] -= n_fft
+    if max_lag is not None:
+        xcorr = np.where(np.abs(lags) <= max_lag, xcorr, -np.inf)
+    return int(lags[np.argmax(xcorr)])
+
+def overlap(ref_len, proc_len, lag):
+    """Trecho comum após o alinhamento: (início na referência, início no processado, tamanho)."""
+    ref_start = max(0, -lag)
+    proc_start = ref_start + lag
+    n = max(0, min(ref_len - ref_start, proc_len - proc_start))
+    return ref_start, proc_start, n
+
+def _refine(reference, processed, coarse_lag, radius):
+    """
+    Refina o atraso na taxa original: testa os atrasos em coarse_lag +/- radius
+    sobre o trecho mais energético da referência. Retorna (lag, gain).
+    """
+    # Janela dentro do trecho comum, com margem de `radius` nas bordas:
+    # todos os atrasos testados leem amostras existentes nos dois sinais
+    ref_start, _, n_common = overlap(len(reference), len(processed), coarse_lag)
+    lo, hi = ref_start + radius, ref_start + n_common - radius
+    if hi <= lo:
+        return coarse_lag, 1.0
+    n = min(hi - lo, REFINE_SAMPLES)
+
+    # Trecho da referência com mais energia (em passos de n/8)
+    starts = np.arange(lo, hi - n + 1, max(n // 8, 1))
+    energy = [np.dot(reference[s:s + n], reference[s:s + n]) for s in starts]
+    start = int(starts[int(np.argmax(energy))])
+    ref = np.asarray(reference[start:start + n], dtype=np.float64)
+
+    best = (-np.inf, coarse_lag, 1.0)
+    for lag in range(coarse_lag - radius, coarse_lag + radius + 1):
+        proc = np.asarray(processed[start + lag:start + lag + n], dtype=np.float64)
+        score = np.dot(ref, proc)
+        if score > best[0]:
+            power = np.dot(proc, proc)
+            best = (score, lag, score / power if power > 0 else 1.0)
+
+    return best[1], float(best[2])
+
+def estimate_alignment(reference, processed, decimation=DECIMATION, max_lag=None):
+    """
+    Estima o atraso e o ganho entre a referência e o sinal processado.
+
+    A correlação cruzada é feita via FFT no áudio decimado (busca grosseira sobre
+    todos os atrasos) e refinada na taxa original em +/- 2 * decimation amostras.
+
+    Args:
+        reference: Sinal de referência (N,).
+        processed: Sinal processado (M,).
+        decimation: Fator de decimação da busca grosseira (1 = taxa cheia).
+        max_lag: Maior |atraso| considerado, em amostras (None = qualquer).
+    Returns:
+        (lag, gain): processed[n + lag] * gain ~ reference[n].
+    """
+    coarse = xcorr_lag(_decimate_mean(reference, decimation), _decimate_mean(processed, decimation),
+                       None if max_lag is None else max_lag // decimation + 1)
+    return _refine(reference, processed, coarse * decimation, 2 * decimation)
+
+def align(reference, processed, lag, gain=1.0):
+    """Retorna (referência, processado * gain) recortados ao trecho comum alinhado."""
+    ref_start, proc_start, n = overlap(len(reference), len(processed), lag)
+    return reference[ref_start:ref_start + n], processed[proc_start:proc_start + n] * gain
+
+def _load_file_cache():
+    if not _file_cache and os.path.exists(CACHE_PATH):
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            _file_cache.update(json.load(f))
+    return _file_cache
+
+def _decimated_file(path, factor, block_size=1 << 16):
+    """Lê o WAV (mono) em blocos e devolve a versão decimada, sem carregar o arquivo inteiro."""
+    parts = [_decimate_mean(block, factor) for _, block in iter_wav_blocks(path, block_size)]
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+def _file_excerpt(path, start, n):
+    """Trecho [start, start + n) do WAV (mono), lido em blocos."""
+    out = []
+    for _, block in iter_wav_blocks(path, n, start=max(start, 0)):
+        out.append(block.copy())
+        break
+    return out[0] if out else np.zeros(0, dtype=np.float32)
+
+def align_files(reference_path, processed_path, decimation=DECIMATION):
+    """
+    Atraso e ganho entre dois arquivos WAV (mono), com cache por par de arquivos.
+
+    O resultado é guardado em CACHE_PATH com o tamanho e a data de modificação
+    de cada arquivo; se algum deles mudar, o alinhamento é recalculado.
+    A busca grosseira lê os arquivos em blocos (decimados), e o refinamento lê
+    apenas o trecho necessário.
+
+    Returns:
+        (lag, gain): Ver estimate_alignment.
+    """
+    def stamp(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime]
+
+    key = f"{os.path.abspath(reference_path)}|{os.path.abspath(processed_path)}|{decimation}"
+    cache = _load_file_cache()
+    entry = cache.get(key)
+    stamps = [stamp(reference_path), stamp(processed_path)]
+    if entry is not None and entry["stamps"] == stamps:
+        return entry["lag"], entry["gain"]
+
+    coarse = xcorr_lag(_decimated_file(reference_path, decimation),
+                       _decimated_file(processed_path, decimation)) * decimation
+
+    # Refinamento: trecho central do intervalo comum + a janela correspondente do processado
+    radius = 2 * decimation
+    _, ref_len, _ = wav_info(reference_path)
+    _, proc_len, _ = wav_info(processed_path)
+    ref_start, _, n_common = overlap(ref_len, proc_len, coarse)
+    n = min(n_common - 2 * radius, REFINE_SAMPLES)
+    if n > 0:
+        start = ref_start + radius + (n_common - 2 * radius - n) // 2
+        reference = _file_excerpt(reference_path, start, n)
+        processed = _file_excerpt(processed_path, start + coarse - radius, n + 2 * radius)
+
+        # No trecho lido, o atraso grosseiro corresponde a `radius`
+        local_lag, gain = _refine(reference, processed, radius, radius)
+        lag = coarse + local_lag - radius
+    else:
+        lag, gain = coarse, 1.0
+
+    cache[key] = {"lag": int(lag), "gain": float(gain), "stamps": stamps}
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+
+    return int(lag), float(gain)
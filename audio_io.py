@@ -1,29 +1,151 @@
+import wave
 import numpy as np
 from scipy.io import wavfile
 
-def load_wav(filename):
+# Tamanho padrão dos blocos de leitura/escrita em streaming (amostras por canal)
+BLOCK_SIZE = 65536
+
+# Fator de normalização para cada tipo PCM inteiro
+_INT_SCALES = {
+    np.dtype(np.int16): 1.0 / 32768.0,
+    np.dtype(np.int32): 1.0 / 2147483648.0,
+}
+
+def _open_wav(filename):
+    """
+    Abre o WAV mapeado em memória (nada é lido até os blocos serem acessados).
+    Formatos sem suporte a mmap no scipy (ex: PCM 24 bits) são lidos por completo.
+    """
+    try:
+        return wavfile.read(filename, mmap=True)
+    except ValueError:
+        return wavfile.read(filename)
+
+def _convert_block(block, out):
+    """Converte um bloco PCM/float para float32 normalizado (-1.0 a 1.0) dentro de `out`."""
+    if block.dtype == np.uint8:
+        # PCM 8 bits é sem sinal (centro em 128)
+        np.subtract(block, 128, out=out, dtype=np.float32)
+        out *= 1.0 / 128.0
+    else:
+        np.copyto(out, block, casting="unsafe")
+        scale = _INT_SCALES.get(block.dtype)
+        if scale is not None:
+            out *= scale
+    return out
+
+def iter_wav_blocks(filename, block_size=BLOCK_SIZE, mono=True, start=0):
+    """
+    Lê um arquivo WAV em blocos float32 normalizados, sem carregá-lo inteiro.
+
+    O arquivo é mapeado em memória e cada bloco é convertido dentro de buffers
+    pré-alocados, então a memória usada não depende do tamanho do arquivo.
+    O array retornado a cada iteração é reutilizado: copie-o se precisar guardá-lo.
+
+    Args:
+        filename: Caminho do arquivo WAV.
+        block_size: Número de amostras (por canal) de cada bloco.
+        mono: Se True, arquivos multicanal são convertidos para mono (média dos canais).
+        start: Primeira amostra lida (ex.: para compensar um atraso entre arquivos).
+    Yields:
+        (fs, bloco): Taxa de amostragem e bloco float32 (N,) ou (N, C).
+    """
+    fs, data = _open_wav(filename)
+
+    channels = data.shape[1] if data.ndim > 1 else 1
+    work = np.empty((block_size,) + data.shape[1:], dtype=np.float32)
+    mono_out = np.empty(block_size, dtype=np.float32) if (mono and channels > 1) else None
+
+    try:
+        for pos in range(start, len(data), block_size):
+            block = data[pos:pos + block_size]
+            n = len(block)
+            out = _convert_block(block, work[:n])
+
+            if mono_out is not None:
+                # Se estéreo, converte para mono (média dos canais)
+                out = np.mean(out, axis=1, out=mono_out[:n])
+
+            yield fs, out
+    finally:
+        del data # Libera o mapeamento do arquivo
+
+def wav_info(filename):
+    """Retorna (taxa_amostragem, num_amostras, num_canais) sem ler os dados de áudio."""
+    fs, data = _open_wav(filename)
+    channels = data.shape[1] if data.ndim > 1 else 1
+    return fs, len(data), channels
+
+def load_wav(filename, mono=True):
     """
     Carrega um arquivo WAV e o converte para float32 normalizado (-1.0 a 1.0).
     Retorna: (taxa_amostragem, dados_audio)
-    """
-    fs, data = wavfile.read(filename)
-    
-    # Se estéreo, converte para mono (média dos canais) para simplificar a validação inicial
-    if len(data.shape) > 1:
-        data = np.mean(data, axis=1)
-
-    # Normalização dependendo do tipo de dado original
-    if data.dtype == np.int16:
-        data = data.astype(np.float32) / 32768.0
-    elif data.dtype == np.int32:
-        data = data.astype(np.float32) / 2147483648.0
     
+    Args:
+        mono: Se True (padrão), converte arquivos multicanal para mono (média dos
+              canais). Se False, retorna (N, C) para arquivos multicanal.
+    """
+    fs, num_samples, channels = wav_info(filename)
+
+    shape = (num_samples,) if (mono or channels == 1) else (num_samples, channels)
+    data = np.empty(shape, dtype=np.float32)
+    start = 0
+    for fs, block in iter_wav_blocks(filename, mono=mono):
+        data[start:start + len(block)] = block
+        start += len(block)
+
     return fs, data
 
+class WavWriter:
+    def __init__(self, filename, fs, channels=1, block_size=BLOCK_SIZE):
+        """
+        Escreve um WAV int16 incrementalmente, à medida que os blocos chegam.
+        O cabeçalho (tamanhos RIFF/data) é corrigido no `close`.
+
+        Args:
+            filename: Caminho do arquivo de saída.
+            fs: Taxa de amostragem.
+            channels: Número de canais.
+            block_size: Tamanho dos buffers de conversão pré-alocados.
+        """
+        self.channels = channels
+        self.block_size = block_size
+
+        self._wav = wave.open(filename, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(int(fs))
+
+        shape = (block_size, channels) if channels > 1 else (block_size,)
+        self._scratch = np.empty(shape, dtype=np.float32)
+        self._pcm = np.empty(shape, dtype=np.int16)
+
+    def write(self, block):
+        """Converte um bloco float (-1.0 a 1.0) para int16 e o escreve no arquivo."""
+        for start in range(0, len(block), self.block_size):
+            part = block[start:start + self.block_size]
+            n = len(part)
+            scratch = self._scratch[:n]
+            pcm = self._pcm[:n]
+
+            # Clip para evitar distorção digital e conversão para int16, sem cópias extras
+            np.clip(part, -1.0, 1.0, out=scratch)
+            scratch *= 32767
+            np.copyto(pcm, scratch, casting="unsafe")
+
+            self._wav.writeframes(pcm)
+
+    def close(self):
+        self._wav.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
 def save_wav(filename, fs, data):
     """Salva um array float32 como arquivo WAV int16."""
-    # Clip para evitar distorção digital
-    data = np.clip(data, -1.0, 1.0)
-    # Converter para int16
-    data_int16 = (data * 32767).astype(np.int16)
-    wavfile.write(filename, fs, data_int16)
\ No newline at end of file
+    channels = data.shape[1] if data.ndim > 1 else 1
+    with WavWriter(filename, fs, channels) as writer:
+        writer.write(data)
@@ -0,0 +1,78 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from instrumentation import get_logger, default_profiler
+
+logger = get_logger(__name__)
+
+# Áudio seco compartilhado, anexado uma vez em cada processo do pool
+_worker_audio = {}
+
+def _attach_audio(shm_name, shape, dtype):
+    """Inicializador do worker: anexa o bloco de memória compartilhada (sem cópia)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_audio["shm"] = shm # Mantém a referência viva enquanto o worker existir
+    _worker_audio["data"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    default_profiler.drain() # Descarta registros herdados do processo pai (fork)
+
+def _run_part(render_fn, fs, task, part):
+    """
+    Executa uma parte de uma tarefa no worker e mede o tempo de parede.
+    Os registros do profiler do worker voltam junto com o resultado.
+    """
+    t0 = time.perf_counter()
+    output = render_fn(_worker_audio["data"], fs, task, part)
+    return output, time.perf_counter() - t0, default_profiler.drain()
+
+def render_batch(tasks, audio, fs, render_fn, parts_fn=None, max_workers=None):
+    """
+    Renderiza tarefas independentes em paralelo com um ProcessPoolExecutor.
+
+    O áudio seco é copiado uma única vez para memória compartilhada e anexado por
+    cada worker, em vez de ser serializado (pickle) junto com cada tarefa. Uma
+    tarefa pode ser dividida em partes independentes (ex.: canais L e R de um
+    reverb estéreo), que rodam em workers diferentes e são empilhadas em colunas.
+
+    Args:
+        tasks: Lista de tarefas (dicts com a chave "name").
+        audio: Áudio seco compartilhado entre as tarefas.
+        fs: Taxa de amostragem.
+        render_fn: Função de nível de módulo render_fn(audio, fs, task, part) -> array.
+        parts_fn: Função parts_fn(task) -> lista de partes. Padrão: uma parte (None).
+        max_workers: Número de processos (padrão: os.cpu_count()).
+    Returns:
+        dict: name -> (saída, tempo de parede em s). O tempo de uma tarefa dividida
+              é o da parte mais lenta (as partes rodam em paralelo).
+    """
+    audio = np.ascontiguousarray(audio)
+    max_workers = max_workers or os.cpu_count()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    try:
+        np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)[...] = audio
+
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_attach_audio,
+                                 initargs=(shm.name, audio.shape, audio.dtype)) as executor:
+            futures = {}
+            for task in tasks:
+                parts = parts_fn(task) if parts_fn else [None]
+                futures[task["name"]] = [executor.submit(_run_part, render_fn, fs, task, part)
+                                         for part in parts]
+
+            results = {}
+            for name, part_futures in futures.items():
+                outputs, times, profiles = zip(*(f.result() for f in part_futures))
+                output = outputs[0] if len(outputs) == 1 else np.column_stack(outputs)
+                results[name] = (output, max(times))
+                for profile in profiles:
+                    default_profiler.merge(profile)
+                default_profiler.add(f"task/{name}", max(times), len(output), fs, parts=len(outputs))
+                logger.info(f" > {name}: {max(times):.2f}s ({len(outputs)} parte(s))")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return results
@@ -0,0 +1,199 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import numpy as np
+from effects import kernels
+from effects.reverb import apply_reverb, apply_reverb_stereo, ReverbProcessor, StereoReverbProcessor
+from effects.flanger import apply_flanger, FlangerProcessor
+from effects.tremolo import apply_tremolo, TremoloProcessor
+from effects.dynamics import limit, LookaheadLimiter
+from pitch_shift.pitch_shift import change_pitch, PitchShiftProcessor
+from pipeline import load_presets
+
+# Mede a vazão (amostras/s) e o fator de tempo real de cada efeito em sinais
+# sintéticos, para vários tamanhos de entrada, taxas de amostragem e tamanhos
+# de bloco. Os resultados são salvos em JSON; o subcomando `compare` aponta
+# regressões entre duas execuções.
+#
+#   python benchmark.py run --output output/benchmarks/base.json
+#   python benchmark.py compare output/benchmarks/base.json output/benchmarks/novo.json
+
+DEFAULT_LENGTHS_S = [1.0, 10.0, 60.0]
+DEFAULT_RATES = [22050, 44100, 48000]
+DEFAULT_CHUNKS = ["full", 4096, 256] # "full" = função apply_* sobre o sinal inteiro
+DEFAULT_THRESHOLD = 0.10 # Queda de vazão (10%) considerada regressão
+GLIDE = [[0.0, -7.0], [1.0, 7.0]] # Automação do pitch shift: glide de -7 a +7 semitons em 1 s
+
+def effects(presets):
+    """Efeitos medidos: nome -> (função apply_*(x, fs), fábrica do processador com estado(fs))."""
+    p = presets["REV-HALL"]
+    reverb_args = (p["combs_ms"], p["combs_gains"], p["aps_ms"], p["aps_gains"], p["wet_gain"])
+
+    return {
+        "reverb": (lambda x, fs: apply_reverb(x, fs, *reverb_args),
+                   lambda fs: ReverbProcessor(fs, *reverb_args)),
+        "reverb_stereo": (lambda x, fs: apply_reverb_stereo(x, fs, *reverb_args),
+                          lambda fs: StereoReverbProcessor(fs, *reverb_args)),
+        "flanger": (lambda x, fs: apply_flanger(x, fs),
+                    lambda fs: FlangerProcessor(fs)),
+        "tremolo": (lambda x, fs: apply_tremolo(x, fs),
+                    lambda fs: TremoloProcessor(fs)),
+        "pitch_shift": (lambda x, fs: change_pitch(x, fs, 4.0),
+                        lambda fs: PitchShiftProcessor(fs, 4.0)),
+        "pitch_glide": (lambda x, fs: change_pitch(x, fs, GLIDE),
+                        lambda fs: PitchShiftProcessor(fs, GLIDE)),
+        "limiter": (lambda x, fs: limit(2.0 * x, fs),
+                    lambda fs: LookaheadLimiter(fs)),
+    }
+
+def synthetic_signal(length_s, fs, seed=0):
+    """Sinal de teste determinístico: acorde de senoides com envelope + ruído, pico 0.9."""
+    n = int(length_s * fs)
+    t = np.arange(n) / fs
+    rng = np.random.default_rng(seed)
+
+    x = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6, 440.0))
+    x *= 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t) # Envelope lento
+    x += 0.05 * rng.standard_normal(n)
+    return (0.9 * x / np.max(np.abs(x))).astype(np.float32)
+
+def _run_once(effect, x, fs, chunk):
+    """Executa um efeito sobre `x` (apply_* ou processador em blocos de `chunk`); retorna o tempo em s."""
+    apply_fn, make_processor = effect
+    with contextlib.redirect_stdout(io.StringIO()): # Os efeitos imprimem banners
+        t0 = time.perf_counter()
+        if chunk == "full":
+            apply_fn(x, fs)
+        else:
+            processor = make_processor(fs)
+            for start in range(0, len(x), chunk):
+                processor.process(x[start:start + chunk])
+        return time.perf_counter() - t0
+
+def run(lengths_s, rates, chunks, repeats=3, names=None):
+    """
+    Mede todos os efeitos em todas as combinações. O tempo de cada caso é o menor
+    de `repeats` execuções (após uma execução curta de aquecimento, ex.: JIT).
+
+    Returns:
+        list: Um dict por caso (effect, length_s, fs, chunk, seconds, samples_per_s, realtime_factor).
+    """
+    all_effects = effects(load_presets("specs/reverb_presets.json"))
+    results = []
+
+    for name, effect in all_effects.items():
+        if names and name not in names:
+            continue
+        _run_once(effect, synthetic_signal(0.1, 44100), 44100, "full") # Aquecimento
+
+        for fs in rates:
+            for length_s in lengths_s:
+                x = synthetic_signal(length_s, fs)
+                for chunk in chunks:
+                    seconds = min(_run_once(effect, x, fs, chunk) for _ in range(repeats))
+                    result = {
+                        "effect": name,
+                        "length_s": length_s,
+                        "fs": fs,
+                        "chunk": chunk,
+                        "seconds": seconds,
+                        "samples_per_s": len(x) / seconds,
+                        "realtime_factor": length_s / seconds, # Segundos de áudio por segundo de processamento
+                    }
+                    results.append(result)
+                    print(f" > {name:14s} {length_s:6.1f}s {fs:6d}Hz bloco={str(chunk):>5s}: "
+                          f"{seconds * 1000:9.1f} ms  {result['samples_per_s'] / 1e6:8.2f} M amostras/s  "
+                          f"{result['realtime_factor']:8.1f}x tempo real")
+
+    return results
+
+def _case(result):
+    return (result["effect"], result["length_s"], result["fs"], str(result["chunk"]))
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compara duas execuções caso a caso pela vazão (amostras/s).
+
+    Returns:
+        list: (caso, razão atual/base) dos casos que caíram mais que `threshold`.
+    """
+    base = {_case(r): r for r in baseline["results"]}
+    regressions = []
+
+    for r in current["results"]:
+        b = base.get(_case(r))
+        if b is None:
+            continue
+        ratio = r["samples_per_s"] / b["samples_per_s"]
+        flag = "REGRESSÃO" if ratio < 1.0 - threshold else ("melhora" if ratio > 1.0 + threshold else "")
+        effect, length_s, fs, chunk = _case(r)
+        print(f" > {effect:14s} {length_s:6.1f}s {fs:6d}Hz bloco={chunk:>5s}: {ratio:6.2f}x {flag}")
+        if ratio < 1.0 - threshold:
+            regressions.append((_case(r), ratio))
+
+    return regressions
+
+def _parse_chunk(value):
+    return value if value == "full" else int(value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de vazão dos efeitos.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Executa o benchmark e salva os resultados em JSON.")
+    p_run.add_argument("--lengths", type=float, nargs="+", default=DEFAULT_LENGTHS_S, help="Durações em s")
+    p_run.add_argument("--rates", type=int, nargs="+", default=DEFAULT_RATES, help="Taxas de amostragem")
+    p_run.add_argument("--chunks", type=_parse_chunk, nargs="+", default=DEFAULT_CHUNKS,
+                       help="Tamanhos de bloco ('full' = apply_* no sinal inteiro)")
+    p_run.add_argument("--effects", nargs="+", help="Subconjunto dos efeitos")
+    p_run.add_argument("--repeats", type=int, default=3)
+    p_run.add_argument("--output", default="output/benchmarks/results.json")
+
+    p_cmp = sub.add_parser("compare", help="Compara duas execuções e aponta regressões.")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="Queda relativa de vazão considerada regressão (0.10 = 10%%)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        print(f"--- Benchmark (backend: {kernels.BACKEND}) ---")
+        results = run(args.lengths, args.rates, args.chunks, args.repeats, args.effects)
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "backend": kernels.BACKEND,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.platform(),
+            },
+            "results": results,
+        }
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultados salvos em '{args.output}'.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    print(f"--- Comparação: {args.current} vs {args.baseline} (limite {args.threshold:.0%}) ---")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regressão(ões) encontrada(s).")
+        return 1
+    print("\nNenhuma regressão.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
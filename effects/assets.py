@@ -1,12 +1,157 @@
+import contextlib
 import numpy as np
+from effects import kernels
 
-class IIRCombFilter:
-    def __init__(self, delay_ms, gain, fs):
-        self.delay_samples = int((delay_ms / 1000.0) * fs)
+class WorkBuffers:
+    """
+    Buffers de trabalho dos processadores, reutilizados entre blocos (o conteúdo
+    só vale durante uma chamada de process). Com blocos de tamanho fixo, cada
+    buffer é alocado uma única vez; um bloco maior que o anterior realoca.
+
+    Cópias (copy.deepcopy) recebem buffers vazios, já que não há estado a copiar;
+    dentro de WorkBuffers.shared(), a cópia usa os mesmos buffers (ver
+    BlockScheduler.warmup: a cadeia copiada deixa os buffers da original alocados).
+    """
+    _sharing = False
+
+    def __init__(self):
+        self._arrays = {}
+
+    def get(self, name, shape, dtype=np.float32):
+        """Buffer `name` com a forma `shape` (visão das primeiras shape[0] linhas)."""
+        dtype = np.dtype(dtype)
+        array = self._arrays.get(name)
+        if array is None or array.dtype != dtype or array.shape[1:] != tuple(shape[1:]) or len(array) < shape[0]:
+            array = self._arrays[name] = np.empty(shape, dtype=dtype)
+        return array[:shape[0]]
+
+    def find(self, name, n):
+        """Array guardado com keep() se ele tiver `n` linhas, senão None."""
+        array = self._arrays.get(name)
+        return array if array is not None and len(array) == n else None
+
+    def keep(self, name, array):
+        """Guarda um array já alocado (ex.: a saída de um estágio) para reutilizá-lo."""
+        self._arrays[name] = array
+
+    def __deepcopy__(self, memo):
+        return self if WorkBuffers._sharing else WorkBuffers()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def shared():
+        """Durante o bloco `with`, copy.deepcopy mantém os mesmos WorkBuffers."""
+        WorkBuffers._sharing = True
+        try:
+            yield
+        finally:
+            WorkBuffers._sharing = False
+
+class DelayLineFilter:
+    def __init__(self, delay_ms, gain, fs, channels=None):
+        """
+        Base dos filtros com buffer circular (Comb e All-Pass).
+        
+        Mono (padrão): buffer (M,) com um único atraso de M amostras.
+        Multicanal: buffer (D, C) com um ponteiro de escrita compartilhado e um
+        atraso por canal (D = maior atraso). O canal c lê a posição ptr - M_c, o
+        que permite atrasos diferentes por canal (ex: spread estéreo) mantendo
+        todos os canais em uma única passada vetorizada.
+        
+        Args:
+            delay_ms: Atraso em ms (escalar) ou lista com um atraso por canal.
+            gain: Ganho do filtro.
+            fs: Taxa de amostragem.
+            channels: Número de canais (None = mono, buffer 1D).
+        """
         self.gain = gain
-        self.buffer = np.zeros(self.delay_samples, dtype=np.float32)
         self.ptr = 0
+        
+        if channels is None and np.ndim(delay_ms) == 0:
+            self.delay_samples = int((delay_ms / 1000.0) * fs)
+            self.buffer = np.zeros(self.delay_samples, dtype=np.float32)
+        else:
+            delays_ms = np.asarray(delay_ms, dtype=np.float64)
+            if channels is not None:
+                delays_ms = np.broadcast_to(delays_ms, (channels,))
+            self.delay_samples = ((delays_ms / 1000.0) * fs).astype(np.int64)
+            self.buffer = np.zeros((int(self.delay_samples.max()), len(self.delay_samples)), dtype=np.float32)
+
+    def _equation(self, x, delayed):
+        """Equação do filtro para um sub-bloco: retorna (saída, valor escrito no buffer)."""
+        raise NotImplementedError
+
+    def _kernel(self, x, y):
+        """Executa o kernel compilado do filtro (mono ou multicanal) e retorna o novo ponteiro."""
+        raise NotImplementedError
+
+    def process_block(self, x, out=None):
+        """
+        Processa um bloco inteiro de amostras mantendo o estado do buffer circular.
+        
+        O filtro avança em sub-blocos de no máximo `delay_samples` (até o fim do
+        buffer), de modo que nenhuma amostra escrita no sub-bloco é lida nele
+        mesmo. Isso permite usar operações vetoriais do NumPy com o mesmo
+        resultado do processamento amostra a amostra.
+        
+        Args:
+            x: Bloco (N,) para filtros mono ou (N, C) para filtros multicanal.
+            out: Array float32 com a forma de `x` para a saída (com os kernels
+                 compilados, o bloco não aloca memória).
+        """
+        N = len(x)
+        y = np.empty(np.shape(x), dtype=np.float32) if out is None else out
+        
+        # Backend compilado (se disponível): laço amostra a amostra em JIT
+        if kernels.use_kernels():
+            self.ptr = self._kernel(np.asarray(x), y)
+            return y
+        
+        if self.buffer.ndim == 2:
+            return self._process_multichannel(x, y)
+        
+        start = 0
+        while start < N:
+            # Sub-bloco contíguo: do ponteiro atual até o fim do buffer
+            L = min(self.delay_samples - self.ptr, N - start)
+            seg = slice(self.ptr, self.ptr + L)
+            
+            delayed = self.buffer[seg].copy()
+            y[start:start + L], self.buffer[seg] = self._equation(x[start:start + L], delayed)
+            
+            self.ptr = (self.ptr + L) % self.delay_samples
+            start += L
+            
+        return y
+
+    def _process_multichannel(self, x, y):
+        """Versão multicanal de process_block: todos os canais em cada sub-bloco."""
+        N = len(x)
+        D, C = self.buffer.shape
+        delays = [int(m) for m in self.delay_samples]
+        min_delay = min(delays)
+        delayed = np.empty((min(min_delay, N), C), dtype=np.float32)
+        
+        start = 0
+        while start < N:
+            # Posição de leitura de cada canal: ptr - M_c (circular)
+            read_ptrs = [(self.ptr - m) % D for m in delays]
+            
+            # Sub-bloco: no máximo o menor atraso, com leitura e escrita contíguas
+            # (para antes do fim do buffer, tanto na escrita quanto em cada leitura)
+            L = min(min_delay, D - self.ptr, N - start, D - max(read_ptrs))
+            
+            for c in range(C):
+                delayed[:L, c] = self.buffer[read_ptrs[c]:read_ptrs[c] + L, c]
+            
+            y[start:start + L], self.buffer[self.ptr:self.ptr + L] = self._equation(x[start:start + L], delayed[:L])
+            
+            self.ptr = (self.ptr + L) % D
+            start += L
+            
+        return y
 
+class IIRCombFilter(DelayLineFilter):
     def process(self, x):
         # 1. Lê o valor atrasado
         output = self.buffer[self.ptr]
@@ -21,13 +166,16 @@ class IIRCombFilter:
         
         return output
 
-class FIRCombFilter:
-    def __init__(self, delay_ms, gain, fs):
-        self.delay_samples = int((delay_ms / 1000.0) * fs)
-        self.gain = gain
-        self.buffer = np.zeros(self.delay_samples, dtype=np.float32)
-        self.ptr = 0
+    def _equation(self, x, delayed):
+        # y[n] = buffer[ptr] ; buffer[ptr] = x[n] + g * y[n]
+        return delayed, x + (self.gain * delayed)
+
+    def _kernel(self, x, y):
+        if self.buffer.ndim == 2:
+            return kernels.comb_kernel_mc(x, self.buffer, self.ptr, self.delay_samples, self.gain, y)
+        return kernels.comb_kernel(x, self.buffer, self.ptr, self.gain, y)
 
+class FIRCombFilter(DelayLineFilter):
     def process(self, x):        
         # 1. Lê o valor atrasado
         output = self.buffer[self.ptr]
@@ -41,13 +189,15 @@ class FIRCombFilter:
         
         return output
 
-class AllPassFilter:
-    def __init__(self, delay_ms, gain, fs):
-        self.delay_samples = int((delay_ms / 1000.0) * fs)
-        self.gain = gain
-        self.buffer = np.zeros(self.delay_samples, dtype=np.float32)
-        self.ptr = 0
+    def _equation(self, x, delayed):
+        return delayed, x + (self.gain * delayed)
 
+    def _kernel(self, x, y):
+        if self.buffer.ndim == 2:
+            return kernels.comb_kernel_mc(x, self.buffer, self.ptr, self.delay_samples, self.gain, y)
+        return kernels.comb_kernel(x, self.buffer, self.ptr, self.gain, y)
+
+class AllPassFilter(DelayLineFilter):
     def process(self, x):
         delayed = self.buffer[self.ptr]
         
@@ -62,9 +212,21 @@ class AllPassFilter:
         self.ptr = (self.ptr + 1) % self.delay_samples
         
         return y
+
+    def _equation(self, x, delayed):
+        buffer_in = x + (self.gain * delayed)
+        return delayed - (self.gain * buffer_in), buffer_in
+
+    def _kernel(self, x, y):
+        if self.buffer.ndim == 2:
+            return kernels.allpass_kernel_mc(x, self.buffer, self.ptr, self.delay_samples, self.gain, y)
+        return kernels.allpass_kernel(x, self.buffer, self.ptr, self.gain, y)
     
 class Oscillator:
-    def __init__(self, fs, rate_hz, center_val, range_val):
+    # Tamanho máximo dos sub-blocos gerados por block()
+    BLOCK_SIZE = 8192
+
+    def __init__(self, fs, rate_hz, center_val, range_val, table_size=None):
         """
         Oscilador de Baixa Frequência (LFO) Genérico.
         Pode ser usado para modular atraso (Flanger) ou ganho (Tremolo).
@@ -77,6 +239,9 @@ class Oscillator:
             center_val (float): Valor central da oscilação (Offset / DC).
             range_val (float): Amplitude da oscilação (Swing). O valor vai variar
                                entre (center - range) e (center + range).
+            table_size (int, opcional): Se informado, usa uma tabela de onda
+                               (wavetable) pré-calculada com esse número de pontos
+                               e interpolação linear no lugar de np.sin.
         """
         self.fs = fs
         self.rate = rate_hz
@@ -86,11 +251,32 @@ class Oscillator:
         self.phase = 0.0
         # Calcula o passo da fase por amostra: omega / fs
         self.phase_step = 2 * np.pi * self.rate / self.fs
+        
+        # Tabela de onda (um ciclo + ponto de guarda para a interpolação)
+        self.table = None
+        if table_size:
+            self.table = np.sin(2 * np.pi * np.arange(table_size + 1) / table_size)
+        
+        # Tabelas de sin/cos de k*passo usadas por block() (calculadas sob demanda)
+        self._block_sin = None
+        self._block_cos = None
+        self._block_tmp = None
+
+    def _wave(self, phase):
+        """Senoide (-1 a 1) da fase, por np.sin ou pela tabela de onda interpolada."""
+        if self.table is None:
+            return np.sin(phase)
+        
+        table_size = len(self.table) - 1
+        pos = (np.mod(phase, 2 * np.pi) / (2 * np.pi)) * table_size
+        idx = np.minimum(pos.astype(np.int64), table_size - 1)
+        frac = pos - idx
+        return (self.table[idx] * (1.0 - frac)) + (self.table[idx + 1] * frac)
 
     def next(self):
         """Retorna o próximo valor da modulação."""
         # Calcula o valor da senoide (-1 a 1)
-        osc_val = np.sin(self.phase)
+        osc_val = self._wave(self.phase)
         
         # Mapeia para a escala desejada (ex: atraso em amostras ou ganho)
         output = self.center + (self.range * osc_val)
@@ -100,4 +286,44 @@ class Oscillator:
         if self.phase > 2 * np.pi:
             self.phase -= 2 * np.pi
             
-        return output
\ No newline at end of file
+        return output
+
+    def block(self, n, out=None):
+        """
+        Retorna os próximos `n` valores da modulação como um array e avança a fase.
+        
+        A fase avança diretamente (phase + m * passo, módulo 2*pi, a cada sub-bloco
+        de m amostras), então chamadas consecutivas continuam exatamente de onde a
+        anterior parou. Com `out` (float64, (n,)), a senoide direta não aloca
+        memória (a tabela de onda ainda usa temporários).
+        """
+        if self.table is not None:
+            output = self.center + (self.range * self._wave(self.phase + self.phase_step * np.arange(n)))
+            self.phase = (self.phase + self.phase_step * n) % (2 * np.pi)
+            if out is not None:
+                out[:] = output
+                return out
+            return output
+        
+        # sin(phase + k*passo) = sin(phase)cos(k*passo) + cos(phase)sin(k*passo)
+        # As senoides de k*passo são calculadas uma única vez (BLOCK_SIZE pontos), então
+        # cada sub-bloco custa apenas multiplicações e somas.
+        if self._block_sin is None:
+            steps = self.phase_step * np.arange(self.BLOCK_SIZE)
+            self._block_sin = np.sin(steps)
+            self._block_cos = np.cos(steps)
+            self._block_tmp = np.empty(self.BLOCK_SIZE)
+        
+        output = np.empty(n) if out is None else out
+        for start in range(0, n, self.BLOCK_SIZE):
+            m = min(self.BLOCK_SIZE, n - start)
+            segment = output[start:start + m]
+            np.multiply(self._block_cos[:m], np.sin(self.phase), out=segment)
+            np.multiply(self._block_sin[:m], np.cos(self.phase), out=self._block_tmp[:m])
+            segment += self._block_tmp[:m]
+            self.phase = (self.phase + self.phase_step * m) % (2 * np.pi)
+        
+        # center + range * senoide, no lugar
+        output *= self.range
+        output += self.center
+        return output
@@ -0,0 +1,223 @@
+import os
+import numpy as np
+from effects.dynamics import finalize
+from instrumentation import get_logger, profile_stage
+
+logger = get_logger(__name__)
+
+# Espectros das IRs já particionados, por (chave da IR, tamanho do bloco).
+# Criar vários processadores com a mesma IR (ex.: um por tarefa) reaproveita as FFTs.
+_SPECTRA_CACHE = {}
+
+# Onde as IRs estimadas das gravações da mesa são guardadas
+IR_FOLDER = "output/ir"
+
+def estimate_ir(dry, wet, fs, length_s=1.5, pre_ms=2.0, reg=1e-3, fade_ms=50.0):
+    """
+    Estima a resposta ao impulso de uma gravação da mesa por deconvolução
+    (divisão espectral regularizada pelo sinal seco).
+
+    As gravações não estão alinhadas com o áudio seco: a IR começa `pre_ms`
+    antes do pico do caminho direto, e o final recebe um fade-out para evitar
+    o clique do truncamento.
+
+    Args:
+        dry: Áudio seco mono (N,).
+        wet: Gravação com o efeito (M,) ou (M, C).
+        fs: Taxa de amostragem.
+        length_s: Duração da IR em segundos.
+        pre_ms: Margem mantida antes do pico do caminho direto.
+        reg: Regularização, relativa à potência média do sinal seco.
+        fade_ms: Duração do fade-out final.
+    Returns:
+        np.ndarray: IR float32 (L,) ou (L, C).
+    """
+    wet2d = wet.reshape(len(wet), -1)
+    n_fft = 1 << int(np.ceil(np.log2(len(dry) + len(wet2d))))
+
+    D = np.fft.rfft(dry, n_fft)
+    W = np.fft.rfft(wet2d, n_fft, axis=0)
+
+    # H = W * conj(D) / (|D|^2 + lambda)
+    power = np.abs(D) ** 2
+    D_inv = np.conj(D) / (power + reg * np.mean(power))
+    h = np.fft.irfft(W * D_inv[:, None], n_fft, axis=0)
+
+    # Descarta o atraso de gravação: alinha pelo pico (soma dos canais)
+    peak = int(np.argmax(np.sum(np.abs(h), axis=1)))
+    start = max(peak - int(pre_ms * fs / 1000.0), 0)
+    ir = h[start:start + int(length_s * fs)].astype(np.float32)
+
+    fade = min(int(fade_ms * fs / 1000.0), len(ir))
+    if fade > 0:
+        ir[-fade:] *= np.cos(np.linspace(0.0, np.pi / 2, fade, dtype=np.float32))[:, None]
+
+    return ir[:, 0] if wet.ndim == 1 else ir
+
+def load_ir(effect_key, manager, length_s=1.5, ir_folder=IR_FOLDER):
+    """
+    IR de uma gravação do EFFECTS_MAP (ex.: "REV-HALL1"), estéreo (L, 2).
+
+    A estimativa é feita uma vez e salva em `ir_folder` (.npy); as próximas
+    chamadas apenas carregam o arquivo.
+
+    Args:
+        effect_key: Chave do efeito no EFFECTS_MAP.
+        manager: AudioManager com o áudio seco e as gravações.
+        length_s: Duração da IR em segundos.
+        ir_folder: Pasta das IRs estimadas.
+    """
+    path = os.path.join(ir_folder, f"{effect_key.replace(' ', '_')}_{length_s:g}s.npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    logger.info(f"--- Convolução: Estimando IR de {effect_key} ---")
+    fs, dry = manager.get_dry_audio()
+    fs, wet = manager.get_target_audio(effect_key, mono=False)
+    ir = estimate_ir(dry, wet, fs, length_s)
+
+    os.makedirs(ir_folder, exist_ok=True)
+    np.save(path, ir)
+    return ir
+
+def _partition_spectra(ir, block_size):
+    """
+    Divide a IR em partições de `block_size` e calcula a FFT (2B) de cada uma.
+    Retorna (B+1, C, 1, P): frequência primeiro, para a soma das partições virar um matmul.
+    """
+    ir2d = ir.reshape(len(ir), -1)
+    P = max(int(np.ceil(len(ir2d) / block_size)), 1)
+
+    padded = np.zeros((P * block_size, ir2d.shape[1]), dtype=np.float32)
+    padded[:len(ir2d)] = ir2d
+
+    # Cada partição ocupa a primeira metade da janela de FFT (zeros na segunda)
+    parts = np.zeros((P, 2 * block_size, ir2d.shape[1]), dtype=np.float32)
+    parts[:, :block_size] = padded.reshape(P, block_size, -1)
+
+    spectra = np.fft.rfft(parts, axis=1).astype(np.complex64)
+    return np.ascontiguousarray(spectra.transpose(1, 2, 0))[:, :, None, :]
+
+class ConvolutionReverbProcessor:
+    def __init__(self, fs, ir, block_size=1024, wet_gain=1.0, dry_gain=0.0, ir_key=None, channels=None):
+        """
+        Reverb por convolução com FFT particionada uniforme (overlap-save),
+        com estado persistente (processamento em streaming).
+
+        A IR é dividida em P partições de B amostras, cujos espectros (FFT de 2B)
+        são calculados uma vez. A cada bloco de B amostras de entrada é feita uma
+        FFT, guardada em uma linha de atraso no domínio da frequência, e a saída é
+        a soma dos produtos com os espectros da IR: o custo por amostra é
+        O(P + log B) em vez de O(L).
+
+        A saída tem latência de `block_size` amostras (ver `latency`), e o
+        resultado não depende da divisão da entrada em chamadas de `process`.
+
+        Args:
+            fs: Taxa de amostragem do áudio.
+            ir: Resposta ao impulso (L,) ou (L, C).
+            block_size: Tamanho das partições (= latência em amostras).
+            wet_gain: Ganho do sinal convoluído.
+            dry_gain: Ganho do sinal seco (as IRs estimadas já contêm o caminho direto).
+            ir_key: Identificador da IR para reaproveitar os espectros em cache.
+            channels: Número de canais da entrada (None = mono, blocos 1D).
+        """
+        self.fs = fs
+        self.block_size = block_size
+        self.latency = block_size
+        self.wet_gain = wet_gain
+        self.dry_gain = dry_gain
+
+        key = (ir_key, block_size)
+        if ir_key is None or key not in _SPECTRA_CACHE:
+            spectra = _partition_spectra(np.asarray(ir, dtype=np.float32), block_size)
+            if ir_key is not None:
+                _SPECTRA_CACHE[key] = spectra
+        else:
+            spectra = _SPECTRA_CACHE[key]
+        self.ir_spectra = spectra
+
+        # Canais de saída: IR estéreo com entrada mono gera saída estéreo
+        in_channels = channels or 1
+        self.out_channels = max(in_channels, spectra.shape[1])
+        self.mono_out = channels is None and spectra.shape[1] == 1
+        P = spectra.shape[3]
+
+        # Linha de atraso espectral duplicada: fdl[..., head:head + P] = [X_n, X_n-1, ..., X_n-P+1]
+        self.fdl = np.zeros((block_size + 1, in_channels, 2 * P), dtype=np.complex64)
+        self.head = 0
+
+        # Janela de entrada da FFT (bloco anterior + bloco atual) e FIFOs de entrada/saída
+        self.window = np.zeros((2 * block_size, in_channels), dtype=np.float32)
+        self.in_fifo = np.zeros((block_size, in_channels), dtype=np.float32)
+        self.in_count = 0
+        self.out_fifo = np.zeros((block_size, self.out_channels), dtype=np.float32)
+
+    def _convolve_block(self):
+        """Convolui o bloco completo da FIFO de entrada e o coloca na FIFO de saída."""
+        B = self.block_size
+        P = self.ir_spectra.shape[3]
+
+        self.window[:B] = self.window[B:]
+        self.window[B:] = self.in_fifo
+
+        X = np.fft.rfft(self.window, axis=0)
+        self.head = (self.head - 1) % P
+        self.fdl[:, :, self.head] = X
+        self.fdl[:, :, self.head + P] = X
+
+        # Soma das partições, Y = sum_k X_(n-k) * H_k, como um produto escalar por frequência/canal
+        Y = np.matmul(self.ir_spectra, self.fdl[:, :, self.head:self.head + P, None])
+
+        # Overlap-save: só a segunda metade da IFFT é convolução linear válida
+        self.out_fifo[:] = np.fft.irfft(Y[:, :, 0, 0], 2 * B, axis=0)[B:]
+
+    def process(self, x):
+        """Processa um bloco de áudio (sem normalização) mantendo o estado; saída atrasada em `latency`."""
+        x2d = np.reshape(x, (len(x), -1))
+        B = self.block_size
+        y = np.empty((len(x), self.out_channels), dtype=np.float32)
+
+        start = 0
+        while start < len(x):
+            n = min(B - self.in_count, len(x) - start)
+            pos = slice(self.in_count, self.in_count + n)
+
+            # A saída do bloco anterior sai na mesma posição em que a entrada chega
+            y[start:start + n] = self.out_fifo[pos] * self.wet_gain
+            if self.dry_gain:
+                y[start:start + n] += self.in_fifo[pos] * self.dry_gain
+            self.in_fifo[pos] = x2d[start:start + n]
+
+            self.in_count += n
+            start += n
+            if self.in_count == B:
+                self._convolve_block()
+                self.in_count = 0
+
+        return y[:, 0] if self.mono_out else y
+
+def apply_convolution_reverb(x, fs, ir, block_size=4096, wet_gain=1.0, dry_gain=0.0, ir_key=None):
+    """
+    Aplica a reverb por convolução ao sinal inteiro, compensando a latência.
+
+    A saída tem o tamanho da entrada mais a cauda da IR.
+    """
+    logger.info(f"--- Convolução: Processando {len(x)} amostras a {fs}Hz (IR de {len(ir)} amostras) ---")
+
+    with profile_stage("convolution", len(x), fs, ir_samples=len(ir), block_size=block_size) as stage:
+        channels = x.shape[1] if np.ndim(x) > 1 else None
+        reverb = ConvolutionReverbProcessor(fs, ir, block_size, wet_gain, dry_gain, ir_key, channels)
+
+        # Entrada + cauda da IR + latência (com zeros no final)
+        total = len(x) + len(ir) - 1
+        padded = np.zeros((total + reverb.latency,) + np.shape(x)[1:], dtype=np.float32)
+        padded[:len(x)] = x
+        y = reverb.process(padded)[reverb.latency:]
+        stage.buffer(padded)
+        stage.buffer(y)
+
+        # Normalização de Segurança (pico comum a todos os canais)
+        finalize(y, fs, stage=stage)
+
+    return y
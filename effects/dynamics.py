@@ -0,0 +1,248 @@
+import os
+import numpy as np
+from scipy.ndimage import minimum_filter1d
+from scipy.signal import firwin
+from effects.assets import WorkBuffers
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
+
+# Controle de nível da saída dos efeitos.
+#
+# Política (DSP_NORMALIZE ou NORMALIZATION), aplicada por finalize() ao fim de
+# cada apply_* e de render_chain:
+#   "peak"  - divide pelo pico se ele passar de 1.0 (comportamento original), no lugar
+#   "limit" - limitador com look-ahead (LookaheadLimiter), bloco a bloco, sem depender do pico global
+#   "none"  - sem ajuste (o WavWriter limita com clip na escrita)
+
+NORMALIZATION = os.environ.get("DSP_NORMALIZE", "peak").lower()
+
+OVERSAMPLING = 4 # Fator da detecção de true peak (ITU-R BS.1770)
+TRUE_PEAK_TAPS = 12 # Coeficientes por fase do interpolador
+
+def peak_level(x, axis=None):
+    """Pico absoluto sem criar o array temporário de np.abs (max e -min)."""
+    return np.maximum(np.max(x, axis=axis), -np.min(x, axis=axis))
+
+class LookaheadLimiter:
+    def __init__(self, fs, ceiling=1.0, lookahead_ms=5.0, release_ms=80.0, true_peak=False):
+        """
+        Limitador com look-ahead, processado em blocos e com estado persistente.
+
+        O ganho necessário em cada amostra, min(1, ceiling / |x|) (canais ligados:
+        o maior |x| entre os canais), passa por um mínimo móvel sobre a janela de
+        look-ahead, um release exponencial e uma média móvel do mesmo tamanho da
+        janela. O áudio sai atrasado de `latency` amostras; com esse atraso o
+        ganho já desceu em rampa quando o pico chega, e |saída| <= ceiling.
+
+        Args:
+            fs: Taxa de amostragem.
+            ceiling: Nível máximo da saída (linear).
+            lookahead_ms: Janela de look-ahead (define a rampa de ataque e a latência).
+            release_ms: Constante de tempo da volta do ganho a 1.0.
+            true_peak: Detecta picos entre amostras (sobreamostragem 4x), como em BS.1770.
+        """
+        self.fs = fs
+        self.ceiling = ceiling
+        self.lookahead = max(int(lookahead_ms * fs / 1000), 1)
+        self.log_release = -1.0 / max(release_ms * fs / 1000, 1.0) # log do coeficiente de release
+        self.true_peak = true_peak
+
+        self.tp_delay = 0
+        if true_peak:
+            # Interpolador polifásico: fase p = coeficientes h[p::4] (ganho unitário por fase)
+            h = firwin(OVERSAMPLING * TRUE_PEAK_TAPS, 0.9 / OVERSAMPLING) * OVERSAMPLING
+            self._phases = h.reshape(TRUE_PEAK_TAPS, OVERSAMPLING)[::-1] # (taps, fases), ordem de convolução
+            self.tp_delay = TRUE_PEAK_TAPS // 2
+        self.latency = self.lookahead + self.tp_delay
+
+        self._audio = None # Últimas `latency` amostras de entrada (N, C), alocadas no primeiro bloco
+        self._gains = np.ones(self.lookahead) # Ganhos necessários das últimas `lookahead` amostras
+        self._smooth = np.ones(self.lookahead - 1) # Ganhos (pós-release) para a média móvel
+        self._reduction = 0.0 # 1 - ganho do release (estado do filtro)
+        self.min_gain = 1.0 # Maior redução aplicada até agora (ganho mínimo)
+        self.work = WorkBuffers() # Temporários de process(), reutilizados entre blocos
+
+    def _level(self, x2d):
+        """Nível de detecção por amostra (N,): pico entre canais, opcionalmente true peak."""
+        N, C = x2d.shape
+        work = self.work
+        magnitude = np.abs(x2d, out=work.get("magnitude", (N, C)))
+        if not self.true_peak:
+            return np.max(magnitude, axis=1, out=work.get("level", (N,)))
+
+        T = TRUE_PEAK_TAPS
+        padded = work.get("tp_padded", (T - 1 + N, C))
+        padded[:T - 1] = self._tp_history
+        padded[T - 1:] = x2d
+        self._tp_history[:] = padded[N:]
+
+        # Interpolador polifásico: upsampled[n, c, p] = sum_t padded[n + t, c] * fases[t, p]
+        upsampled = work.get("tp_upsampled", (N, C, OVERSAMPLING), np.float64)
+        term = work.get("tp_term", (N, C, OVERSAMPLING), np.float64)
+        np.multiply(padded[:N, :, None], self._phases[0], out=upsampled)
+        for t in range(1, T):
+            np.multiply(padded[t:t + N, :, None], self._phases[t], out=term)
+            upsampled += term
+        np.abs(upsampled, out=upsampled)
+        level = np.max(upsampled, axis=(1, 2), out=work.get("tp_level", (N,), np.float64))
+
+        # O interpolador não passa as amostras exatas na fase 0: o nível também
+        # inclui o pico das próprias amostras, alinhado ao atraso do interpolador
+        start = T - 1 - self.tp_delay
+        np.abs(padded[start:start + N], out=magnitude)
+        sample_peak = np.max(magnitude, axis=1, out=work.get("level", (N,)))
+        return np.maximum(level, sample_peak, out=level)
+
+    def _release(self, target):
+        """
+        Release exponencial com ataque instantâneo sobre a redução d = 1 - ganho:
+        d[n] = max(alvo[n], a * d[n-1]). Fechado em forma vetorizada no domínio
+        log: d[n] = a^n * max_k(alvo[k] * a^-k) (máximo acumulado).
+        Calculado no lugar: `target` passa a conter 1 - d (o ganho).
+        """
+        ramp = self._ramp(len(target)) # n * log(a)
+        with np.errstate(divide="ignore"):
+            log_target = np.log(target, out=target)
+            log_target -= ramp
+            log_prev = np.log(self._reduction) + self.log_release if self._reduction > 0 else -np.inf
+        running = np.maximum.accumulate(log_target, out=log_target)
+        np.maximum(running, log_prev, out=running)
+        running += ramp
+        reduction = np.exp(running, out=running)
+        self._reduction = reduction[-1]
+        return np.subtract(1.0, reduction, out=reduction)
+
+    def _ramp(self, N):
+        """n * log(a) para n < N (usado por _release), calculado uma vez por tamanho de bloco."""
+        ramp = self.work.find("ramp", N)
+        if ramp is None:
+            ramp = np.arange(N) * self.log_release
+            self.work.keep("ramp", ramp)
+        return ramp
+
+    def process(self, x, out=None):
+        """
+        Processa um bloco (N,) ou (N, C); a saída está atrasada de `latency` amostras.
+        Com `out` (float32, forma de `x`), o bloco não aloca memória: os
+        temporários ficam em buffers de trabalho reutilizados.
+        """
+        x2d = np.asarray(x, dtype=np.float32).reshape(len(x), -1)
+        N, L = len(x2d), self.lookahead
+        C = x2d.shape[1]
+        if self._audio is None:
+            self._audio = np.zeros((self.latency, C), dtype=np.float32)
+            if self.true_peak:
+                self._tp_history = np.zeros((TRUE_PEAK_TAPS - 1, C), dtype=np.float32)
+        if out is None:
+            out = np.empty(np.shape(x), dtype=np.float32)
+        if N == 0:
+            return out
+        work = self.work
+
+        # A. Ganho necessário e mínimo sobre a janela [n - L, n]
+        level = self._level(x2d)
+        needed = np.maximum(level, self.ceiling, out=level)
+        np.divide(self.ceiling, needed, out=needed)
+        gains = work.get("gains", (L + N,), np.float64)
+        gains[:L] = self._gains
+        gains[L:] = needed
+        window_min = work.get("window_min", (L + N,), np.float64)
+        minimum_filter1d(gains, L + 1, origin=L // 2, mode="nearest", output=window_min)
+        self._gains[:] = gains[N:]
+
+        # B. Release e média móvel de L amostras (rampa de ataque até o pico)
+        smooth = work.get("smooth", (L - 1 + N,), np.float64)
+        smooth[:L - 1] = self._smooth
+        release = smooth[L - 1:]
+        np.subtract(1.0, window_min[L:], out=release)
+        self._release(release)
+        cumsum = work.get("cumsum", (L + N,), np.float64)
+        cumsum[0] = 0.0
+        np.cumsum(smooth, out=cumsum[1:])
+        gain = np.subtract(cumsum[L:], cumsum[:-L], out=work.get("gain", (N,), np.float64))
+        gain /= L
+        self._smooth[:] = smooth[N:]
+        self.min_gain = min(self.min_gain, float(np.min(gain)))
+
+        # C. Áudio atrasado de `latency` amostras, com o ganho aplicado
+        delayed = work.get("delayed", (self.latency + N, C))
+        delayed[:self.latency] = self._audio
+        delayed[self.latency:] = x2d
+        self._audio[:] = delayed[N:]
+        gain32 = work.get("gain32", (N,))
+        gain32[:] = gain
+        np.multiply(delayed[:N], gain32[:, None], out=out.reshape(N, C))
+
+        return out
+
+def limit(y, fs, **limiter_args):
+    """
+    Aplica o LookaheadLimiter a um sinal completo, no lugar e com a latência
+    compensada (a saída de cada bloco é escrita de volta em posições já lidas).
+    """
+    limiter = LookaheadLimiter(fs, **limiter_args)
+    block_size = 8192
+    L = limiter.latency
+    def write_back(out, start):
+        # out[i] corresponde a y[start + i - L] (descarta as posições antes do início)
+        lo = max(start - L, 0)
+        hi = start - L + len(out)
+        if hi > lo:
+            y[lo:hi] = out[lo - (start - L):]
+
+    for start in range(0, len(y), block_size):
+        write_back(limiter.process(y[start:start + block_size]), start)
+    write_back(limiter.process(np.zeros((L,) + y.shape[1:], dtype=np.float32)), len(y))
+
+    if limiter.min_gain < 1.0:
+        logger.debug(f" > Limitador: redução máxima {20 * np.log10(limiter.min_gain):.2f} dB")
+    return y
+
+def finalize(y, fs, peak=None, per_channel=False, stage=None, log=True, mode=None):
+    """
+    Aplica a política de nível (NORMALIZATION) a um render completo, no lugar.
+
+    Args:
+        y: Saída do efeito (N,) ou (N, C). Para várias vozes (V, N), chame uma
+           vez por voz (ver change_pitch_voices).
+        fs: Taxa de amostragem.
+        peak: Pico já acompanhado durante o processamento (evita uma passada extra).
+        per_channel: Normaliza cada canal (coluna de um y (N, C)) pelo seu próprio pico.
+        stage: Estágio do profiler (registra os eventos de normalização).
+        log: Escreve as normalizações no log.
+        mode: Sobrescreve NORMALIZATION ("peak", "limit" ou "none").
+    Returns:
+        y (o mesmo array, ajustado).
+    """
+    mode = mode or NORMALIZATION
+    if mode == "none" or len(y) == 0:
+        return y
+
+    if mode == "limit":
+        limit(y, fs)
+        if stage is not None:
+            stage.event("limit")
+        return y
+
+    if peak is None:
+        peak = peak_level(y, axis=0 if per_channel and y.ndim > 1 else None)
+
+    if np.ndim(peak) == 0:
+        if peak > 1.0:
+            if log:
+                logger.info(f" > Normalizando volume final (Pico: {peak:.2f})")
+            if stage is not None:
+                stage.event("normalize", peak=float(peak))
+            y /= peak
+        return y
+
+    # Um pico por canal
+    for ch, channel_peak in enumerate(peak):
+        if channel_peak > 1.0:
+            if log:
+                logger.info(f" > Normalizando canal {ch} (Pico: {channel_peak:.2f})")
+            if stage is not None:
+                stage.event("normalize", peak=float(channel_peak), channel=ch)
+            y[:, ch] /= channel_peak
+    return y
@@ -1,10 +1,132 @@
 import numpy as np
-from effects.assets import Oscillator, FIRCombFilter
+from effects.assets import Oscillator, FIRCombFilter, WorkBuffers
+from effects.dynamics import finalize
+from instrumentation import get_logger, profile_stage
+
+logger = get_logger(__name__)
+
+class FlangerProcessor:
+    # Tamanho dos sub-blocos do caminho vetorizado (mantém os temporários no cache)
+    BLOCK_SIZE = 8192
+
+    def __init__(self, fs, delay_min_ms=1.0, delay_max_ms=5.0, rate_hz=0.5, depth_gain=0.7, channels=None):
+        """
+        Flanger com estado persistente (LFO, buffer circular e ponteiro de escrita),
+        combinando um FIR Comb Filter com um Oscilador (LFO). Com `channels`, processa
+        blocos (N, C) com o mesmo LFO em todos os canais.
+
+        Args:
+            fs: Taxa de amostragem do áudio.
+            delay_min_ms: Atraso mínimo em milissegundos.
+            delay_max_ms: Atraso máximo em milissegundos.
+            rate_hz: Velocidade da oscilação do LFO em Hz.
+            depth_gain: Ganho do efeito (0.0 a 1.0), controla a intensidade do flanger.
+            channels: Número de canais (None = mono, blocos 1D).
+        """
+        self.fs = fs
+        self.depth_gain = depth_gain
+
+        # 1. PREPARAR O LFO (OSCILADOR)
+        # O Flanger precisa modular o ATRASO.
+        # Precisamos converter Min/Max ms para Média e Amplitude em AMOSTRAS.
+        # L(n) = L0 + A * sin(wn)
+
+        avg_delay_s = (delay_min_ms + delay_max_ms) / 2000.0 # Média (L0)
+        amp_delay_s = (delay_max_ms - delay_min_ms) / 2000.0 # Amplitude (A)
+
+        L0_samples = avg_delay_s * fs
+        A_samples  = amp_delay_s * fs
+
+        # Instância do LFO
+        self.lfo = Oscillator(fs=fs,
+                              rate_hz=rate_hz,
+                              center_val=L0_samples,
+                              range_val=A_samples)
+
+        # 2. PREPARAR O FILTRO
+        # FIRCombFilter utilizado apenas como gerenciador de buffer circular
+        self.fir_comb = FIRCombFilter(delay_ms=delay_max_ms + 2.0, gain=depth_gain, fs=fs, channels=channels)
+
+        # Acesso direto aos componentes internos para manipulação manual
+        self.buffer = self.fir_comb.buffer
+        self.buffer_len = len(self.buffer)
+        self.write_ptr = 0
+        self.work = WorkBuffers()
+        self._positions = (self.buffer_len + np.arange(self.BLOCK_SIZE)).astype(np.float64) # H + n, posições de escrita em `padded`
+
+    def process(self, x, out=None):
+        """
+        Processa um bloco de áudio (sem normalização) mantendo o estado interno.
+        Com `out` (float32, forma de `x`), o bloco não aloca memória: os
+        temporários ficam em buffers de trabalho reutilizados.
+        """
+        y = np.empty(np.shape(x), dtype=np.float32) if out is None else out
+        for start in range(0, len(x), self.BLOCK_SIZE):
+            stop = start + self.BLOCK_SIZE
+            self._process_vectorized(x[start:stop], y[start:stop])
+        return y
+
+    def _process_vectorized(self, x, y):
+        """
+        Flanger vetorizado: y[n] = x[n] + g * x[n - L(n)] para o bloco inteiro.
+
+        O buffer circular é linearizado (mais antigo -> mais recente) e concatenado
+        ao bloco, de modo que todas as leituras atrasadas viram um único gather com
+        índices fracionários e interpolação linear. Ao final, o buffer guarda as
+        últimas `buffer_len` amostras em ordem linear (write_ptr = 0).
+        """
+        N = len(x)
+        H = self.buffer_len
+        work = self.work
+        channels = self.buffer.shape[1:]
+
+        # Histórico (H amostras) + bloco atual
+        padded = work.get("padded", (H + N,) + channels)
+        padded[:H - self.write_ptr] = self.buffer[self.write_ptr:]
+        padded[H - self.write_ptr:H] = self.buffer[:self.write_ptr]
+        padded[H:] = x
+
+        # A. Atrasos do LFO para o bloco inteiro
+        read_pos = self.lfo.block(N, out=work.get("read_pos", (N,), np.float64))
+
+        # B. Posições de leitura (índice da amostra atual em `padded` é H + n)
+        # (read_pos >= 0, então o truncamento equivale ao floor)
+        np.subtract(self._positions[:N], read_pos, out=read_pos)
+        idx = work.get("idx", (N,), np.int64)
+        np.copyto(idx, read_pos, casting="unsafe")
+        read_pos -= idx
+        frac = work.get("frac", (N,))
+        np.copyto(frac, read_pos, casting="same_kind")
+        weight = work.get("weight", (N,))
+        np.subtract(1.0, frac, out=weight)
+        if padded.ndim == 2:
+            frac, weight = frac[:, None], weight[:, None] # Mesmo atraso para todos os canais
+
+        # Interpolação Linear: x[idx] * (1 - frac) + x[idx + 1] * frac
+        delayed = work.get("delayed", (N,) + channels)
+        np.take(padded, idx, axis=0, out=delayed, mode="clip")
+        delayed *= weight
+        idx += 1
+        np.minimum(idx, len(padded) - 1, out=idx)
+        following = work.get("following", (N,) + channels)
+        np.take(padded, idx, axis=0, out=following, mode="clip")
+        following *= frac
+        delayed += following
+
+        # C. Equação FIR Comb: y[n] = x[n] + g * x[n - L(n)]
+        delayed *= self.depth_gain
+        np.add(padded[H:], delayed, out=y)
+
+        # D. Atualiza o buffer com as últimas H amostras
+        self.buffer[:] = padded[-H:]
+        self.write_ptr = 0
+
+        return y
 
 def apply_flanger(x, fs, delay_min_ms=1.0, delay_max_ms=5.0, rate_hz=0.5, depth_gain=0.7):
     """
     Aplica o efeito Flanger combinando um FIR Comb Filter com um Oscilador (LFO).
-    
+
     Args:
         x: Sinal de áudio de entrada.
         fs: Taxa de amostragem do áudio.
@@ -13,76 +135,15 @@ def apply_flanger(x, fs, delay_min_ms=1.0, delay_max_ms=5.0, rate_hz=0.5, depth_
         rate_hz: Velocidade da oscilação do LFO em Hz.
         depth_gain: Ganho do efeito (0.0 a 1.0), controla a intensidade do flanger.
     """
-    print(f"--- Flanger: Rate={rate_hz}Hz, Delay={delay_min_ms}-{delay_max_ms}ms ---")
-    
-    N = len(x)
-    y = np.zeros(N, dtype=np.float32)
-    
-    # 1. PREPARAR O LFO (OSCILADOR)
-    # O Flanger precisa modular o ATRASO.
-    # Precisamos converter Min/Max ms para Média e Amplitude em AMOSTRAS.
-    # L(n) = L0 + A * sin(wn)
-    
-    avg_delay_s = (delay_min_ms + delay_max_ms) / 2000.0 # Média (L0)
-    amp_delay_s = (delay_max_ms - delay_min_ms) / 2000.0 # Amplitude (A)
-    
-    L0_samples = avg_delay_s * fs
-    A_samples  = amp_delay_s * fs
-    
-    # Instância do LFO
-    lfo = Oscillator(fs=fs, 
-                     rate_hz=rate_hz, 
-                     center_val=L0_samples,
-                     range_val=A_samples) 
-    
-    # 2. PREPARAR O FILTRO
-    # FIRCombFilter utilizado apenas como gerenciador de buffer circular
-    fir_comb = FIRCombFilter(delay_ms=delay_max_ms + 2.0, gain=depth_gain, fs=fs)
-    
-    # Acesso direto aos componentes internos para manipulação manual
-    buffer = fir_comb.buffer
-    buffer_len = len(buffer)
-    write_ptr = 0 
-    
-    # 3. PROCESSAMENTO
-    for n in range(N):
-        input_sample = x[n]
-        
-        # A. Obter o atraso atual do LFO
-        current_delay_samples = lfo.next()
-        
-        # B. Ler do Buffer com Interpolação Linear
-        # Ponteiro de leitura = Ponteiro de escrita - Atraso do LFO
-        read_ptr_float = write_ptr - current_delay_samples
-        
-        # Circularidade
-        while read_ptr_float < 0:
-            read_ptr_float += buffer_len
-            
-        # Interpolação
-        
-        # 1. Índice inteiro anterior
-        idx_int = int(read_ptr_float)
-        # 2. Calcula a distância decimal
-        frac = read_ptr_float - idx_int
-        # 3. Próximo índice (circular)
-        idx_next = (idx_int + 1) % buffer_len
-        # 4. Lê os valores reais armazenados no buffer
-        val_current = buffer[idx_int]
-        val_next = buffer[idx_next]
-        # 5. Calcula a média ponderada
-        delayed_val = (val_current * (1.0 - frac)) + (val_next * frac)
-        
-        # C. Equação FIR Comb: y[n] = x[n] + g * x[n - L(n)]
-        y[n] = input_sample + (depth_gain * delayed_val)
-        
-        # D. Escrever no Buffer
-        buffer[write_ptr] = input_sample
-        write_ptr = (write_ptr + 1) % buffer_len
-
-    # Normalização de segurança
-    peak = np.max(np.abs(y))
-    if peak > 1.0:
-        y /= peak
-        
-    return y
\ No newline at end of file
+    logger.info(f"--- Flanger: Rate={rate_hz}Hz, Delay={delay_min_ms}-{delay_max_ms}ms ---")
+
+    with profile_stage("flanger", len(x), fs) as stage:
+        channels = x.shape[1] if np.ndim(x) > 1 else None
+        flanger = FlangerProcessor(fs, delay_min_ms, delay_max_ms, rate_hz, depth_gain, channels=channels)
+        y = flanger.process(x)
+        stage.buffer(y)
+
+        # Normalização de segurança
+        finalize(y, fs, stage=stage, log=False)
+
+    return y
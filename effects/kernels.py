@@ -0,0 +1,214 @@
+import os
+import numpy as np
+
+# Backend de kernels compilados (JIT) para os laços amostra a amostra.
+# A escolha é feita na importação: se o Numba estiver instalado (e não for
+# desabilitado com DSP_BACKEND=python), os processadores usam os kernels abaixo.
+# Caso contrário, usam as implementações em Python/NumPy de cada módulo.
+# Sem o Numba, `njit` é um decorador neutro e os kernels continuam válidos como
+# Python puro (lentos, mas úteis para validação).
+
+try:
+    if os.environ.get("DSP_BACKEND", "").lower() == "python":
+        raise ImportError("Backend compilado desabilitado por DSP_BACKEND")
+    from numba import njit
+    BACKEND = "numba"
+except ImportError:
+    BACKEND = "python"
+
+    def njit(*args, **kwargs):
+        """Decorador neutro usado quando o Numba não está disponível."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+def use_kernels():
+    """Retorna True se os processadores devem usar os kernels compilados."""
+    return BACKEND == "numba"
+
+@njit(cache=True)
+def comb_kernel(x, buffer, ptr, gain, y):
+    """
+    IIR Comb Filter: y[n] = buffer[ptr] ; buffer[ptr] = x[n] + g * y[n].
+    Escreve a saída em `y` e retorna o novo ponteiro.
+    """
+    delay_samples = buffer.shape[0]
+    for n in range(x.shape[0]):
+        output = buffer[ptr]
+        buffer[ptr] = x[n] + gain * output
+        y[n] = output
+        ptr += 1
+        if ptr == delay_samples:
+            ptr = 0
+    return ptr
+
+@njit(cache=True)
+def allpass_kernel(x, buffer, ptr, gain, y):
+    """
+    All-Pass de Schroeder (forma canônica).
+    Escreve a saída em `y` e retorna o novo ponteiro.
+    """
+    delay_samples = buffer.shape[0]
+    for n in range(x.shape[0]):
+        delayed = buffer[ptr]
+        buffer_in = x[n] + gain * delayed
+        y[n] = delayed - gain * buffer_in
+        buffer[ptr] = buffer_in
+        ptr += 1
+        if ptr == delay_samples:
+            ptr = 0
+    return ptr
+
+@njit(cache=True)
+def comb_kernel_mc(x, buffer, ptr, delays, gain, y):
+    """
+    IIR Comb Filter multicanal: buffer (D, C) com ponteiro de escrita compartilhado
+    e atraso `delays[c]` por canal. Retorna o novo ponteiro.
+    """
+    D = buffer.shape[0]
+    N = x.shape[0]
+    # Os canais são independentes: cada um percorre o bloco inteiro a partir do mesmo ponteiro
+    for c in range(buffer.shape[1]):
+        w = ptr
+        r = ptr - delays[c]
+        if r < 0:
+            r += D
+        for n in range(N):
+            output = buffer[r, c]
+            buffer[w, c] = x[n, c] + gain * output
+            y[n, c] = output
+            w += 1
+            if w == D:
+                w = 0
+            r += 1
+            if r == D:
+                r = 0
+    return (ptr + N) % D
+
+@njit(cache=True)
+def allpass_kernel_mc(x, buffer, ptr, delays, gain, y):
+    """All-Pass multicanal (ver comb_kernel_mc). Retorna o novo ponteiro."""
+    D = buffer.shape[0]
+    N = x.shape[0]
+    for c in range(buffer.shape[1]):
+        w = ptr
+        r = ptr - delays[c]
+        if r < 0:
+            r += D
+        for n in range(N):
+            delayed = buffer[r, c]
+            buffer_in = x[n, c] + gain * delayed
+            y[n, c] = delayed - gain * buffer_in
+            buffer[w, c] = buffer_in
+            w += 1
+            if w == D:
+                w = 0
+            r += 1
+            if r == D:
+                r = 0
+    return (ptr + N) % D
+
+@njit(cache=True)
+def _read_buffer(buffer, position_float):
+    """Lê do buffer circular com Interpolação Linear."""
+    buffer_len = buffer.shape[0]
+    while position_float < 0:
+        position_float += buffer_len
+    while position_float >= buffer_len:
+        position_float -= buffer_len
+
+    idx_int = int(position_float)
+    frac = position_float - idx_int
+    idx_next = (idx_int + 1) % buffer_len
+
+    return (buffer[idx_int] * (1.0 - frac)) + (buffer[idx_next] * frac)
+
+@njit(cache=True)
+def pitch_shift_kernel(x, buffer, write_ptr, phasor, window_size, delay_rates, step, y):
+    """
+    Pitch Shifter granular de dois ponteiros (ver RealTimePitchShifter.process_block).
+    A taxa da amostra n é delay_rates[n * step]: step=0 para uma taxa fixa
+    (array de 1 elemento), step=1 para uma curva por amostra.
+    Retorna (write_ptr, phasor, pico de |y|) atualizados.
+    """
+    buffer_len = buffer.shape[0]
+    peak = 0.0
+    for n in range(x.shape[0]):
+        buffer[write_ptr] = x[n]
+
+        phasor_b = (phasor + 0.5) % 1.0
+        val_a = _read_buffer(buffer, write_ptr - phasor * window_size)
+        val_b = _read_buffer(buffer, write_ptr - phasor_b * window_size)
+
+        gain_a = 1.0 - 2.0 * abs(phasor - 0.5)
+        gain_b = 1.0 - 2.0 * abs(phasor_b - 0.5)
+
+        y[n] = (val_a * gain_a) + (val_b * gain_b)
+        if abs(y[n]) > peak:
+            peak = abs(y[n])
+
+        write_ptr += 1
+        if write_ptr == buffer_len:
+            write_ptr = 0
+
+        phasor += delay_rates[n * step]
+        if phasor >= 1.0:
+            phasor -= 1.0
+        elif phasor < 0.0:
+            phasor += 1.0
+    return write_ptr, phasor, peak
+
+@njit(cache=True)
+def multi_pitch_shift_kernel(x, buffer, write_ptr, phasors, window_size, delay_rates, y, peaks):
+    """
+    Pitch Shifter de várias vozes sobre o mesmo buffer circular (ver
+    MultiVoicePitchShifter). `phasors` e `peaks` são atualizados no lugar; y é (vozes, N).
+    Retorna o write_ptr atualizado.
+
+    Os atrasos ficam em [0, window_size] < buffer_len, então cada leitura precisa
+    de no máximo uma volta no buffer (sem os laços de _read_buffer), e os ganhos
+    triangulares dos dois ponteiros são complementares (gain_b = 1 - gain_a).
+    """
+    buffer_len = buffer.shape[0]
+    half = 0.5 * window_size
+    for n in range(x.shape[0]):
+        buffer[write_ptr] = x[n]
+
+        for v in range(phasors.shape[0]):
+            phasor = phasors[v]
+            delay_a = phasor * window_size
+            if phasor < 0.5:
+                delay_b = delay_a + half
+                gain_a = 2.0 * phasor
+            else:
+                delay_b = delay_a - half
+                gain_a = 2.0 - 2.0 * phasor
+
+            out = 0.0
+            for tap in range(2):
+                position = write_ptr - (delay_a if tap == 0 else delay_b)
+                if position < 0.0:
+                    position += buffer_len
+                idx_int = int(position)
+                frac = position - idx_int
+                idx_next = idx_int + 1
+                if idx_next == buffer_len:
+                    idx_next = 0
+                val = (buffer[idx_int] * (1.0 - frac)) + (buffer[idx_next] * frac)
+                out += val * (gain_a if tap == 0 else 1.0 - gain_a)
+
+            y[v, n] = out
+            if abs(out) > peaks[v]:
+                peaks[v] = abs(out)
+
+            phasor += delay_rates[v]
+            if phasor >= 1.0:
+                phasor -= 1.0
+            elif phasor < 0.0:
+                phasor += 1.0
+            phasors[v] = phasor
+
+        write_ptr += 1
+        if write_ptr == buffer_len:
+            write_ptr = 0
+    return write_ptr
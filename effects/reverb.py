@@ -1,69 +1,348 @@
 import numpy as np
-from effects.assets import IIRCombFilter, AllPassFilter
+from effects.assets import IIRCombFilter, AllPassFilter, WorkBuffers
+from effects.dynamics import finalize, peak_level
+from instrumentation import get_logger, profile_stage
 
-def apply_reverb(x, fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain=0.4, print_info=True):
-    
-    if print_info:
-        print(f"--- Reverb: Processando {len(x)} amostras a {fs}Hz ---")
-    
-    # 1. Inicializa Filtros (Recebendo MS direto)
-    combs = []
-    for i in range(len(delays_combs_ms)):
-        combs.append(IIRCombFilter(delays_combs_ms[i], gains_combs[i], fs))
+logger = get_logger(__name__)
+
+# Detecção de silêncio: abaixo de SILENCE_DB (1 LSB de 16 bits), entrada e estado
+# dos filtros são tratados como silêncio
+SILENCE_DB = -96.0
+MIN_SCAN_INTERVAL = 8192 # Menor intervalo entre verificações do estado durante a cauda
+
+class ReverbProcessor:
+    def __init__(self, fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain=0.4,
+                 channels=None, spread=0, silence_db=SILENCE_DB):
+        """
+        Reverb de Schroeder com estado persistente (processamento em streaming).
         
-    aps = []
-    for i in range(len(delays_ap_ms)):
-        aps.append(AllPassFilter(delays_ap_ms[i], gains_ap[i], fs))
-    
-    N = len(x)
-    y = np.zeros(N, dtype=np.float32)
+        Os buffers circulares dos combs e all-pass são mantidos entre chamadas de
+        `process`. Com `channels`, processa blocos (N, C) em uma única passada, com
+        os atrasos dos combs do canal c deslocados em c * spread amostras.
+        
+        Detecção de silêncio: depois de `scan_interval` amostras seguidas com a
+        entrada abaixo do limiar (contadas na posição absoluta do fluxo), o pico
+        dos buffers é verificado; se todos estão abaixo dele, os buffers são
+        zerados e as amostras seguintes abaixo do limiar saem só com o sinal seco,
+        sem rodar os filtros, até a primeira amostra acima dele. As decisões são
+        tomadas por amostra, então a saída (e `skipped`) não depende da divisão
+        da entrada em blocos.
+        
+        A saída difere do processamento completo (silence_db=None) pela resposta
+        dos filtros ao que foi descartado: entrada e estado abaixo do limiar T.
+        Essa diferença é limitada por T * wet_gain * (média de 1 / (1 - |g|) nos
+        combs) * (produto de 1 + 2|g| nos all-pass), não por T: os combs amplificam
+        sinais abaixo do limiar. Com silence_db=None, não há diferença.
+        
+        Args:
+            fs: Taxa de amostragem do áudio.
+            delays_combs_ms: Atrasos dos Comb Filters (paralelo) em ms.
+            gains_combs: Ganhos de realimentação dos Comb Filters.
+            delays_ap_ms: Atrasos dos All-Pass (série) em ms.
+            gains_ap: Ganhos dos All-Pass.
+            wet_gain: Ganho do sinal reverberado somado ao sinal seco.
+            channels: Número de canais (None = mono, blocos 1D).
+            spread: Defasagem (em amostras) dos combs entre canais consecutivos.
+            silence_db: Limiar da detecção de silêncio em dBFS (None desliga).
+        """
+        self.fs = fs
+        self.wet_gain = wet_gain
+        self.silence_threshold = None if silence_db is None else 10.0 ** (silence_db / 20.0)
+        self.silent = True # Buffers zerados (estado inicial)
+        self._quiet_run = 0 # Amostras em silêncio desde a última verificação do estado
+        self.skipped = 0 # Amostras em que o banco de filtros não rodou
+        self.work = WorkBuffers()
+        
+        # Atrasos dos combs por canal: [canal][comb]
+        if channels is not None:
+            delays_per_channel = [spread_delays(delays_combs_ms, fs, c * spread) for c in range(channels)]
+        
+        # 1. Inicializa Filtros (Recebendo MS direto)
+        self.combs = []
+        for i in range(len(delays_combs_ms)):
+            delay = delays_combs_ms[i] if channels is None else [d[i] for d in delays_per_channel]
+            self.combs.append(IIRCombFilter(delay, gains_combs[i], fs, channels))
+            
+        self.aps = []
+        for i in range(len(delays_ap_ms)):
+            self.aps.append(AllPassFilter(delays_ap_ms[i], gains_ap[i], fs, channels))
+        
+        self.comb_scale = 1.0 / len(self.combs)
+        
+        # Intervalo entre verificações do estado durante a cauda
+        self.scan_interval = max([MIN_SCAN_INTERVAL] + [int(np.max(f.delay_samples)) for f in self.combs + self.aps])
+
+    def process(self, x, out=None):
+        """
+        Processa um bloco de áudio (sem normalização) mantendo o estado dos filtros.
+        Com `out` (float32, forma de `x`) e os kernels compilados, o bloco não
+        aloca memória (temporários em buffers de trabalho reutilizados).
+        """
+        y = np.empty(np.shape(x), dtype=np.float32) if out is None else out
+        if self.silence_threshold is None or len(x) == 0:
+            return self._render(x, y)
+
+        # Amostras acima do limiar (em qualquer canal)
+        N = len(x)
+        magnitude = np.abs(x, out=self.work.get("magnitude", np.shape(x), x.dtype))
+        above = np.greater(magnitude, self.silence_threshold, out=self.work.get("above", np.shape(x), bool))
+        loud = above if above.ndim == 1 else np.any(above, axis=1, out=self.work.get("loud", (N,), bool))
+        # Reserva os buffers de _render também em blocos em silêncio (ex.: warmup)
+        self.work.get("comb_sum", np.shape(x))
+        self.work.get("comb_out", np.shape(x))
+
+        i = 0
+        while i < N:
+            if self.silent:
+                # Estado zerado: só o sinal seco até a próxima amostra acima do limiar
+                b = self._next_loud(loud, i)
+                y[i:b] = x[i:b]
+                self.skipped += b - i
+                if b < N:
+                    self.silent = False
+                    self._quiet_run = 0
+                i = b
+                continue
+
+            # Cauda ativa: renderiza até a entrada completar scan_interval amostras
+            # seguidas em silêncio (o estado é então verificado) ou até o fim do bloco
+            b = self._next_scan(loud, i)
+            self._render(x[i:b], y[i:b])
+            if self._quiet_run >= self.scan_interval:
+                self._quiet_run = 0
+                if self._state_peak() <= self.silence_threshold:
+                    self._flush()
+            i = b
+        return y
+
+    @staticmethod
+    def _next_loud(loud, i):
+        """Primeira amostra alta em [i, N), ou N."""
+        rest = loud[i:]
+        return i + int(np.argmax(rest)) if rest.any() else len(loud)
+
+    def _next_scan(self, loud, i):
+        """
+        Posição (em [i, N]) em que a sequência de amostras em silêncio chega a
+        scan_interval, contando as `_quiet_run` já acumuladas antes de `i`. Se
+        não chega dentro do bloco, retorna N e atualiza `_quiet_run`.
+        """
+        N = len(loud)
+        needed = self.scan_interval - self._quiet_run
+        first = self._next_loud(loud, i)
+        if first == N:
+            # Bloco em silêncio a partir de i: a sequência continua
+            if N - i >= needed:
+                self._quiet_run = self.scan_interval
+                return i + needed
+            self._quiet_run += N - i
+            return N
+        if first - i >= needed:
+            self._quiet_run = self.scan_interval
+            return i + needed
+
+        last = N - 1 - int(np.argmax(loud[::-1]))
+        if last - first > self.scan_interval:
+            # Blocos longos: uma sequência inteira pode caber entre duas amostras altas
+            loud_idx = first + np.flatnonzero(loud[first:last + 1])
+            gaps = np.flatnonzero(np.diff(loud_idx) > self.scan_interval)
+            if len(gaps):
+                self._quiet_run = self.scan_interval
+                return int(loud_idx[gaps[0]]) + 1 + self.scan_interval
+
+        if N - 1 - last >= self.scan_interval:
+            self._quiet_run = self.scan_interval
+            return last + 1 + self.scan_interval
+        self._quiet_run = N - 1 - last
+        return N
+
+    def _state_peak(self):
+        """Maior valor absoluto guardado nos buffers dos filtros."""
+        return max(float(peak_level(f.buffer)) for f in self.combs + self.aps)
+
+    def _flush(self):
+        """Zera o estado dos filtros (cauda abaixo do limiar)."""
+        for f in self.combs + self.aps:
+            f.buffer[:] = 0.0
+        self.silent = True
+
+    def _tail_threshold(self, threshold):
+        """Limiar da cauda: `threshold`, o limiar de silêncio ou SILENCE_DB, nessa ordem (None = não informado)."""
+        if threshold is None:
+            threshold = self.silence_threshold
+        if threshold is None:
+            threshold = 10.0 ** (SILENCE_DB / 20.0)
+        if threshold <= 0.0:
+            raise ValueError("Limiar da cauda deve ser > 0 (um decaimento exponencial nunca chega a zero).")
+        return threshold
+
+    def tail_length(self, threshold=None):
+        """
+        Limite superior, em amostras, do tempo para o estado atual decair abaixo de
+        `threshold` (padrão: o limiar de silêncio) com a entrada em silêncio
+        (tamanho do render da cauda em tail()).
 
-    comb_scale = 1.0 / len(combs) 
+        Sem entrada, cada comb decai por g a cada volta no seu buffer de M amostras:
+        k = log(limiar / pico) / log(g) voltas. Os all-pass, em série, começam a
+        decair quando o estágio anterior já decaiu, com o estado limitado por
+        pico + entrada / (1 - |g|).
+        """
+        threshold = self._tail_threshold(threshold)
+
+        def passes(peak, gain):
+            if peak <= threshold:
+                return 0
+            gain = abs(gain)
+            if gain >= 1.0:
+                raise ValueError("Filtro com ganho >= 1: a cauda não decai.")
+            if gain == 0.0:
+                return 1
+            return int(np.ceil(np.log(threshold / peak) / np.log(gain))) + 1
+
+        tail = 0
+        level = 0.0 # Limite do sinal que entra no próximo estágio
+        for comb in self.combs:
+            peak = float(peak_level(comb.buffer))
+            tail = max(tail, passes(peak, comb.gain) * int(np.max(comb.delay_samples)))
+            level = max(level, peak)
+
+        for ap in self.aps:
+            gain = abs(ap.gain)
+            peak = float(peak_level(ap.buffer)) + level / (1.0 - gain)
+            tail += passes(peak, gain) * int(np.max(ap.delay_samples))
+            level = peak * (1.0 + gain)
+
+        return tail
+
+    def tail(self, threshold=None):
+        """
+        Cauda do reverb após o fim da entrada: processa silêncio por
+        tail_length() amostras e corta a saída depois da última amostra acima do
+        limiar (duração exata da cauda). O estado termina zerado.
+
+        Returns:
+            np.ndarray: (T,) ou (T, C), só o sinal reverberado.
+        """
+        threshold = self._tail_threshold(threshold)
+        n = self.tail_length(threshold)
+        y = self._render(np.zeros((n,) + self.combs[0].buffer.shape[1:], dtype=np.float32))
+
+        loud = np.nonzero(peak_level(y.reshape(n, -1), axis=1) > threshold)[0] if n else []
+        self._flush()
+        return y[:loud[-1] + 1] if len(loud) else y[:0]
+
+    def _render(self, x, out=None):
+        """Banco de filtros completo sobre o bloco (sem detecção de silêncio)."""
+        # Cada filtro avança sobre o bloco inteiro de forma vetorizada (ver
+        # IIRCombFilter.process_block). Como os filtros são independentes entre si,
+        # os combs podem rodar sobre a entrada toda e cada all-pass sobre a saída
+        # completa do estágio anterior.
+        shape = np.shape(x)
+        work = self.work
         
-    # 2. Loop de Áudio
-    for n in range(N):
-        input_sample = x[n]
         # Soma dos Combs (Paralelo)
-        comb_sum = 0.0
-        for comb in combs:
-            comb_sum += comb.process(input_sample)
+        comb_sum = work.get("comb_sum", shape)
+        comb_sum[:] = 0.0
+        comb_out = work.get("comb_out", shape)
+        for comb in self.combs:
+            comb_sum += comb.process_block(x, out=comb_out)
             
-        ap_out = comb_sum * comb_scale
+        ap_in = np.multiply(comb_sum, self.comb_scale, out=comb_sum)
             
-        # Série de All-Pass
-        for ap in aps:
-            ap_out = ap.process(ap_out)
+        # Série de All-Pass (alternando entre dois buffers)
+        ap_out = comb_out
+        for ap in self.aps:
+            ap.process_block(ap_in, out=ap_out)
+            ap_in, ap_out = ap_out, ap_in
             
-        reverb_signal = ap_out
+        reverb_signal = ap_in
         
-        #y[n] = (x[n] * (1 - wet_gain)) + (reverb_signal * wet_gain)
-        y[n] = input_sample + (reverb_signal * wet_gain)
-            
-    # 3. Normalização de Segurança (Evita o ruído digital se passar de 1.0)
-    max_amp = np.max(np.abs(y))
-    if max_amp > 1.0:
-        if print_info:
-            print(f" > Normalizando volume final (Pico: {max_amp:.2f})")
-        y = y / max_amp
+        #y = (x * (1 - wet_gain)) + (reverb_signal * wet_gain)
+        reverb_signal *= self.wet_gain
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        return np.add(x, reverb_signal, out=out, casting="same_kind")
+
+def spread_delays(delays_combs_ms, fs, spread=23):
+    """Atrasos dos combs do canal direito: desloca cada atraso em `spread` amostras."""
+    spread_ms = (spread / fs) * 1000.0
+    return [d + spread_ms for d in delays_combs_ms]
+
+class StereoReverbProcessor:
+    def __init__(self, fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain=0.4, spread=23,
+                 silence_db=SILENCE_DB):
+        """
+        Reverb Estéreo com estado persistente: L e R usam atrasos ligeiramente diferentes.
         
-    return y
+        Os dois canais rodam em uma única passada (filtros multicanal). Blocos mono
+        são duplicados em L e R; blocos estéreo (N, 2) mantêm a imagem original.
+        Devolve blocos (N, 2).
+        """
+        self.reverb = ReverbProcessor(fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain,
+                                      channels=2, spread=spread, silence_db=silence_db)
 
-def apply_reverb_stereo(x, fs, delays_combs, gains_combs, delays_ap, gains_ap, wet_gain=0.4, spread=23):
+    def process(self, x, out=None):
+        """
+        Processa um bloco mono ou estéreo e retorna o bloco estéreo (N, 2), sem
+        normalização. `out`: array float32 (N, 2) para a saída (ver ReverbProcessor.process).
+        """
+        if np.ndim(x) == 1:
+            stereo = self.reverb.work.get("stereo_in", (len(x), 2), np.result_type(x, np.float32))
+            stereo[:, 0] = x
+            stereo[:, 1] = x
+            x = stereo
+        return self.reverb.process(x, out)
+
+    def tail(self, threshold=None):
+        """Cauda estéreo (T, 2) após o fim da entrada (ver ReverbProcessor.tail)."""
+        return self.reverb.tail(threshold)
+
+def apply_reverb(x, fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain=0.4, print_info=True,
+                 tail=False, silence_db=SILENCE_DB):
     """
-    Gera um Reverb Estéreo processando L e R com atrasos ligeiramente diferentes.
+    Aplica o reverb ao sinal inteiro. Com tail=True, a saída inclui a cauda
+    completa após o fim da entrada (até decair abaixo de silence_db).
     """
-    # 1. Calcula desvio em ms para o canal direito
-    spread_ms = (spread / fs) * 1000.0
     
-    # Canal Esquerdo (Parâmetros Originais)
-    left = apply_reverb(x, fs, delays_combs, gains_combs, delays_ap, gains_ap, wet_gain)
-    
-    # Canal Direito (Parâmetros com Spread nos Combs)
-    delays_right = [d + spread_ms for d in delays_combs]
+    if print_info:
+        logger.info(f"--- Reverb: Processando {len(x)} amostras a {fs}Hz ---")
     
-    right = apply_reverb(x, fs, delays_right, gains_combs, delays_ap, gains_ap, wet_gain)
+    with profile_stage("reverb", len(x), fs) as stage:
+        channels = x.shape[1] if np.ndim(x) > 1 else None
+        reverb = ReverbProcessor(fs, delays_combs_ms, gains_combs, delays_ap_ms, gains_ap, wet_gain, channels=channels,
+                                 silence_db=silence_db)
+        y = reverb.process(x)
+        if tail:
+            y = np.concatenate((y, reverb.tail()))
+        if reverb.skipped:
+            stage.event("silence_skipped", samples=reverb.skipped)
+        stage.buffer(y)
+                
+        # Normalização de Segurança (Evita o ruído digital se passar de 1.0)
+        finalize(y, fs, stage=stage, log=print_info)
+        
+    return y
+
+def apply_reverb_stereo(x, fs, delays_combs, gains_combs, delays_ap, gains_ap, wet_gain=0.4, spread=23,
+                        tail=False, silence_db=SILENCE_DB):
+    """
+    Gera um Reverb Estéreo processando L e R com atrasos ligeiramente diferentes.
+    Aceita entrada mono (N,) ou estéreo (N, 2). Com tail=True, inclui a cauda
+    completa após o fim da entrada.
+    """
+    logger.info(f"--- Reverb Estéreo: Processando {len(x)} amostras a {fs}Hz ---")
     
-    # Junta em estéreo (N, 2)
-    stereo_output = np.column_stack((left, right))
+    with profile_stage("reverb_stereo", len(x), fs) as stage:
+        reverb = StereoReverbProcessor(fs, delays_combs, gains_combs, delays_ap, gains_ap, wet_gain, spread, silence_db)
+        stereo_output = reverb.process(x)
+        if tail:
+            stereo_output = np.concatenate((stereo_output, reverb.tail()))
+        if reverb.reverb.skipped:
+            stage.event("silence_skipped", samples=reverb.reverb.skipped)
+        stage.buffer(stereo_output)
+        
+        # Normalização de Segurança (N, 2)
+        # Entrada mono: independente por canal. Entrada estéreo: pico comum, preservando a imagem.
+        finalize(stereo_output, fs, per_channel=np.ndim(x) == 1, stage=stage)
     
-    return stereo_output
\ No newline at end of file
+    return stereo_output
@@ -1,43 +1,68 @@
 import numpy as np
-from effects.assets import Oscillator
+from effects.assets import Oscillator, WorkBuffers
+from effects.dynamics import finalize
+from instrumentation import get_logger, profile_stage
+
+logger = get_logger(__name__)
+
+class TremoloProcessor:
+    def __init__(self, fs, rate_hz=5.0, depth=0.8, table_size=None):
+        """
+        Tremolo com estado persistente (fase do LFO mantida entre blocos).
+
+        Args:
+            fs: Taxa de amostragem do áudio.
+            rate_hz: Velocidade da oscilação (Típico: 3Hz a 8Hz).
+            depth: Profundidade do efeito (0.0 a 1.0).
+            table_size: Tamanho da tabela de onda do LFO (None usa np.sin).
+        """
+        self.fs = fs
+
+        # 1. CONFIGURAR O LFO (OSCILADOR)
+        # A profundidade do tremolo (0 a 1, controla quanto o volume varia)
+        amp_val = depth / 2.0
+        center_val = 1.0 - amp_val
+
+        # Instancia o LFO
+        self.lfo = Oscillator(fs=fs,
+                              rate_hz=rate_hz,
+                              center_val=center_val,
+                              range_val=amp_val,
+                              table_size=table_size)
+        self.work = WorkBuffers()
+
+    def process(self, x, out=None):
+        """
+        Processa um bloco (N,) ou (N, C) (sem normalização) mantendo a fase do LFO.
+        Com `out` (float32, forma de `x`), o bloco não aloca memória.
+        """
+        # A. Obter o ganho do LFO para o bloco inteiro
+        gains = self.lfo.block(len(x), out=self.work.get("gains", (len(x),), np.float64))
+
+        # Blocos multicanal (N, C): o mesmo ganho em todos os canais
+        if np.ndim(x) == 2:
+            gains = gains[:, None]
+
+        # B. Aplicação do Tremolo (AM)
+        # y[n] = x[n] * (1 + depth * sin(2*pi*rate*n/fs)) / 2
+        if out is None:
+            out = np.empty(np.shape(x), dtype=np.float32)
+        return np.multiply(x, gains, out=out, casting="same_kind")
 
 def apply_tremolo(x, fs, rate_hz=5.0, depth=0.8):
-    """    
+    """
     Args:
         x: Sinal de áudio de entrada.
         fs: Taxa de amostragem do áudio.
         rate_hz: Velocidade da oscilação (Típico: 3Hz a 8Hz).
-        depth: Profundidade do efeito (0.0 a 1.0). 
+        depth: Profundidade do efeito (0.0 a 1.0).
     """
-    print(f"--- Tremolo: Rate={rate_hz}Hz, Depth={depth} ---")
-    
-    N = len(x)
-    y = np.zeros(N, dtype=np.float32)
-    
-    # 1. CONFIGURAR O LFO (OSCILADOR)
-    # A profundidade do tremolo (0 a 1, controla quanto o volume varia)     
-    amp_val = depth / 2.0
-    center_val = 1.0 - amp_val
-    
-    # Instancia o LFO
-    lfo = Oscillator(fs=fs, 
-                     rate_hz=rate_hz, 
-                     center_val=center_val, 
-                     range_val=amp_val)
-    
-    # 2. PROCESSAMENTO
-    for n in range(N):
-        input_sample = x[n]
-        
-        # A. Obter o ganho atual do LFO
-        current_gain = lfo.next()
-        
-        # B. Aplicação do Tremolo (AM)
-        # y[n] = x[n] * (1 + depth * sin(2*pi*rate*n/fs)) / 2
-        y[n] = input_sample * current_gain
-    
-    peak = np.max(np.abs(y))
-    if peak > 1.0:
-        y /= peak
-        
-    return y
\ No newline at end of file
+    logger.info(f"--- Tremolo: Rate={rate_hz}Hz, Depth={depth} ---")
+
+    with profile_stage("tremolo", len(x), fs) as stage:
+        tremolo = TremoloProcessor(fs, rate_hz, depth)
+        y = tremolo.process(x)
+        stage.buffer(y)
+        finalize(y, fs, stage=stage, log=False)
+
+    return y
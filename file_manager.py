@@ -1,5 +1,12 @@
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from audio_io import load_wav
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
 
 # Definição das constantes de nomes de efeitos baseados na VEDO A8
 EFFECTS_MAP = {
@@ -31,26 +38,127 @@ EFFECTS_MAP = {
 }
 
 class AudioManager:
-    def __init__(self, base_folder="audio_files", dry_key="ORIGINAL"):
+    def __init__(self, base_folder="audio_files", dry_key="ORIGINAL", max_bytes=512 * 1024 ** 2,
+                 decoded_folder="output/decoded"):
+        """
+        Acesso aos áudios do EFFECTS_MAP com cache LRU limitado por tamanho.
+
+        Cada WAV é decodificado (float32 normalizado) uma única vez para um .npy em
+        `decoded_folder`; as leituras seguintes retornam visões mapeadas em memória,
+        somente leitura, desse arquivo (as páginas ficam a cargo do sistema
+        operacional). Se a pasta não puder ser usada (decoded_folder=None ou erro
+        de escrita), o áudio decodificado fica em RAM.
+
+        Args:
+            base_folder: Pasta dos arquivos WAV.
+            dry_key: Chave do áudio seco no EFFECTS_MAP.
+            max_bytes: Orçamento do cache em bytes; os áudios usados há mais tempo saem primeiro.
+            decoded_folder: Pasta dos .npy decodificados (None = sem mapeamento em memória).
+        """
         self.base_folder = base_folder
         self.dry_key = dry_key
         self.dry_filename = EFFECTS_MAP.get(dry_key, "original.wav") 
         self.dry_path = os.path.join(base_folder, self.dry_filename)
-        self.audio_cache = {} 
+        self.max_bytes = max_bytes
+        self.decoded_folder = decoded_folder
+
+        self.audio_cache = OrderedDict() # chave -> (fs, data), do menos ao mais recente
+        self.cache_bytes = 0
+        self._lock = threading.Lock()
+        self._pending = {} # chave -> Future das pré-cargas em andamento
+        self._executor = None
         
     def get_dry_audio(self):
-        return self.get_target_audio("ORIGINAL")
+        return self.get_target_audio(self.dry_key)
 
-    def get_target_audio(self, effect_key):
-        """Retorna (fs, data) do áudio processado pela mesa para um efeito específico."""
+    def get_target_audio(self, effect_key, mono=True):
+        """
+        Retorna (fs, data) do áudio processado pela mesa para um efeito específico.
+        Com mono=False, gravações estéreo são retornadas como (N, 2).
+        O array pode ser uma visão somente leitura: copie-o antes de modificar.
+        """
         if effect_key not in EFFECTS_MAP:
             raise ValueError(f"Efeito '{effect_key}' não definido no mapa.")
             
+        cache_key = effect_key if mono else (effect_key, "multicanal")
+
+        # Pré-carga em andamento: espera o resultado em vez de decodificar de novo
+        future = self._pending.get(cache_key)
+        if future is not None:
+            future.result()
+
+        with self._lock:
+            if cache_key in self.audio_cache:
+                self.audio_cache.move_to_end(cache_key)
+                return self.audio_cache[cache_key]
+
+        entry = self._load(effect_key, mono)
+        self._store(cache_key, entry)
+        return entry
+
+    def prefetch(self, *effect_keys, mono=True):
+        """
+        Decodifica os efeitos em segundo plano (uma thread), para que o próximo
+        alvo já esteja pronto quando get_target_audio for chamado.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        for effect_key in effect_keys:
+            cache_key = effect_key if mono else (effect_key, "multicanal")
+            with self._lock:
+                if cache_key in self.audio_cache or cache_key in self._pending:
+                    continue
+                self._pending[cache_key] = self._executor.submit(self._prefetch_one, effect_key, mono, cache_key)
+
+    def _prefetch_one(self, effect_key, mono, cache_key):
+        try:
+            self._store(cache_key, self._load(effect_key, mono))
+        finally:
+            with self._lock:
+                self._pending.pop(cache_key, None)
+
+    def _load(self, effect_key, mono):
+        """Decodifica o WAV (ou abre o .npy já decodificado, mapeado em memória)."""
         filename = EFFECTS_MAP[effect_key]
         full_path = os.path.join(self.base_folder, filename)
-        
-        if effect_key not in self.audio_cache:
-            print(f"Carregando alvo para {effect_key}: {filename}...")
-            self.audio_cache[effect_key] = load_wav(full_path)
-            
-        return self.audio_cache[effect_key]
\ No newline at end of file
+
+        if self.decoded_folder is not None:
+            suffix = "mono" if mono else "multicanal"
+            npy_path = os.path.join(self.decoded_folder, f"{os.path.splitext(filename)[0]}_{suffix}.npy")
+            fs_path = npy_path[:-4] + ".fs"
+
+            # Reaproveita o .npy se for mais novo que o WAV
+            if os.path.exists(fs_path) and os.path.getmtime(fs_path) >= os.path.getmtime(full_path):
+                with open(fs_path) as f:
+                    fs = int(f.read())
+                return fs, np.load(npy_path, mmap_mode="r")
+
+        logger.info(f"Carregando alvo para {effect_key}: {filename}...")
+        fs, data = load_wav(full_path, mono=mono)
+
+        if self.decoded_folder is not None:
+            try:
+                os.makedirs(self.decoded_folder, exist_ok=True)
+                np.save(npy_path, data)
+                # O arquivo .fs é escrito por último: marca o .npy como completo
+                with open(fs_path, "w") as f:
+                    f.write(str(fs))
+                data = np.load(npy_path, mmap_mode="r")
+            except OSError:
+                pass # Sem acesso à pasta: mantém o áudio em RAM
+
+        return fs, data
+
+    def _store(self, cache_key, entry):
+        """Insere no cache e descarta os itens menos usados até caber no orçamento."""
+        with self._lock:
+            if cache_key in self.audio_cache:
+                self.cache_bytes -= self.audio_cache.pop(cache_key)[1].nbytes
+            self.audio_cache[cache_key] = entry
+            self.cache_bytes += entry[1].nbytes
+
+            # O item recém-inserido sempre fica (mesmo se sozinho passar do orçamento)
+            while self.cache_bytes > self.max_bytes and len(self.audio_cache) > 1:
+                _, (_, evicted) = self.audio_cache.popitem(last=False)
+                self.cache_bytes -= evicted.nbytes
@@ -1,101 +1,86 @@
 import os
+from functools import partial
 from audio_io import load_wav, save_wav
-from effects.reverb import apply_reverb_stereo
-from effects.flanger import apply_flanger
-from effects.tremolo import apply_tremolo
-from pitch_shift.shift_assets import shift_to_note
-
-REVERB_PRESETS = {
-    "REV-HALL": {
-        "combs_ms": [26.84, 28.02, 45.82, 33.63],
-        "combs_gains": [0.758, 0.854, 0.796, 0.825],
-        "aps_ms": [2.35, 6.9],
-        "aps_gains": [0.653, 0.659],
-        "wet_gain": 0.4
-    },
-    "REV-ROOM": {
-        "combs_ms": [419, 359, 251, 467],
-        "combs_gains": [0.50, 0.48, 0.56, 0.44],
-        "aps_ms": [7.06, 6.46],
-        "aps_gains": [0.716, 0.613],
-        "wet_gain": 0.2
-    },
-    "REV-STAGE": {
-        "combs_ms": [46.27, 39.96, 28.03, 51.85],
-        "combs_gains": [0.758, 0.854, 0.796, 0.825],
-        "aps_ms": [3.5, 1.2],
-        "aps_gains": [0.7, 0.7],
-        "wet_gain": 0.5
-    }
-}
+from batch_render import render_batch
+from pipeline import load_spec, build_chain, render_chain
+from render_cache import audio_digest, default_cache, make_key
+from instrumentation import get_logger, default_profiler
+
+logger = get_logger(__name__)
+
+SPEC_PATH = "specs/final_effects.json"
+DRY_PATH = "audio_files/original.wav"
+PROFILE_FOLDER = "output/profile" # Perfil por estágio (com DSP_PROFILE=1)
+
+def task_parts(task):
+    """Partes independentes de uma tarefa: cadeias com reverb estéreo renderizam L e R separadamente."""
+    if any(stage["effect"] == "reverb_stereo" for stage in task["chain"]):
+        return [0, 1]
+    return [None]
+
+def task_key(task, presets, digest, fs):
+    """Chave do cache de renders: áudio seco + cadeia + presets usados por ela."""
+    used = {stage["preset"]: presets[stage["preset"]] for stage in task["chain"] if "preset" in stage}
+    return make_key(digest, "final_effects.render_task", {"chain": task["chain"], "presets": used, "fs": fs})
+
+def render_task(audio, fs, task, channel, presets, source=None):
+    """
+    Renderiza uma tarefa (ou um canal dela). Executada nos workers do render_batch.
+    `source` (caminho do WAV de `audio`) permite usar o cache da detecção de raiz
+    nos estágios com root_note "auto"; sem ele, a raiz é detectada no próprio sinal.
+    """
+    logger.info(f"\nProcessando: {task['name']} ({' -> '.join(stage['effect'] for stage in task['chain'])})...")
+    chain = build_chain(task["chain"], fs, presets, channel, source=audio if source is None else source)
+    return render_chain(chain, audio)
 
 def main():
 
     output_folder = "output/final"
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-        
-    print("Carregando áudio original...")
-    fs, audio_original = load_wav("audio_files/original.wav") #
-
-    tasks = [
-        {"name": "REV-HALL",      "type": "reverb", "preset": "REV-HALL"},
-        {"name": "REV-ROOM2",      "type": "reverb", "preset": "REV-ROOM"},
-        {"name": "REV-STAGE B",   "type": "stage",  "note": "B4"},
-        {"name": "REV-STAGE D",   "type": "stage",  "note": "D4"},
-        {"name": "REV-STAGE F",   "type": "stage",  "note": "F4"},
-        {"name": "REV-STAGE Gb",  "type": "stage",  "note": "F#4"},
-        {"name": "FLANGER",       "type": "flanger"},
-        {"name": "TREMOLO",       "type": "tremolo"}
-    ]
-
-    print(f"--- Gerando {len(tasks)} efeitos em '{output_folder}' ---")
+
+    logger.info("Carregando áudio original...")
+    fs, audio_original = load_wav(DRY_PATH) #
+
+    # Cadeias de efeitos e presets definidos em arquivo
+    spec = load_spec(SPEC_PATH)
+    tasks = spec["tasks"]
+
+    logger.info(f"--- Gerando {len(tasks)} efeitos em '{output_folder}' ---")
+
+    # Tarefas já renderizadas com a mesma cadeia/presets saem do cache
+    digest = audio_digest(audio_original)
+    keys = {task["name"]: task_key(task, spec["presets"], digest, fs) for task in tasks}
+    results = {}
+    for task in tasks:
+        cached = default_cache.get(keys[task["name"]])
+        if cached is not None:
+            results[task["name"]] = (cached, 0.0)
+            logger.info(f" > {task['name']}: cache")
+            default_profiler.event("cache_hit", task=task["name"])
+
+    # Tarefas restantes (e canais L/R) distribuídas entre os núcleos
+    pending = [task for task in tasks if task["name"] not in results]
+    if pending:
+        render_fn = partial(render_task, presets=spec["presets"], source=DRY_PATH)
+        for name, (processed, elapsed) in render_batch(pending, audio_original, fs, render_fn, task_parts).items():
+            results[name] = (default_cache.put(keys[name], processed), elapsed)
 
     for task in tasks:
         name = task["name"]
-        effect_type = task["type"]
-        print(f"\nProcessando: {name}...")
-
-        if effect_type == "reverb":
-            
-            params = REVERB_PRESETS[task["preset"]]
-            processed = apply_reverb_stereo(
-                audio_original, fs,
-                delays_combs=params["combs_ms"],
-                gains_combs=params["combs_gains"],
-                delays_ap=params["aps_ms"],
-                gains_ap=params["aps_gains"],
-                wet_gain=params["wet_gain"]
-            )
-            
-        elif effect_type == "stage":
-            
-            target_note = task["note"]
-            print(f" > Aplicando Pitch Shift para {target_note}...")
-            shifted_audio = shift_to_note(audio_original, fs, target_note=target_note, root_note="C4")
-            
-            params = REVERB_PRESETS["REV-STAGE"]
-            print(f" > Aplicando Reverb Stage...")
-            processed = apply_reverb_stereo(
-                shifted_audio, fs,
-                delays_combs=params["combs_ms"],
-                gains_combs=params["combs_gains"],
-                delays_ap=params["aps_ms"],
-                gains_ap=params["aps_gains"],
-                wet_gain=params["wet_gain"]
-            )
-
-        elif effect_type == "flanger":
-            processed = apply_flanger(audio_original, fs)
-
-        elif effect_type == "tremolo":
-            processed = apply_tremolo(audio_original, fs)
+        processed, elapsed = results[name]
 
         filename = f"{output_folder}/{name.replace(' ', '_')}.wav"
         save_wav(filename, fs, processed)
-        print(f" > Salvo: {filename}")
+        logger.info(f" > Salvo: {filename} ({elapsed:.2f}s)")
+
+    logger.info("\nProcessamento concluído!")
 
-    print("\nProcessamento concluído!")
+    if default_profiler.enabled:
+        default_profiler.report(logger)
+        default_profiler.to_json(os.path.join(PROFILE_FOLDER, "final_effects.json"))
+        default_profiler.to_trace(os.path.join(PROFILE_FOLDER, "final_effects.trace.json"))
+        logger.info(f"Perfil salvo em '{PROFILE_FOLDER}'.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
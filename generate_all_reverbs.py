@@ -1,8 +1,14 @@
 import os
 import numpy as np
-from file_manager import AudioManager
+from file_manager import AudioManager, EFFECTS_MAP
 from audio_io import save_wav
 from effects.reverb import apply_reverb, apply_reverb_stereo
+from effects.convolution import load_ir, apply_convolution_reverb
+from pipeline import load_presets
+from render_cache import audio_digest, cached_call
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
 
 # Função auxiliar para estéreo (copiada do validate_effects.py)
 
@@ -11,40 +17,18 @@ def main():
     # 1. Configuração Inicial
     manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL") 
     fs, audio_original = manager.get_dry_audio()
+    digest = audio_digest(audio_original) # Chave do cache de renders (presets inalterados não re-renderizam)
     
     output_folder = "output"
 
-    # 2. Definição dos Presets (Parâmetros Otimizados/Primos)
-       
-    presets = {
-        "REV-HALL": {
-            "combs_ms": [26.84, 28.02, 45.82, 33.63],
-            "combs_gains": [0.758, 0.854, 0.796, 0.825],
-            "aps_ms": [2.35, 6.9],
-            "aps_gains": [0.653, 0.659],
-            "wet_gain": 0.4
-        },
-        "REV-ROOM": {
-            "combs_ms": [419, 359, 251, 467],
-            "combs_gains": [0.50, 0.48, 0.56, 0.44],
-            "aps_ms": [7.06, 6.46],
-            "aps_gains": [0.716, 0.613],
-            "wet_gain": 0.2
-        },
-        "REV-STAGE": {
-            "combs_ms": [46.27, 39.96, 28.03, 51.85],
-            "combs_gains": [0.758, 0.854, 0.796, 0.825],
-            "aps_ms": [3.5, 1.2],
-            "aps_gains": [0.7, 0.7],
-            "wet_gain": 0.5
-        }
-    }
+    # 2. Presets (Parâmetros Otimizados/Primos), compartilhados com final_effects.py
+    presets = load_presets("specs/reverb_presets.json")
 
-    print(f"--- Gerando 6 arquivos de Reverb (Mono/Stereo) ---")
+    logger.info(f"--- Gerando {2 * len(presets)} arquivos de Reverb (Mono/Stereo) ---")
 
     # 3. Loop de Geração
     for name, params in presets.items():
-        print(f"\nProcessando {name}...")
+        logger.info(f"\nProcessando {name}...")
         
         # Extrair parâmetross
         c_ms = params["combs_ms"]
@@ -54,33 +38,48 @@ def main():
         wet  = params["wet_gain"]
 
         # A. Gerar MONO
-        audio_mono = apply_reverb(
-            audio_original, fs, 
+        audio_mono = cached_call(
+            apply_reverb, audio_original, fs, 
             delays_combs_ms=c_ms, 
             gains_combs=c_g, 
             delays_ap_ms=a_ms, 
             gains_ap=a_g, 
-            wet_gain=wet
+            wet_gain=wet,
+            digest=digest
         )
         filename_mono = f"{output_folder}/{name}_mono.wav"
         save_wav(filename_mono, fs, audio_mono)
-        print(f" > Salvo: {filename_mono}")
+        logger.info(f" > Salvo: {filename_mono}")
 
         # B. Gerar ESTÉREO (com spread)
-        audio_stereo = apply_reverb_stereo(
-            audio_original, fs, 
+        audio_stereo = cached_call(
+            apply_reverb_stereo, audio_original, fs, 
             delays_combs=c_ms, 
             gains_combs=c_g, 
             delays_ap=a_ms, 
             gains_ap=a_g, 
             wet_gain=wet,
-            spread=23 # ~0.5ms de defasagem para abrir a imagem
+            spread=23, # ~0.5ms de defasagem para abrir a imagem
+            digest=digest
         )
         filename_stereo = f"{output_folder}/{name}_stereo.wav"
         save_wav(filename_stereo, fs, audio_stereo)
-        print(f" > Salvo: {filename_stereo}")
+        logger.info(f" > Salvo: {filename_stereo}")
+
+    # 4. Reverb por Convolução: IRs estimadas das gravações da mesa (REV-*)
+    reverb_keys = [key for key in EFFECTS_MAP if key.startswith("REV-")]
+    logger.info(f"\n--- Gerando {len(reverb_keys)} arquivos de Reverb por Convolução ---")
+
+    for i, key in enumerate(reverb_keys):
+        # A próxima gravação é decodificada em segundo plano enquanto esta é processada
+        manager.prefetch(*reverb_keys[i + 1:i + 2], mono=False)
+        ir = load_ir(key, manager)
+        audio_conv = cached_call(apply_convolution_reverb, audio_original, fs, ir, ir_key=key, digest=digest)
+        filename_conv = f"{output_folder}/{key.replace(' ', '_')}_conv.wav"
+        save_wav(filename_conv, fs, audio_conv)
+        logger.info(f" > Salvo: {filename_conv}")
 
-    print("\nConcluído! Verifique a pasta 'output/'.")
+    logger.info("\nConcluído! Verifique a pasta 'output/'.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+import contextlib
+
+# Instrumentação dos efeitos e das cadeias: mensagens via logging (no lugar dos
+# print) e um profiler que registra, por estágio, tempo de parede, amostras
+# processadas, fator de tempo real, memória dos buffers e eventos (ex.:
+# normalizações). Os registros podem ser exportados em JSON ou como trace
+# (formato Chrome Trace Event, aberto em chrome://tracing ou no Perfetto).
+#
+#   DSP_LOG=off|warning|info|debug   Nível das mensagens (padrão: info)
+#   DSP_PROFILE=1                    Liga o profiler padrão
+#   DSP_PROFILE_MEMORY=1             Mede o pico de memória por estágio (tracemalloc, mais lento)
+
+LOG_LEVEL = os.environ.get("DSP_LOG", "info").lower()
+PROFILE = os.environ.get("DSP_PROFILE", "").lower() in ("1", "on", "true")
+PROFILE_MEMORY = os.environ.get("DSP_PROFILE_MEMORY", "").lower() in ("1", "on", "true")
+
+class _StdoutHandler(logging.StreamHandler):
+    """Escreve no sys.stdout atual (respeita redirect_stdout), como o print fazia."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def _configure_logger():
+    root = logging.getLogger("dsp")
+    if not root.handlers:
+        handler = _StdoutHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(logging.CRITICAL + 1 if LOG_LEVEL in ("off", "0", "false")
+                  else getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+    return root
+
+_configure_logger()
+
+def get_logger(name):
+    """Logger de um módulo (filho de "dsp", que imprime só a mensagem no stdout)."""
+    return logging.getLogger(f"dsp.{name}")
+
+def set_log_level(level):
+    """Muda o nível das mensagens: "off", "warning", "info" ou "debug"."""
+    global LOG_LEVEL
+    LOG_LEVEL = str(level).lower()
+    _configure_logger()
+
+class Stage:
+    def __init__(self, profiler, name, samples, fs, info):
+        """Registro de um estágio em execução (ver Profiler.stage)."""
+        self.profiler = profiler
+        self.record = {"name": name, "samples": samples, "fs": fs, **info}
+
+    def event(self, name, **args):
+        """Registra um evento pontual no estágio (ex.: "normalize", peak=1.3)."""
+        self.profiler.event(name, stage=self.record["name"], **args)
+
+    def buffer(self, array):
+        """Contabiliza um buffer do estágio (bytes)."""
+        self.record["buffer_bytes"] = self.record.get("buffer_bytes", 0) + int(getattr(array, "nbytes", 0))
+
+class _NullStage:
+    """Estágio sem registro (profiler desligado)."""
+
+    def event(self, name, **args):
+        pass
+
+    def buffer(self, array):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Profiler:
+    def __init__(self, enabled=None, memory=None):
+        """
+        Coleta registros de estágios e eventos.
+
+        Cada estágio guarda: name, start (s desde a criação do profiler), wall_s,
+        samples, fs, realtime_factor (duração do áudio / tempo de parede),
+        buffer_bytes (buffers informados pelo estágio) e, com memory, peak_bytes
+        (pico de memória alocada durante o estágio, via tracemalloc).
+
+        Args:
+            enabled: Liga a coleta. Padrão: DSP_PROFILE.
+            memory: Mede o pico de memória por estágio. Padrão: DSP_PROFILE_MEMORY.
+        """
+        self.enabled = PROFILE if enabled is None else enabled
+        self.memory = PROFILE_MEMORY if memory is None else memory
+        self.records = []
+        self.events = []
+        self._origin = time.perf_counter()
+        self._epoch = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _finish(self, record, start, seconds):
+        record["start"] = start - self._origin
+        record["wall_s"] = seconds
+        record.setdefault("pid", os.getpid())
+        record.setdefault("tid", threading.get_ident())
+        if record.get("samples") and record.get("fs") and seconds > 0:
+            record["realtime_factor"] = record["samples"] / record["fs"] / seconds
+        with self._lock:
+            self.records.append(record)
+
+    @contextlib.contextmanager
+    def stage(self, name, samples=0, fs=None, **info):
+        """
+        Mede um estágio: `with profiler.stage("reverb", len(x), fs) as stage: ...`.
+
+        O objeto retornado aceita stage.event(...) e stage.buffer(array). Com o
+        profiler desligado, nada é medido.
+        """
+        if not self.enabled:
+            yield _NULL_STAGE
+            return
+
+        stage = Stage(self, name, int(samples), fs, info)
+        stack = self._stack()
+
+        # Pico de memória: o pico visto até aqui é repassado ao estágio externo
+        # antes de zerar o contador para este estágio
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._mem_peak = max(stack[-1]._mem_peak, peak)
+            tracemalloc.reset_peak()
+            stage._mem_start = stage._mem_peak = current
+
+        stack.append(stage)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if self.memory:
+                peak = max(stage._mem_peak, tracemalloc.get_traced_memory()[1])
+                stage.record["peak_bytes"] = peak - stage._mem_start
+                if stack:
+                    stack[-1]._mem_peak = max(stack[-1]._mem_peak, peak)
+            self._finish(stage.record, start, seconds)
+
+    def add(self, name, seconds, samples=0, fs=None, **info):
+        """Registra um estágio medido externamente (ex.: tempo acumulado bloco a bloco)."""
+        if self.enabled:
+            self._finish({"name": name, "samples": int(samples), "fs": fs, **info},
+                         time.perf_counter() - seconds, seconds)
+
+    def event(self, name, **args):
+        """Registra um evento pontual."""
+        if self.enabled:
+            with self._lock:
+                self.events.append({"name": name, "time": time.perf_counter() - self._origin,
+                                    "pid": os.getpid(), "tid": threading.get_ident(), **args})
+
+    def drain(self):
+        """Retorna e limpa os registros (para enviá-los de um worker ao processo principal)."""
+        with self._lock:
+            data = {"epoch": self._epoch, "records": self.records, "events": self.events}
+            self.records, self.events = [], []
+        return data
+
+    def merge(self, data):
+        """Incorpora os registros de drain() de outro processo, no relógio deste profiler."""
+        if not self.enabled or not data:
+            return
+        shift = data["epoch"] - self._epoch
+        with self._lock:
+            self.records.extend({**r, "start": r["start"] + shift} for r in data["records"])
+            self.events.extend({**e, "time": e["time"] + shift} for e in data["events"])
+
+    def reset(self):
+        self.drain()
+        self._origin = time.perf_counter()
+        self._epoch = time.time()
+
+    def summary(self):
+        """Totais por nome de estágio: calls, wall_s, samples, realtime_factor e peak_bytes."""
+        totals = {}
+        for r in self.records:
+            t = totals.setdefault(r["name"], {"calls": 0, "wall_s": 0.0, "samples": 0, "audio_s": 0.0,
+                                              "buffer_bytes": 0, "peak_bytes": 0})
+            t["calls"] += 1
+            t["wall_s"] += r["wall_s"]
+            t["samples"] += r.get("samples") or 0
+            if r.get("fs"):
+                t["audio_s"] += (r.get("samples") or 0) / r["fs"]
+            t["buffer_bytes"] = max(t["buffer_bytes"], r.get("buffer_bytes", 0))
+            t["peak_bytes"] = max(t["peak_bytes"], r.get("peak_bytes", 0))
+
+        for t in totals.values():
+            t["realtime_factor"] = t["audio_s"] / t["wall_s"] if t["wall_s"] > 0 and t["audio_s"] else None
+        return totals
+
+    def report(self, logger=None):
+        """Escreve o resumo por estágio no logger (nível info)."""
+        logger = logger or get_logger("profile")
+        logger.info("--- Perfil por estágio ---")
+        for name, t in sorted(self.summary().items(), key=lambda kv: -kv[1]["wall_s"]):
+            rtf = f"{t['realtime_factor']:8.1f}x" if t["realtime_factor"] else "        -"
+            logger.info(f" > {name:24s} {t['calls']:4d}x {t['wall_s']:8.3f}s {rtf} tempo real  "
+                        f"buffers {t['buffer_bytes'] / 1024 ** 2:7.1f} MB  pico {t['peak_bytes'] / 1024 ** 2:7.1f} MB")
+        normalizations = sum(1 for e in self.events if e["name"] == "normalize")
+        if normalizations:
+            logger.info(f" > {normalizations} normalização(ões)")
+
+    def to_json(self, path):
+        """Exporta registros, eventos e resumo em JSON."""
+        report = {
+            "meta": {"epoch": self._epoch, "pid": os.getpid()},
+            "summary": self.summary(),
+            "stages": self.records,
+            "events": self.events,
+        }
+        _write_json(path, report)
+
+    def to_trace(self, path):
+        """Exporta no formato Chrome Trace Event (tempos em microssegundos)."""
+        trace = []
+        for r in self.records:
+            args = {k: v for k, v in r.items() if k not in ("name", "start", "wall_s", "pid", "tid")}
+            trace.append({"name": r["name"], "cat": "dsp", "ph": "X", "ts": r["start"] * 1e6,
+                          "dur": r["wall_s"] * 1e6, "pid": r["pid"], "tid": r["tid"], "args": args})
+        for e in self.events:
+            args = {k: v for k, v in e.items() if k not in ("name", "time", "pid", "tid")}
+            trace.append({"name": e["name"], "cat": "dsp", "ph": "i", "s": "t", "ts": e["time"] * 1e6,
+                          "pid": e["pid"], "tid": e["tid"], "args": args})
+        _write_json(path, {"traceEvents": trace, "displayTimeUnit": "ms"})
+
+def _write_json(path, data):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, default=float)
+
+# Profiler padrão usado pelos efeitos e pelas cadeias
+default_profiler = Profiler()
+
+def profile_stage(name, samples=0, fs=None, **info):
+    """Atalho para default_profiler.stage (ver Profiler.stage)."""
+    return default_profiler.stage(name, samples, fs, **info)
@@ -1,36 +1,237 @@
 import numpy as np
+from audio_io import iter_wav_blocks
+from alignment import estimate_alignment, align_files
 
-def calculate_mse(original, processed):
-    """Mean Squared Error"""
-    # Garante mesmo tamanho
-    min_len = min(len(original), len(processed))
-    original = original[:min_len]
-    processed = processed[:min_len]
-    
-    return np.mean((original - processed) ** 2)
-
-def calculate_snr(original, processed):
-    """Signal to Noise Ratio (dB) assuming 'processed' tries to mimic 'original'"""
-    min_len = min(len(original), len(processed))
-    original = original[:min_len]
-    processed = processed[:min_len]
-    
-    noise = original - processed
-    signal_power = np.sum(original ** 2)
-    noise_power = np.sum(noise ** 2)
-    
-    if noise_power == 0:
-        return np.inf
-    
-    return 10 * np.log10(signal_power / noise_power)
-
-def calculate_prd(original, processed):
-    """Percent Root-mean-square Difference"""
-    min_len = min(len(original), len(processed))
-    original = original[:min_len]
-    processed = processed[:min_len]
-    
-    numerator = np.sum((original - processed) ** 2)
-    denominator = np.sum(original ** 2)
-    
-    return np.sqrt(numerator / denominator) * 100
\ No newline at end of file
+# Limites usados no SNR segmental (dB): quadros de silêncio ou idênticos não dominam a média
+SEGMENTAL_SNR_RANGE = (-10.0, 35.0)
+
+class StreamingMetrics:
+    def __init__(self, frame_size=None, spectral=False, batched=False):
+        """
+        Acumula MSE, SNR e PRD (e, opcionalmente, métricas por quadro e espectrais)
+        sobre blocos recebidos em sequência, em uma única passada pelos dados.
+
+        Args:
+            frame_size: Tamanho do quadro das métricas por quadro (SNR segmental).
+                        None as desativa.
+            spectral: Se True (requer frame_size), calcula também a distância
+                      log-espectral e a convergência espectral por quadro.
+            batched: Se True, cada `processed` de update() é uma pilha de K sinais
+                     e os resultados são arrays (K,).
+        """
+        if spectral and frame_size is None:
+            raise ValueError("Métricas espectrais precisam de frame_size.")
+
+        self.frame_size = frame_size
+        self.spectral = spectral
+
+        self.n = 0
+        self.batched = batched
+        self.sse = None # Soma dos erros quadráticos (por sinal processado)
+        self.ref_power = 0.0 # Soma de reference ** 2
+
+        # Amostras que ainda não completam um quadro
+        self._ref_tail = None
+        self._proc_tail = None
+        self._frame_snr = []
+        self._lsd = []
+        self._spec_diff = None # Soma de (|R| - |P|)^2
+        self._spec_ref = 0.0 # Soma de |R|^2
+        if spectral:
+            self._window = np.hanning(frame_size)
+
+    def update(self, reference, processed):
+        """
+        Acumula um bloco. `reference` é (n,) ou (n, C); `processed` tem a mesma
+        forma, ou é uma pilha (K, n) / (K, n, C) com batched. Os dois são cortados
+        ao menor tamanho. Com vários canais, as métricas cobrem todas as amostras
+        de todos os canais (e os quadros, todos os canais juntos).
+        """
+        # Forma interna: referência (n, C) e processados (K, n, C)
+        reference = np.asarray(reference, dtype=np.float64)
+        reference = reference.reshape(len(reference), -1)
+        processed = np.asarray(processed, dtype=np.float64)
+        if not self.batched:
+            processed = processed[None]
+        processed = processed.reshape(len(processed), processed.shape[1], -1)
+
+        # Garante mesmo tamanho
+        n = min(len(reference), processed.shape[1])
+        reference = reference[:n]
+        processed = processed[:, :n]
+
+        if self.sse is None:
+            self.sse = np.zeros(len(processed))
+        error = reference - processed
+        self.sse += np.einsum("knc,knc->k", error, error)
+        self.ref_power += np.sum(reference ** 2)
+        self.n += reference.size
+
+        if self.frame_size is not None:
+            self._update_frames(reference, processed)
+
+    def _update_frames(self, reference, processed):
+        """Métricas por quadro sobre os quadros completos (o resto fica para o próximo bloco)."""
+        if self._ref_tail is not None:
+            reference = np.concatenate((self._ref_tail, reference))
+            processed = np.concatenate((self._proc_tail, processed), axis=1)
+
+        F = len(reference) // self.frame_size
+        used = F * self.frame_size
+        self._ref_tail = reference[used:]
+        self._proc_tail = processed[:, used:]
+        if F == 0:
+            return
+
+        C = reference.shape[1]
+        ref_frames = reference[:used].reshape(F, self.frame_size, C)
+        proc_frames = processed[:, :used].reshape(len(processed), F, self.frame_size, C)
+
+        # SNR por quadro (limitado a SEGMENTAL_SNR_RANGE)
+        frame_power = np.sum(ref_frames ** 2, axis=(1, 2))
+        frame_sse = np.sum((ref_frames - proc_frames) ** 2, axis=(2, 3))
+        with np.errstate(divide="ignore"):
+            snr = 10 * np.log10(frame_power / frame_sse)
+        self._frame_snr.append(np.clip(snr, *SEGMENTAL_SNR_RANGE))
+
+        if self.spectral:
+            window = self._window[:, None]
+            R = np.abs(np.fft.rfft(ref_frames * window, axis=-2)) # (F, bins, C)
+            P = np.abs(np.fft.rfft(proc_frames * window, axis=-2)) # (K, F, bins, C)
+
+            # Distância log-espectral por quadro (dB)
+            log_diff = 20 * np.log10((R + 1e-10) / (P + 1e-10))
+            self._lsd.append(np.sqrt(np.mean(log_diff ** 2, axis=(-2, -1))))
+
+            # Convergência espectral: || |R| - |P| || / || R || (sobre todos os quadros)
+            diff = np.sum((R - P) ** 2, axis=(1, 2, 3))
+            self._spec_diff = diff if self._spec_diff is None else self._spec_diff + diff
+            self._spec_ref += np.sum(R ** 2)
+
+    def result(self):
+        """
+        Dict com "mse", "snr" (dB) e "prd" (%), mais "segmental_snr" e "frame_snr"
+        (por quadro) com frame_size, e "lsd"/"spectral_convergence" com spectral.
+        Escalares para um único sinal processado, ou arrays (K,) (frame_snr: (K, F))
+        para uma pilha.
+        """
+        if self.sse is None:
+            raise ValueError("Nenhum bloco foi acumulado.")
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = {
+                "mse": self.sse / self.n,
+                "snr": np.where(self.sse == 0, np.inf, 10 * np.log10(self.ref_power / self.sse)),
+                "prd": np.sqrt(self.sse / self.ref_power) * 100,
+            }
+
+        if self.frame_size is not None:
+            frame_snr = (np.concatenate(self._frame_snr, axis=1) if self._frame_snr
+                         else np.zeros((len(self.sse), 0)))
+            out["frame_snr"] = frame_snr
+            out["segmental_snr"] = np.mean(frame_snr, axis=1) if frame_snr.shape[1] else np.full(len(self.sse), np.nan)
+
+            if self.spectral:
+                lsd = np.concatenate(self._lsd, axis=1) if self._lsd else np.zeros((len(self.sse), 0))
+                out["lsd"] = np.mean(lsd, axis=1) if lsd.shape[1] else np.full(len(self.sse), np.nan)
+                out["spectral_convergence"] = (np.sqrt(self._spec_diff / self._spec_ref)
+                                               if self._spec_diff is not None else np.full(len(self.sse), np.nan))
+
+        if not self.batched:
+            out = {key: value[0] for key, value in out.items()}
+            for key in ("mse", "snr", "prd", "segmental_snr", "lsd", "spectral_convergence"):
+                if key in out:
+                    out[key] = float(out[key])
+        return out
+
+def _mono(x):
+    """Média dos canais de um sinal (N, C), usada apenas na estimativa do alinhamento."""
+    return x if np.ndim(x) == 1 else np.mean(x, axis=1)
+
+def compute_metrics(original, processed, frame_size=None, spectral=False, align=True, chunk_size=65536,
+                    batched=False):
+    """
+    MSE, SNR e PRD (e as métricas opcionais por quadro/espectrais) em uma passada.
+
+    Args:
+        original: Sinal de referência (N,) ou (N, C).
+        processed: Sinal processado da mesma forma, ou, com batched, uma pilha
+                   (K, N) / (K, N, C) (ou lista) comparada de uma vez.
+        frame_size, spectral: Ver StreamingMetrics.
+        align: Se True, cada sinal processado é antes alinhado à referência
+               (atraso e ganho, ver alignment.estimate_alignment) e as métricas
+               cobrem o trecho comum a todos eles.
+        chunk_size: Amostras por bloco (limita os temporários de pilhas grandes).
+        batched: `processed` é uma pilha de sinais; os resultados são arrays (K,).
+    """
+    metrics = StreamingMetrics(frame_size, spectral, batched)
+    rows = processed if batched else [processed]
+
+    if align:
+        lags, gains = zip(*(estimate_alignment(_mono(original), _mono(row)) for row in rows))
+    else:
+        lags, gains = [0] * len(rows), [1.0] * len(rows)
+
+    # Trecho da referência coberto por todos os sinais alinhados
+    ref_start = max(max(0, -lag) for lag in lags)
+    ref_stop = min(min(len(original), len(row) - lag) for row, lag in zip(rows, lags))
+
+    for start in range(ref_start, max(ref_stop, ref_start + 1), chunk_size):
+        stop = min(start + chunk_size, ref_stop)
+        chunk = [row[start + lag:stop + lag] * gain if gain != 1.0 else row[start + lag:stop + lag]
+                 for row, lag, gain in zip(rows, lags, gains)]
+        metrics.update(original[start:stop], np.stack(chunk) if batched else chunk[0])
+
+    return metrics.result()
+
+def compare_files(original_path, processed_paths, frame_size=None, spectral=False, align=True, block_size=65536):
+    """
+    Compara arquivos WAV bloco a bloco (mono), sem carregá-los na memória.
+
+    Args:
+        original_path: WAV de referência.
+        processed_paths: Um caminho, ou uma lista de caminhos (resultados em arrays (K,)).
+        align: Se True, cada arquivo é antes alinhado à referência (atraso e ganho,
+               em cache por par de arquivos, ver alignment.align_files).
+    """
+    batched = not isinstance(processed_paths, str)
+    paths = list(processed_paths) if batched else [processed_paths]
+
+    if align:
+        lags, gains = zip(*(align_files(original_path, path) for path in paths))
+    else:
+        lags, gains = [0] * len(paths), [1.0] * len(paths)
+
+    # Todos os arquivos começam no mesmo ponto da referência (já alinhados)
+    ref_start = max(max(0, -lag) for lag in lags)
+
+    metrics = StreamingMetrics(frame_size, spectral, batched)
+    readers = [iter_wav_blocks(path, block_size, start=ref_start + lag) for path, lag in zip(paths, lags)]
+    for _, reference in iter_wav_blocks(original_path, block_size, start=ref_start):
+        blocks = [next(reader, (None, None))[1] for reader in readers]
+        n = min([len(reference)] + [len(b) if b is not None else 0 for b in blocks])
+        if n == 0:
+            break
+        blocks = [b[:n] * gain for b, gain in zip(blocks, gains)]
+        metrics.update(reference[:n], np.stack(blocks) if batched else blocks[0])
+
+    return metrics.result()
+
+def calculate_mse(original, processed, align=True):
+    """
+    Erro quadrático médio (MSE).
+
+    Por padrão, `processed` é antes alinhado a `original` (atraso e ganho, ver
+    compute_metrics), como nas comparações com as gravações da mesa. Use
+    align=False para comparar amostra a amostra sinais já alinhados (corte ao
+    menor tamanho, o comportamento original).
+    """
+    return compute_metrics(original, processed, align=align)["mse"]
+
+def calculate_snr(original, processed, align=True):
+    """Relação sinal-ruído (dB), supondo que 'processed' tenta reproduzir 'original' (alinhamento: ver calculate_mse)."""
+    return compute_metrics(original, processed, align=align)["snr"]
+
+def calculate_prd(original, processed, align=True):
+    """Diferença percentual da raiz quadrática média (PRD) (alinhamento: ver calculate_mse)."""
+    return compute_metrics(original, processed, align=align)["prd"]
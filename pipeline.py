@@ -0,0 +1,395 @@
+import os
+import copy
+import json
+import time
+import inspect
+import numpy as np
+from audio_io import iter_wav_blocks, WavWriter
+from effects.reverb import ReverbProcessor, StereoReverbProcessor, spread_delays, SILENCE_DB
+from effects.flanger import FlangerProcessor
+from effects.tremolo import TremoloProcessor
+from effects.convolution import ConvolutionReverbProcessor, load_ir
+from effects import dynamics
+from effects.dynamics import LookaheadLimiter, finalize, peak_level
+from effects.assets import WorkBuffers
+from pitch_shift.pitch_shift import PitchShiftProcessor
+from pitch_shift.notes import A4, freq_to_midi, semitones_between
+from pitch_shift.detection import detect_root, detect_file_root
+from pitch_shift.shift_assets import is_auto_root
+from instrumentation import default_profiler, profile_stage
+
+# Tamanho do bloco usado para encadear os estágios (memória intermediária = 1 bloco)
+BLOCK_SIZE = 8192
+
+def load_spec(path):
+    """
+    Carrega uma especificação de cadeia de efeitos (JSON ou YAML).
+
+    Se o campo "presets" for uma string, ele é tratado como o caminho (relativo ao
+    arquivo da especificação) de outro arquivo com os presets de reverb.
+    """
+    spec = _load_file(path)
+
+    presets = spec.get("presets", {})
+    if isinstance(presets, str):
+        presets = _load_file(os.path.join(os.path.dirname(path), presets))
+    spec["presets"] = presets
+
+    return spec
+
+def _load_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML é necessário para carregar especificações YAML.")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def load_presets(path="specs/reverb_presets.json"):
+    """Carrega apenas os presets de reverb (compartilhados entre os scripts)."""
+    return _load_file(path)
+
+def _detected_root(fs, source):
+    """
+    Frequência raiz (Hz) da entrada da cadeia, para root_note/root_freq "auto":
+    arquivo WAV (com cache por arquivo) ou sinal (ver pitch_shift.detection).
+    """
+    if source is None:
+        raise ValueError("Raiz 'auto' precisa da entrada da cadeia (build_chain(..., source=...)).")
+    root = detect_file_root(source) if isinstance(source, str) else detect_root(source, fs)
+    if root is None:
+        raise ValueError("Não foi possível detectar a nota raiz da entrada da cadeia.")
+    return root
+
+def uses_auto_root(chain_spec):
+    """True se algum estágio de pitch shift da cadeia usa root_note/root_freq "auto"."""
+    return any(stage["effect"] == "pitch_shift"
+               and (is_auto_root(stage.get("root_note")) or is_auto_root(stage.get("root_freq")))
+               for stage in chain_spec)
+
+def _semitones(stage, fs=None, source=None):
+    """
+    Deslocamento em semitons de um estágio de pitch shift: "semitones", "note"
+    (com "root_note"), "freq" (com "root_freq") ou "envelope" (pontos [tempo em s,
+    semitons]), mais um "cents" opcional.
+    Notas aceitam os formatos de notes.to_midi (ex.: "Bb3", "A4+15c", "432Hz").
+    Com root_note ou root_freq "auto", a raiz é detectada em `source`, a entrada
+    da cadeia (caminho do WAV ou sinal), e não na saída dos estágios anteriores.
+    """
+    cents = stage.get("cents", 0.0)
+    if "envelope" in stage:
+        # Automação: pontos [tempo em s, semitons], interpolados pelo RealTimePitchShifter
+        envelope = np.array(stage["envelope"], dtype=np.float64).reshape(-1, 2)
+        envelope[:, 1] += cents / 100.0
+        return envelope
+
+    if "semitones" in stage:
+        return stage["semitones"] + cents / 100.0 if cents else stage["semitones"]
+
+    if "note" in stage:
+        a4 = stage.get("a4", A4)
+        root_note = stage.get("root_note", "C4")
+        if is_auto_root(root_note):
+            root_note = float(freq_to_midi(_detected_root(fs, source), a4))
+        semitones = float(semitones_between(stage["note"], root_note, a4=a4, cents=cents))
+        if np.isnan(semitones):
+            raise ValueError(f"Nota '{root_note}' ou '{stage['note']}' inválida.")
+        return semitones
+
+    root_freq = stage.get("root_freq", 261.63)
+    if is_auto_root(root_freq):
+        root_freq = _detected_root(fs, source)
+
+    # n = 12 * log2(f_target / f_root)
+    return 12.0 * np.log2(stage["freq"] / root_freq) + cents / 100.0
+
+def _reverb_params(stage, presets):
+    """Parâmetros de reverb de um estágio: preset nomeado, com sobrescritas opcionais."""
+    params = dict(presets[stage["preset"]]) if "preset" in stage else {}
+    for key in ("combs_ms", "combs_gains", "aps_ms", "aps_gains", "wet_gain"):
+        if key in stage:
+            params[key] = stage[key]
+    return params
+
+def build_stage(stage, fs, presets, channel=None, channels=None, source=None):
+    """
+    Cria o processador de um estágio da cadeia.
+
+    Args:
+        stage: Dict com a chave "effect" e os parâmetros do efeito.
+        fs: Taxa de amostragem.
+        presets: Presets de reverb nomeados.
+        channel: Se informado (0 ou 1), um "reverb_stereo" gera apenas esse canal
+                 (usado para dividir L e R entre processos).
+        channels: Número de canais da entrada do estágio (None = mono).
+        source: Entrada da cadeia (caminho do WAV ou sinal), usada pelos estágios
+                de pitch shift com raiz "auto".
+    """
+    effect = stage["effect"]
+
+    if effect in ("reverb", "reverb_stereo"):
+        p = _reverb_params(stage, presets)
+        args = (p["combs_ms"], p["combs_gains"], p["aps_ms"], p["aps_gains"], p.get("wet_gain", 0.4))
+        silence_db = stage.get("silence_db", SILENCE_DB)
+
+        if effect == "reverb":
+            return ReverbProcessor(fs, *args, channels=channels, silence_db=silence_db)
+
+        spread = stage.get("spread", 23)
+        if channel is None:
+            return StereoReverbProcessor(fs, *args, spread=spread, silence_db=silence_db)
+        if channel == 1:
+            args = (spread_delays(p["combs_ms"], fs, spread),) + args[1:]
+        return ReverbProcessor(fs, *args, silence_db=silence_db)
+
+    elif effect == "pitch_shift":
+        return PitchShiftProcessor(fs, _semitones(stage, fs, source), window_size_ms=stage.get("window_size_ms", 40),
+                                   channels=channels)
+
+    elif effect == "flanger":
+        return FlangerProcessor(fs,
+                                delay_min_ms=stage.get("delay_min_ms", 1.0),
+                                delay_max_ms=stage.get("delay_max_ms", 5.0),
+                                rate_hz=stage.get("rate_hz", 0.5),
+                                depth_gain=stage.get("depth_gain", 0.7),
+                                channels=channels)
+
+    elif effect == "convolution":
+        # IR estimada de uma gravação da mesa ("ir": chave do EFFECTS_MAP) ou arquivo .npy
+        if "ir_path" in stage:
+            ir, ir_key = np.load(stage["ir_path"]), stage["ir_path"]
+        else:
+            from file_manager import AudioManager
+            ir = load_ir(stage["ir"], AudioManager(), stage.get("length_s", 1.5))
+            ir_key = (stage["ir"], stage.get("length_s", 1.5))
+        return ConvolutionReverbProcessor(fs, ir,
+                                          block_size=stage.get("block_size", 1024),
+                                          wet_gain=stage.get("wet_gain", 1.0),
+                                          dry_gain=stage.get("dry_gain", 0.0),
+                                          ir_key=ir_key,
+                                          channels=channels)
+
+    elif effect == "tremolo":
+        return TremoloProcessor(fs,
+                                rate_hz=stage.get("rate_hz", 5.0),
+                                depth=stage.get("depth", 0.8))
+
+    elif effect == "limiter":
+        return LookaheadLimiter(fs,
+                                ceiling=stage.get("ceiling", 1.0),
+                                lookahead_ms=stage.get("lookahead_ms", 5.0),
+                                release_ms=stage.get("release_ms", 80.0),
+                                true_peak=stage.get("true_peak", False))
+
+    raise ValueError(f"Efeito '{effect}' não suportado na cadeia.")
+
+class EffectChain:
+    def __init__(self, processors, names=None, fs=None):
+        """
+        Cadeia de processadores com estado, aplicados em série bloco a bloco.
+
+        Args:
+            processors: Processadores (objetos com process(bloco)).
+            names: Nome de cada estágio nos registros do profiler (padrão: nome da classe).
+            fs: Taxa de amostragem (fator de tempo real nos registros).
+        """
+        self.processors = processors
+        self.names = names or [type(processor).__name__ for processor in processors]
+        self.fs = fs
+        self.stage_seconds = [0.0] * len(processors) # Tempo acumulado por estágio (com profiler)
+        # Estágios cujo process() aceita `out` (saída em um buffer reutilizado)
+        self.accepts_out = ["out" in inspect.signature(processor.process).parameters for processor in processors]
+        self.work = WorkBuffers() # Saída de cada estágio (process com reuse=True)
+
+    def _stage(self, i, x, reuse):
+        """Aplica o estágio i; com `reuse`, escreve no buffer de saída do bloco anterior."""
+        processor = self.processors[i]
+        if not (reuse and self.accepts_out[i]):
+            return processor.process(x)
+
+        name = f"stage{i}"
+        out = self.work.find(name, len(x))
+        if out is not None:
+            return processor.process(x, out=out)
+        y = processor.process(x)
+        if not np.may_share_memory(y, x): # Não reutiliza a própria entrada como saída
+            self.work.keep(name, y)
+        return y
+
+    def process(self, x, reuse=False):
+        """
+        Passa um bloco por todos os estágios (sem normalização).
+
+        Args:
+            x: Bloco de entrada (N,) ou (N, C).
+            reuse: Reutiliza a saída de cada estágio entre blocos (ex.: BlockScheduler).
+                   O resultado só vale até a próxima chamada.
+        """
+        if not default_profiler.enabled:
+            for i in range(len(self.processors)):
+                x = self._stage(i, x, reuse)
+            return x
+
+        for i in range(len(self.processors)):
+            t0 = time.perf_counter()
+            x = self._stage(i, x, reuse)
+            self.stage_seconds[i] += time.perf_counter() - t0
+        return x
+
+    def flush_profile(self, samples):
+        """Registra no profiler o tempo acumulado de cada estágio (sobre `samples` amostras) e zera."""
+        for name, seconds in zip(self.names, self.stage_seconds):
+            default_profiler.add(f"chain/{name}", seconds, samples, self.fs)
+        self.stage_seconds = [0.0] * len(self.processors)
+
+    @property
+    def latency(self):
+        """Atraso total da cadeia em amostras (estágios por blocos, ex.: convolução)."""
+        return sum(getattr(processor, "latency", 0) for processor in self.processors)
+
+def build_chain(chain_spec, fs, presets, channel=None, channels=None, source=None):
+    """
+    Cria uma EffectChain a partir da lista de estágios de uma tarefa.
+
+    Args:
+        channels: Número de canais da entrada (None = mono). Um estágio
+                  "reverb_stereo" (sem `channel`) passa a saída para 2 canais.
+        source: Entrada que a cadeia vai processar (caminho do WAV ou sinal);
+                necessária apenas para estágios com root_note/root_freq "auto".
+    """
+    processors = []
+    names = []
+    for stage in chain_spec:
+        processor = build_stage(stage, fs, presets, channel, channels, source)
+        processors.append(processor)
+        names.append(stage["effect"])
+        if stage["effect"] == "reverb_stereo" and channel is None:
+            channels = 2
+        elif stage["effect"] == "convolution" and not processor.mono_out:
+            channels = processor.out_channels # IR estéreo
+    return EffectChain(processors, names, fs)
+
+def render_chain(chain, x, block_size=BLOCK_SIZE):
+    """
+    Renderiza o sinal inteiro pela cadeia, bloco a bloco.
+
+    Os estágios são fundidos: cada bloco atravessa a cadeia inteira antes do
+    próximo, então entre estágios só existe um bloco intermediário. O nível da
+    saída segue a política de effects.dynamics: com "peak", cada canal é
+    normalizado pelo seu pico ao final (como nas funções apply_*); com "limit",
+    um limitador com look-ahead é aplicado bloco a bloco após o último estágio.
+    A latência da cadeia é compensada (a entrada é completada com zeros e o
+    início da saída é descartado).
+    """
+    with profile_stage("render_chain", len(x), chain.fs, stages=list(chain.names)) as profile:
+        limiter = LookaheadLimiter(chain.fs) if dynamics.NORMALIZATION == "limit" else None
+        latency = chain.latency + (limiter.latency if limiter is not None else 0)
+        if latency:
+            padded = np.zeros((len(x) + latency,) + np.shape(x)[1:], dtype=np.float32)
+            padded[:len(x)] = x
+            x = padded
+
+        y = None
+        for start in range(0, len(x), block_size):
+            block = chain.process(x[start:start + block_size])
+            if limiter is not None:
+                block = limiter.process(block)
+            if y is None:
+                y = np.zeros((len(x),) + block.shape[1:], dtype=np.float32)
+            y[start:start + len(block)] = block
+        chain.flush_profile(len(x))
+
+        if y is not None:
+            y = y[latency:]
+
+        if y is None:
+            return np.zeros(0, dtype=np.float32)
+        profile.buffer(y)
+
+        # Normalização de segurança (independente por canal)
+        if limiter is None:
+            finalize(y, chain.fs, per_channel=True, stage=profile, log=False)
+
+    return y
+
+def _stream_chain(chain, in_path, block_size, mono, limiter=None):
+    """
+    Blocos de saída da cadeia (e do limitador opcional) para um WAV, em streaming,
+    com a latência compensada: as primeiras `latency` amostras são descartadas e
+    as retidas no final são empurradas com zeros. Gera (fs, bloco).
+    """
+    latency = chain.latency + (limiter.latency if limiter is not None else 0)
+    skip = latency
+    fs = block = None
+
+    def run(x):
+        y = chain.process(x)
+        return limiter.process(y) if limiter is not None else y
+
+    for fs, block in iter_wav_blocks(in_path, block_size, mono=mono):
+        y = run(block)
+        # Descarta as primeiras `latency` amostras (atraso dos estágios por blocos)
+        drop = min(skip, len(y))
+        skip -= drop
+        yield fs, y[drop:]
+
+    # Empurra as últimas amostras ainda retidas pela latência
+    if block is not None and latency:
+        y = run(np.zeros((latency,) + block.shape[1:], dtype=np.float32))
+        yield fs, y[skip:]
+
+def render_file(chain, in_path, out_path, block_size=BLOCK_SIZE, mono=True, normalize="clip"):
+    """
+    Renderiza um arquivo WAV pela cadeia em streaming (memória constante).
+
+    Os blocos são lidos do arquivo mapeado em memória, processados e escritos
+    como int16 assim que ficam prontos. Com mono=False, arquivos multicanal são
+    lidos como (N, C) (a cadeia deve ter sido criada com o mesmo número de
+    canais). A latência da cadeia é compensada como em render_chain.
+
+    Args:
+        normalize: Nível da saída, sem manter o sinal inteiro em memória:
+            "clip" - amostras acima de 1.0 são limitadas (clip) na escrita;
+            "limit" - limitador com look-ahead após o último estágio (uma passada);
+            "peak" - duas passadas: a primeira, sobre uma cópia da cadeia e sem
+                     escrever, mede o pico de cada canal; a segunda escreve os
+                     blocos divididos por ele (como render_chain).
+    Returns:
+        int: Número de amostras escritas.
+    """
+    fs = chain.fs
+    t0 = time.perf_counter()
+
+    gain = None
+    if normalize == "peak":
+        measure = copy.deepcopy(chain) # Estado inicial intacto para a segunda passada
+        peak = None
+        for _, y in _stream_chain(measure, in_path, block_size, mono):
+            if len(y):
+                block_peak = peak_level(y, axis=0)
+                peak = block_peak if peak is None else np.maximum(peak, block_peak)
+        measure.flush_profile(0)
+        if peak is not None and np.any(peak > 1.0):
+            gain = (1.0 / np.where(peak > 1.0, peak, 1.0)).astype(np.float32)
+
+    limiter = LookaheadLimiter(chain.fs) if normalize == "limit" else None
+    writer = None
+    written = 0
+    try:
+        for fs, y in _stream_chain(chain, in_path, block_size, mono, limiter):
+            if writer is None:
+                writer = WavWriter(out_path, fs, channels=y.shape[1] if y.ndim > 1 else 1)
+            if gain is not None:
+                y *= gain
+            writer.write(y)
+            written += len(y)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    chain.flush_profile(written)
+    default_profiler.add("render_file", time.perf_counter() - t0, written, fs, path=in_path, normalize=normalize)
+    return written
+
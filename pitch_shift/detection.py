@@ -0,0 +1,193 @@
+import os
+import json
+import numpy as np
+import scipy.fft
+from audio_io import iter_wav_blocks, wav_info
+from pitch_shift.notes import freq_to_midi, midi_to_freq, note_name
+from instrumentation import get_logger, profile_stage
+
+logger = get_logger(__name__)
+
+# Estimação da frequência fundamental (f0) quadro a quadro pelo algoritmo YIN
+# (de Cheveigné & Kawahara, 2002), vetorizado sobre os quadros: a função de
+# diferença sai da autocorrelação via FFT de todos os quadros de um bloco de uma
+# vez, sem laços em Python por quadro ou por atraso.
+#
+# A nota raiz de um sinal é a mediana (em semitons) dos f0 dos quadros com altura
+# definida. Para arquivos, o resultado fica em cache (CACHE_PATH), com o tamanho e
+# a data de modificação do arquivo, como em alignment.align_files.
+
+FRAME_SIZE = 2048 # Amostras por quadro (2x o maior período procurado, com folga)
+HOP_SIZE = 1024 # Passo entre quadros
+ROOT_HOP_SIZE = 2048 # Passo na detecção da raiz (quadros sem sobreposição bastam para a mediana)
+F0_MIN = 50.0 # Faixa de busca (Hz)
+F0_MAX = 1000.0
+THRESHOLD = 0.15 # Limite da diferença normalizada: acima dele, o quadro não tem altura definida
+SILENCE_DB = -60.0 # Quadros com RMS abaixo disso (dBFS) são ignorados
+FRAMES_PER_BATCH = 256 # Quadros analisados juntos (limita os temporários da FFT)
+CACHE_PATH = "output/cache/pitch.json"
+
+# Cache em memória dos arquivos analisados (espelha o arquivo CACHE_PATH)
+_file_cache = {}
+
+def yin(frames, fs, f0_min=F0_MIN, f0_max=F0_MAX, threshold=THRESHOLD, silence_db=SILENCE_DB):
+    """
+    f0 de cada quadro pelo YIN.
+
+    Para um quadro x de W amostras e a janela de integração w = W - tau_max:
+        d(tau)  = sum_{j<w} (x[j] - x[j + tau])^2 = E(0) + E(tau) - 2 r(tau)
+        d'(tau) = d(tau) * tau / sum_{k=1..tau} d(k)   (diferença normalizada)
+    com E(tau) = energia de x[tau:tau + w] (soma acumulada) e r(tau) a correlação
+    de x[:w] com x (FFT). O período é o primeiro mínimo local de d' abaixo de
+    `threshold` (ou o mínimo global, se não houver), refinado por interpolação
+    parabólica.
+
+    Args:
+        frames: Quadros (F, W).
+        fs: Taxa de amostragem.
+        f0_min, f0_max: Faixa de busca em Hz (tau_max é limitado a W/2).
+        threshold: Limite de d' para um quadro ter altura definida.
+        silence_db: Quadros com RMS abaixo disso recebem NaN.
+    Returns:
+        (f0, aperiodicidade): arrays (F,); f0 é NaN nos quadros sem altura definida.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    F, W = frames.shape
+    tau_max = min(int(np.ceil(fs / f0_min)), W // 2)
+    tau_min = min(max(int(fs / f0_max), 2), tau_max - 1)
+    w = W - tau_max
+    taus = np.arange(tau_max + 1)
+
+    # A. Função de diferença. Com n_fft >= W, a correlação circular não se mistura
+    # (j + tau < w + tau_max = W para todos os termos). FFT em float32 (scipy.fft);
+    # as energias, que se cancelam perto do período, ficam em float64
+    n_fft = scipy.fft.next_fast_len(W, real=True)
+    spectrum = scipy.fft.rfft(frames, n_fft)
+    spectrum *= np.conj(scipy.fft.rfft(frames[:, :w], n_fft))
+    r = scipy.fft.irfft(spectrum, n_fft)[:, :tau_max + 1]
+
+    energy = np.zeros((F, W + 1))
+    np.cumsum(np.square(frames, dtype=np.float64), axis=1, out=energy[:, 1:])
+    diff = energy[:, w:] - energy[:, :tau_max + 1] # E(tau)
+    diff += energy[:, w:w + 1] - 2.0 * r
+    np.maximum(diff, 0.0, out=diff)
+
+    # B. Diferença normalizada pela média acumulada (d'(0) = 1)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmnd = np.ones_like(diff)
+    np.divide(diff[:, 1:] * taus[1:], running, out=cmnd[:, 1:], where=running > 0)
+
+    # C. Primeiro mínimo local abaixo do limite em [tau_min, tau_max)
+    search = cmnd[:, tau_min:tau_max]
+    dips = (search < threshold) & (search <= cmnd[:, tau_min + 1:tau_max + 1])
+    tau = np.where(dips.any(axis=1), np.argmax(dips, axis=1), np.argmin(search, axis=1)) + tau_min
+
+    # D. Interpolação parabólica em torno do mínimo
+    rows = np.arange(F)
+    before, center, after = cmnd[rows, tau - 1], cmnd[rows, tau], cmnd[rows, tau + 1]
+    curvature = before - 2.0 * center + after
+    shift = np.zeros(F)
+    np.divide(0.5 * (before - after), curvature, out=shift, where=curvature > 0)
+    np.clip(shift, -1.0, 1.0, out=shift)
+
+    f0 = fs / (tau + shift)
+    silent = energy[:, W] < W * 10 ** (silence_db / 10)
+    f0[(center >= threshold) | silent] = np.nan
+    return f0, center
+
+def _frames(blocks, frame_size, hop):
+    """
+    Quadros (F, frame_size) com passo `hop` sobre uma sequência de blocos (N,),
+    guardando entre os blocos as amostras do próximo quadro. Cada item é uma visão
+    válida até o próximo.
+    """
+    rest = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        data = np.concatenate((rest, block))
+        count = (len(data) - frame_size) // hop + 1 if len(data) >= frame_size else 0
+        for start in range(0, count, FRAMES_PER_BATCH):
+            stop = min(start + FRAMES_PER_BATCH, count)
+            yield np.lib.stride_tricks.sliding_window_view(data[start * hop:(stop - 1) * hop + frame_size],
+                                                           frame_size)[::hop]
+        rest = data[count * hop:]
+
+def _analyze(blocks, fs, frame_size, hop, **yin_args):
+    """f0 de todos os quadros de uma sequência de blocos (ver yin)."""
+    parts = [yin(frames, fs, **yin_args)[0] for frames in _frames(blocks, frame_size, hop)]
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+def estimate_f0(x, fs, frame_size=FRAME_SIZE, hop=HOP_SIZE, **yin_args):
+    """
+    Curva de f0 de um sinal (mono; sinais (N, C) são convertidos pela média dos canais).
+
+    Args:
+        x: Sinal de entrada.
+        fs: Taxa de amostragem.
+        frame_size, hop: Tamanho e passo dos quadros.
+        **yin_args: f0_min, f0_max, threshold, silence_db (ver yin).
+    Returns:
+        (tempos, f0): centro de cada quadro em s e f0 em Hz (NaN sem altura definida).
+    """
+    x = np.asarray(x)
+    if x.ndim > 1:
+        x = x.mean(axis=1)
+
+    with profile_stage("pitch_detection", len(x), fs):
+        block = FRAMES_PER_BATCH * hop
+        f0 = _analyze((x[i:i + block] for i in range(0, len(x), block)), fs, frame_size, hop, **yin_args)
+
+    times = (np.arange(len(f0)) * hop + frame_size / 2) / fs
+    return times, f0
+
+def root_frequency(f0):
+    """Frequência raiz de uma curva de f0: mediana em semitons dos quadros com altura definida (None se nenhum)."""
+    voiced = np.asarray(f0)[~np.isnan(f0)]
+    if len(voiced) == 0:
+        return None
+    return float(midi_to_freq(np.median(freq_to_midi(voiced))))
+
+def detect_root(x, fs, frame_size=FRAME_SIZE, hop=ROOT_HOP_SIZE, **yin_args):
+    """Frequência raiz (Hz) de um sinal, ou None se nenhum quadro tem altura definida (ver estimate_f0)."""
+    root = root_frequency(estimate_f0(x, fs, frame_size, hop, **yin_args)[1])
+    if root is not None:
+        logger.debug(f" > Raiz detectada: {root:.2f}Hz ({note_name(freq_to_midi(root))})")
+    return root
+
+def _load_file_cache():
+    if not _file_cache and os.path.exists(CACHE_PATH):
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            _file_cache.update(json.load(f))
+    return _file_cache
+
+def detect_file_root(path, frame_size=FRAME_SIZE, hop=ROOT_HOP_SIZE, **yin_args):
+    """
+    Frequência raiz (Hz) de um arquivo WAV (mono), lido em blocos, com cache por arquivo.
+
+    O resultado é guardado em CACHE_PATH com o tamanho e a data de modificação
+    do arquivo e os parâmetros da análise; se algum deles mudar, a análise é refeita.
+
+    Returns:
+        float ou None (nenhum quadro com altura definida).
+    """
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime]
+    key = f"{os.path.abspath(path)}|{frame_size}|{hop}|{json.dumps(yin_args, sort_keys=True)}"
+
+    cache = _load_file_cache()
+    entry = cache.get(key)
+    if entry is not None and entry["stamp"] == stamp:
+        return entry["root"]
+
+    fs, length, _ = wav_info(path)
+    blocks = (block for _, block in iter_wav_blocks(path, FRAMES_PER_BATCH * hop))
+    with profile_stage("pitch_detection", length, fs, path=path):
+        root = root_frequency(_analyze(blocks, fs, frame_size, hop, **yin_args))
+    if root is not None:
+        logger.info(f" > Raiz de '{os.path.basename(path)}': {root:.2f}Hz ({note_name(freq_to_midi(root))})")
+
+    cache[key] = {"root": root, "stamp": stamp}
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+
+    return root
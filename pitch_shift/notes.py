@@ -1,25 +1,142 @@
+import re
+import functools
+import numpy as np
+
+# Conversões entre notas, números MIDI, cents e frequências.
+#
+# Consulta hierárquica: cada nome distinto é resolvido uma única vez, primeiro
+# no dicionário MIDI_NUMBERS (nomes canônicos, ex. "C#4") e depois pelo parser completo
+# (bemóis, cents, MIDI e Hz, ex. "Bb3", "A4+15c", "60", "432Hz"), com cache.
+# Arrays com milhares de alvos repetidos custam um np.unique + um gather.
+#
+# Números (int/float) são números MIDI (fracionários = cents). Entradas
+# inválidas viram NaN, o que permite misturar alvos válidos e inválidos em
+# uma única chamada.
+
+A4 = 440.0 # Afinação de referência padrão (Hz)
+A4_MIDI = 69
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+ACCIDENTALS = {'#': 1, '♯': 1, 'b': -1, '♭': -1}
+
+# Nota (letra, acidentes, oitava) com desvio opcional em cents: "C#4", "Bb3", "A4-30c"
+_NOTE_RE = re.compile(r"([A-Ga-g])([#♯b♭]*)(-?\d+)(?:([+-]\d+(?:\.\d*)?)(?:c|ct|cents?)?)?")
+# Frequência em Hz: "432Hz", "261.63 hz"
+_HZ_RE = re.compile(r"(\d+(?:\.\d*)?)\s*hz", re.IGNORECASE)
+
 def create_note_dict():
     """
     Gera um dicionário com frequências de notas musicais (C0 a B8).
     Fórmula: f = 440 * 2^((n-69)/12)
     """
-    notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    notes = NOTE_NAMES
     note_dict = {}
-    
+
     # MIDI note 12 = C0, MIDI 69 = A4
     for midi_note in range(12, 120):
         octave = (midi_note // 12) - 1
         note_name = notes[midi_note % 12]
         full_name = f"{note_name}{octave}"
-        
+
         # Cálculo da frequência
         freq = 440.0 * (2 ** ((midi_note - 69) / 12.0))
         note_dict[full_name] = freq
-        
+
     return note_dict
 
 NOTES = create_note_dict()
 
-def get_freq(note_name):
-    """Retorna a frequência de uma nota (ex: 'A4' -> 440.0)."""
-    return NOTES.get(note_name.upper(), None)
\ No newline at end of file
+# Nome canônico -> número MIDI (primeiro nível da consulta)
+MIDI_NUMBERS = {f"{NOTE_NAMES[m % 12]}{m // 12 - 1}": float(m) for m in range(12, 120)}
+
+def midi_to_freq(midi, a4=A4):
+    """Número MIDI (escalar ou array, fracionário = cents) -> frequência em Hz."""
+    return a4 * 2.0 ** ((np.asarray(midi, dtype=np.float64) - A4_MIDI) / 12.0)
+
+def freq_to_midi(freq, a4=A4):
+    """Frequência em Hz -> número MIDI fracionário (<= 0 Hz vira NaN)."""
+    freq = np.asarray(freq, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(freq > 0, A4_MIDI + 12.0 * np.log2(freq / a4), np.nan)
+
+@functools.lru_cache(maxsize=4096)
+def _parse(text, a4):
+    """Resolve um nome (nota, MIDI ou Hz) para número MIDI; NaN se inválido."""
+    text = text.strip()
+    midi = MIDI_NUMBERS.get(text.upper())
+    if midi is not None:
+        return midi
+
+    match = _NOTE_RE.fullmatch(text)
+    if match:
+        letter, accidentals, octave, cents = match.groups()
+        midi = 12 * (int(octave) + 1) + PITCH_CLASSES[letter.upper()]
+        midi += sum(ACCIDENTALS[a] for a in accidentals)
+        return midi + (float(cents) / 100.0 if cents else 0.0)
+
+    match = _HZ_RE.fullmatch(text)
+    if match:
+        return float(freq_to_midi(float(match.group(1)), a4))
+
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+def to_midi(values, a4=A4):
+    """
+    Converte notas, números MIDI ou frequências ("432Hz") em números MIDI.
+
+    Args:
+        values: Escalar, lista ou array (de qualquer forma) de nomes e/ou números.
+                Arrays numéricos (ex.: curvas de pitch por amostra) passam direto.
+        a4: Afinação de referência (usada apenas nas entradas em Hz).
+    Returns:
+        np.ndarray (float64) com a forma de `values`; NaN nas entradas inválidas.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.float64)
+    if values.dtype.kind == "b":
+        raise TypeError("Valores booleanos não são notas.")
+
+    # Cada nome distinto é resolvido uma única vez
+    names, inverse = np.unique(values.astype(str).ravel(), return_inverse=True)
+    midi = np.array([_parse(name, float(a4)) for name in names], dtype=np.float64)
+    return midi[inverse].reshape(values.shape)
+
+def to_freq(values, a4=A4):
+    """Notas, números MIDI ou frequências -> frequências em Hz na afinação `a4`."""
+    return midi_to_freq(to_midi(values, a4), a4)
+
+def semitones_between(targets, root, a4=A4, cents=0.0):
+    """
+    Deslocamento em semitons de `root` até cada alvo: n = 12 * log2(f_alvo / f_raiz).
+
+    Args:
+        targets: Alvos (ver to_midi), inclusive uma curva por amostra (N,).
+        root: Nota ou frequência original (ou um array que faz broadcast com `targets`).
+        a4: Afinação de referência das entradas em Hz. Entre notas, a afinação
+            se cancela (a diferença em semitons não depende de A4).
+        cents: Desvio adicional em cents (escalar ou array).
+    Returns:
+        np.ndarray (float64) de semitons, NaN onde alvo ou raiz são inválidos.
+    """
+    return to_midi(targets, a4) - to_midi(root, a4) + np.asarray(cents, dtype=np.float64) / 100.0
+
+def pitch_ratio(targets, root, a4=A4, cents=0.0):
+    """Razão de frequências 2^(n/12) de `root` até cada alvo (ver semitones_between)."""
+    return 2.0 ** (semitones_between(targets, root, a4, cents) / 12.0)
+
+def get_freq(note_name, a4=A4):
+    """Retorna a frequência de uma nota (ex: 'A4' -> 440.0), ou None se inválida."""
+    freq = float(to_freq(note_name, a4))
+    return None if np.isnan(freq) else freq
+
+def note_name(midi):
+    """Número MIDI -> nome da nota mais próxima com o desvio em cents (ex: 69.12 -> 'A4+12c')."""
+    nearest = int(np.round(midi))
+    cents = int(np.round((midi - nearest) * 100))
+    name = f"{NOTE_NAMES[nearest % 12]}{nearest // 12 - 1}"
+    return f"{name}{cents:+d}c" if cents else name
@@ -1,17 +1,32 @@
 import numpy as np
+from effects import kernels
+from effects.dynamics import finalize
+from instrumentation import get_logger, profile_stage
+
+logger = get_logger(__name__)
 
 # https://www.youtube.com/watch?v=PjKlMXhxtTM # Vídeo explicando o algoritmo de pitch-shifting
 # https://github.com/JentGent/pitch-shift # Exemplo de implementação em Python utilizando outros algoritmos de pitch-shifting.
 # Outra implementação: https://github.com/danigb/timestretch
 
+def _wrap(phasor):
+    """phasor mod 1.0 (x - floor(x): exato e bem mais rápido que np.mod em float64)."""
+    phasor -= np.floor(phasor)
+    return phasor
+
 class RealTimePitchShifter:
-    def __init__(self, fs, window_size_ms=30):
+    # Tamanho dos sub-blocos do caminho vetorizado (mantém os temporários no cache)
+    BLOCK_SIZE = 8192
+
+    def __init__(self, fs, window_size_ms=30, channels=None):
         """
         Inicializa o Pitch Shifter utilizando a técnica de Overlap-Add (OLA) com buffer circular.
         
         Args:
             fs: Taxa de amostragem.
             window_size_ms: Tamanho da janela em ms. Quanto menor, mais robótico.
+            channels: Número de canais (None = mono). Com canais, os blocos são (N, C)
+                      e todos os canais compartilham os ponteiros de leitura/escrita.
         """
         
         self.fs = fs
@@ -19,97 +34,318 @@ class RealTimePitchShifter:
         
         # Buffer circular: precisa ser maior que a janela por segurança
         self.buffer_len = self.window_size * 2 
-        self.buffer = np.zeros(self.buffer_len, dtype=np.float32)
+        shape = (self.buffer_len,) if channels is None else (self.buffer_len, channels)
+        self.buffer = np.zeros(shape, dtype=np.float32)
         
         self.write_ptr = 0 # Ponteiro de escrita no buffer circular
         self.phasor = 0.0 # Controla a posição relativa dos ponteiros de leitura
+        self.peak = 0.0 # Maior amplitude de saída desde o início (acompanhada durante o processamento)
+        self.position = 0 # Amostras processadas (relógio das envoltórias de automação)
+        self._rate = np.zeros(1) # Taxa fixa passada aos kernels (evita um array por bloco)
     
-    def process_block(self, x, semitones):
-        """Processa um bloco de áudio mantendo o estado interno."""
+    def process_block(self, x, semitones, normalize=True, out=None):
+        """
+        Processa um bloco de áudio mantendo o estado interno.
         
-        N = len(x)
-        y = np.zeros(N, dtype=np.float32)
+        Args:
+            x: Bloco de áudio de entrada.
+            semitones: Deslocamento em semitons. Pode ser:
+                       - um escalar (deslocamento fixo);
+                       - uma curva (N,), um valor por amostra do bloco (ex.: vibrato,
+                         glide, correção de afinação; ver notes.semitones_between);
+                       - uma envoltória (K, 2) de pontos (tempo em s, semitons),
+                         interpolada linearmente no tempo do stream (desde a primeira
+                         amostra processada) e constante fora dos pontos.
+            normalize: Se True, normaliza o bloco pelo pico (>1.0). Use False em
+                       streaming para que a saída não dependa da divisão em blocos.
+            out: Array float32 com a forma de `x` para a saída. Com os kernels
+                 compilados e um deslocamento fixo, o bloco não aloca memória
+                 (curvas e envoltórias ainda calculam a curva do bloco).
+        """
+        
+        x = np.asarray(x)
+        y = np.zeros(x.shape, dtype=np.float32) if out is None else out
+        semitones = self._semitone_curve(semitones, len(x))
         
         # 1. Calcular o fator de velocidade
         # Se factor = 2.0 (oitava acima), o delay precisa diminuir rápido.
         factor = 2 ** (semitones / 12.0)
         
-        # A taxa de variação do delay.
+        # A taxa de variação do delay (escalar ou uma por amostra).
         # R = 1.0 - factor. 
         # Ex: Se factor é 2.0, R = -1.0 (o delay encurta 1 amostra a cada amostra).
         delay_rate = (1.0 - factor) / self.window_size
 
-        # 2. Processamento (Loop por amostra)
-        for n in range(N):
-            input_sample = x[n]
-            
-            # A. Escrever no Buffer Circular na velocidade normal (1x)
-            self.buffer[self.write_ptr] = input_sample
-            
-            # B. Calcular a posição dos Ponteiros de Leitura
-            # Se utiliza dois ponteiros (A e B) defasados em 180 graus (0.5) para fazer crossfade
-            # Phasor varia de 0.0 a 1.0 (dente de serra)
-            
-            delay_a = self.phasor * self.window_size # Delay do ponteiro A
-            delay_b = ((self.phasor + 0.5) % 1.0) * self.window_size # Delay do ponteiro B (180 graus defasado)
-            
-            # C. Ler do Buffer com Interpolação (Função auxiliar interna)
-            val_a = self._read_buffer(self.write_ptr - delay_a)
-            val_b = self._read_buffer(self.write_ptr - delay_b)
-            
-            # D. Calcular Ganho do Crossfade (Janela Triangular)
-            # Quando o ponteiro A está no meio (0.5), ganho é máximo. Nas pontas, é zero (esconde o 'clique').
-            # Função triangular simples: 1 - 2 * |x - 0.5|
-            gain_a = 1.0 - 2.0 * abs(self.phasor - 0.5)
-            gain_b = 1.0 - 2.0 * abs(((self.phasor + 0.5) % 1.0) - 0.5)
-            
-            # E. Somar as saídas ponderadas
-            y[n] = (val_a * gain_a) + (val_b * gain_b)
-
-            # 3. Atualizar Ponteiros
-            self.write_ptr = (self.write_ptr + 1) % self.buffer_len
-            
-            # Atualiza o phasor
-            self.phasor += delay_rate
-            
-            # Mantém o phasor dentro de 0.0 a 1.0 (Loop do atraso)
-            if self.phasor >= 1.0:
-                self.phasor -= 1.0
-            elif self.phasor < 0.0:
-                self.phasor += 1.0
+        # 2. Processamento
+        if kernels.use_kernels():
+            # Backend compilado (se disponível): laço amostra a amostra em JIT
+            # Taxa fixa: array de 1 elemento com passo 0; curva: passo 1
+            if np.ndim(delay_rate):
+                rates, step = np.asarray(delay_rate, dtype=np.float64), 1
+            else:
+                rates, step = self._rate, 0
+                rates[0] = delay_rate
+            if self.buffer.ndim == 1:
+                self.write_ptr, self.phasor, peak = kernels.pitch_shift_kernel(
+                    x, self.buffer, self.write_ptr, self.phasor,
+                    self.window_size, rates, step, y)
+            else:
+                # Multicanal: cada canal parte do mesmo estado (ponteiros compartilhados)
+                peak = 0.0
+                for c in range(self.buffer.shape[1]):
+                    *state, channel_peak = kernels.pitch_shift_kernel(
+                        x[:, c], self.buffer[:, c], self.write_ptr, self.phasor,
+                        self.window_size, rates, step, y[:, c])
+                    peak = max(peak, channel_peak)
+                self.write_ptr, self.phasor = state
+        else:
+            peak = 0.0
+            for start in range(0, len(x), self.BLOCK_SIZE):
+                stop = start + self.BLOCK_SIZE
+                rate = delay_rate[start:stop] if np.ndim(delay_rate) else delay_rate
+                peak = max(peak, self._process_vectorized(x[start:stop], y[start:stop], rate))
+        
+        self.position += len(x)
+        
+        self.peak = max(self.peak, float(peak))
                 
-        # Normalização de segurança
-        peak = np.max(np.abs(y))
-        if peak > 1.0:
+        # Normalização de segurança (pico acompanhado durante o processamento)
+        if normalize and peak > 1.0:
             y /= peak
             
         return y
 
-    def _read_buffer(self, position_float):
-        """Lê do buffer circular com Interpolação Linear."""
-        # Garante circularidade
-        while position_float < 0:
-            position_float += self.buffer_len
-        while position_float >= self.buffer_len:
-            position_float -= self.buffer_len
-            
-        # Índices para interpolação linear
-        idx_int = int(position_float) # Índice inteiro
-        frac = position_float - idx_int # Parte fracionária
-        
-        # Próximo índice (circular) 
-        idx_next = (idx_int + 1) % self.buffer_len
-        
-        val_current = self.buffer[idx_int]
-        val_next = self.buffer[idx_next]
+    def _semitone_curve(self, semitones, N):
+        """Deslocamento do bloco: o escalar como está, ou uma curva (N,) (ver process_block)."""
+        if np.ndim(semitones) == 0:
+            return semitones
+
+        semitones = np.asarray(semitones, dtype=np.float64)
+        if semitones.ndim == 2 and semitones.shape[1] == 2:
+            # Envoltória de pontos (tempo, semitons) avaliada nas amostras deste bloco
+            times = (self.position + np.arange(N)) / self.fs
+            return np.interp(times, semitones[:, 0], semitones[:, 1])
+
+        if semitones.shape != (N,):
+            raise ValueError(f"Curva de semitons com forma {semitones.shape}; esperado ({N},) ou pontos (K, 2).")
+        return semitones
+
+    def _process_vectorized(self, x, y, delay_rate):
+        """
+        Pitch shift vetorizado para um sub-bloco. Retorna o pico de |y|.
+
+        O phasor é um dente de serra determinístico, então as posições dos dois
+        ponteiros de leitura e os ganhos do crossfade de todo o bloco saem em forma
+        fechada: phasor[n] = (phasor + n * delay_rate) mod 1 (com uma curva de taxas,
+        a soma acumulada das taxas anteriores a n). O buffer circular é
+        linearizado (mais antigo -> mais recente) e concatenado ao bloco, e cada
+        ponteiro vira um único gather com interpolação linear. Ao final, o buffer
+        guarda as últimas `buffer_len` amostras em ordem linear (write_ptr = 0).
+        """
+        N = len(x)
+        H = self.buffer_len
+
+        # Histórico (H amostras) + bloco atual + 1 amostra de guarda (peso 0 na interpolação)
+        padded = np.concatenate((self.buffer[self.write_ptr:],
+                                 self.buffer[:self.write_ptr],
+                                 x.astype(np.float32, copy=False),
+                                 np.zeros((1,) + x.shape[1:], dtype=np.float32)))
+
+        # A. Phasor (0.0 a 1.0) dos ponteiros A e B (180 graus defasado) em forma fechada
+        n = np.arange(N)
+        if np.ndim(delay_rate):
+            offsets = np.cumsum(delay_rate)
+            phasor_a = _wrap(self.phasor + (offsets - delay_rate))
+            advance = offsets[-1] if N else 0.0
+        else:
+            phasor_a = _wrap(self.phasor + n * delay_rate)
+            advance = N * delay_rate
+        phasor_b = _wrap(phasor_a + 0.5)
+
+        # B. Posição de escrita da amostra n em `padded` é H + n; os atrasos são < window_size
+        write_pos = H + n
+        y[:] = self._read_interpolated(padded, write_pos - phasor_a * self.window_size, phasor_a)
+        y += self._read_interpolated(padded, write_pos - phasor_b * self.window_size, phasor_b)
+
+        # C. Atualiza o estado: últimas H amostras em ordem linear e phasor ao fim do bloco
+        self.buffer[:] = padded[N:N + H]
+        self.write_ptr = 0
+        self.phasor = (self.phasor + advance) % 1.0
+
+        return np.max(np.abs(y)) if N else 0.0
+
+    @staticmethod
+    def _read_interpolated(padded, position, phasor):
+        """Lê `padded` nas posições fracionárias (interpolação linear), com o ganho triangular do crossfade."""
+        # Quando o ponteiro está no meio (0.5), ganho é máximo. Nas pontas, é zero (esconde o 'clique').
+        gain = 1.0 - 2.0 * np.abs(phasor - 0.5)
+
+        idx_int = position.astype(np.int64) # position >= 0: truncamento = floor
+        frac = position - idx_int
+        w_next = (frac * gain).astype(np.float32)
+        w_current = (gain - frac * gain).astype(np.float32)
+        if padded.ndim == 2:
+            w_current, w_next = w_current[..., None], w_next[..., None]
+
+        return padded[idx_int] * w_current + padded[idx_int + 1] * w_next
+
+class MultiVoicePitchShifter:
+    # Sub-blocos menores que no RealTimePitchShifter: os temporários são (2, vozes, N)
+    BLOCK_SIZE = 1024
+
+    def __init__(self, fs, semitones, window_size_ms=40, channels=None):
+        """
+        Pitch Shifter polifônico: várias vozes (deslocamentos) em uma única passada.
+
+        A entrada é escrita uma única vez em um buffer circular compartilhado, e
+        cada voz tem apenas o seu próprio phasor (dois ponteiros de leitura), com o
+        mesmo algoritmo do RealTimePitchShifter.
+
+        Args:
+            fs: Taxa de amostragem.
+            semitones: Lista de deslocamentos em semitons (uma voz por item).
+            window_size_ms: Tamanho da janela em ms.
+            channels: Número de canais (None = mono).
+        """
+        self.fs = fs
+        self.window_size = int((window_size_ms / 1000.0) * fs)
+        self.buffer_len = self.window_size * 2
+        shape = (self.buffer_len,) if channels is None else (self.buffer_len, channels)
+        self.buffer = np.zeros(shape, dtype=np.float32)
+        self.write_ptr = 0
+
+        # Estado por voz: taxa de variação do atraso, phasor e pico da saída
+        factors = 2 ** (np.asarray(semitones, dtype=np.float64) / 12.0)
+        self.delay_rates = (1.0 - factors) / self.window_size
+        self.phasors = np.zeros(len(factors), dtype=np.float64)
+        self.peaks = np.zeros(len(factors), dtype=np.float64)
+
+    def process(self, x):
+        """Processa um bloco (sem normalização) e retorna (vozes, N) ou (vozes, N, C)."""
+        x = np.asarray(x)
+        y = np.zeros((len(self.phasors),) + x.shape, dtype=np.float32)
+
+        if kernels.use_kernels():
+            if self.buffer.ndim == 1:
+                self.write_ptr = kernels.multi_pitch_shift_kernel(
+                    x, self.buffer, self.write_ptr, self.phasors,
+                    self.window_size, self.delay_rates, y, self.peaks)
+            else:
+                # Multicanal: cada canal parte do mesmo estado (ponteiros compartilhados)
+                for c in range(self.buffer.shape[1]):
+                    phasors = self.phasors.copy()
+                    write_ptr = kernels.multi_pitch_shift_kernel(
+                        x[:, c], self.buffer[:, c], self.write_ptr, phasors,
+                        self.window_size, self.delay_rates, y[:, :, c], self.peaks)
+                self.write_ptr, self.phasors = write_ptr, phasors
+        else:
+            for start in range(0, len(x), self.BLOCK_SIZE):
+                stop = start + self.BLOCK_SIZE
+                self._process_vectorized(x[start:stop], y[:, start:stop])
+
+        return y
+
+    def _process_vectorized(self, x, y):
+        """Todas as vozes de um sub-bloco (ver RealTimePitchShifter._process_vectorized)."""
+        N = len(x)
+        H = self.buffer_len
+
+        padded = np.concatenate((self.buffer[self.write_ptr:],
+                                 self.buffer[:self.write_ptr],
+                                 x.astype(np.float32, copy=False),
+                                 np.zeros((1,) + x.shape[1:], dtype=np.float32)))
+
+        # Phasors (vozes, N) em forma fechada; as posições de escrita são comuns a todas as vozes
+        n = np.arange(N)
+        phasor_a = _wrap(self.phasors[:, None] + n * self.delay_rates[:, None])
+        phasor_b = _wrap(phasor_a + 0.5)
+
+        write_pos = H + n
+        read = RealTimePitchShifter._read_interpolated
+        y[:] = read(padded, write_pos - phasor_a * self.window_size, phasor_a)
+        y += read(padded, write_pos - phasor_b * self.window_size, phasor_b)
+
+        self.buffer[:] = padded[N:N + H]
+        self.write_ptr = 0
+        self.phasors = np.mod(self.phasors + N * self.delay_rates, 1.0)
+        if N:
+            self.peaks = np.maximum(self.peaks, np.abs(y).reshape(len(y), -1).max(axis=1))
+
+class PitchShiftProcessor:
+    def __init__(self, fs, semitones, window_size_ms=40, channels=None):
+        """
+        Pitch Shift com estado persistente entre blocos.
         
-        return (val_current * (1.0 - frac)) + (val_next * frac)
+        Args:
+            fs: Taxa de amostragem.
+            semitones: Deslocamento em semitons, ou uma envoltória (K, 2) de pontos
+                       (tempo em s, semitons) para automação (ver process_block).
+            window_size_ms: Tamanho da janela do RealTimePitchShifter em ms.
+            channels: Número de canais (None = mono).
+        """
+        self.semitones = np.asarray(semitones, dtype=np.float64) if np.ndim(semitones) else semitones
+        self.shifter = RealTimePitchShifter(fs, window_size_ms=window_size_ms, channels=channels)
+    
+    def process(self, x, out=None):
+        """Processa um bloco de áudio (sem normalização); `out` como em RealTimePitchShifter.process_block."""
+        return self.shifter.process_block(x, self.semitones, normalize=False, out=out)
 
 def change_pitch(x, fs, semitones):
-    print(f"--- Pitch Shift (Real-Time Granular): {semitones} semitons ---")
-    
-    # Instancia a classe
-    shifter = RealTimePitchShifter(fs, window_size_ms=40)
+    """
+    Pitch shift de um sinal completo.
+
+    Args:
+        x: Sinal de entrada (N,) ou (N, C).
+        fs: Taxa de amostragem.
+        semitones: Deslocamento fixo, curva (N,) ou envoltória (K, 2) (ver
+                   RealTimePitchShifter.process_block).
+    """
+    if np.ndim(semitones):
+        curve = np.asarray(semitones, dtype=np.float64)
+        values = curve[:, 1] if curve.ndim == 2 else curve
+        logger.info(f"--- Pitch Shift (Real-Time Granular): automação de {np.min(values):.2f} "
+                    f"a {np.max(values):.2f} semitons ---")
+    else:
+        logger.info(f"--- Pitch Shift (Real-Time Granular): {semitones} semitons ---")
     
-    # Processa o áudio todo (simulando stream)
-    return shifter.process_block(x, semitones)
\ No newline at end of file
+    with profile_stage("pitch_shift", len(x), fs) as stage:
+        # Instancia a classe
+        channels = x.shape[1] if np.ndim(x) > 1 else None
+        shifter = PitchShiftProcessor(fs, semitones, window_size_ms=40, channels=channels)
+        
+        # Processa o áudio todo (simulando stream)
+        y = shifter.process(x)
+        stage.buffer(y)
+        stage.buffer(shifter.shifter.buffer)
+        
+        # Normalização de segurança (pico acompanhado pelo shifter, sem nova passada)
+        finalize(y, fs, peak=shifter.shifter.peak, stage=stage, log=False)
+        
+    return y
+
+def change_pitch_voices(x, fs, semitones):
+    """
+    Gera várias versões com pitch shift do mesmo sinal em uma única passada.
+
+    Args:
+        x: Sinal de entrada (N,) ou (N, C).
+        fs: Taxa de amostragem.
+        semitones: Lista de deslocamentos em semitons.
+    Returns:
+        np.ndarray: (vozes, N) ou (vozes, N, C), cada voz normalizada pelo seu pico
+        (como em change_pitch).
+    """
+    logger.info(f"--- Pitch Shift (Real-Time Granular): {len(semitones)} vozes ---")
+
+    with profile_stage("pitch_shift_voices", len(x), fs, voices=len(semitones)) as stage:
+        channels = x.shape[1] if np.ndim(x) > 1 else None
+        shifter = MultiVoicePitchShifter(fs, semitones, window_size_ms=40, channels=channels)
+        y = shifter.process(x)
+        stage.buffer(y)
+        stage.buffer(shifter.buffer)
+
+        # Normalização de segurança, independente por voz
+        for v, peak in enumerate(shifter.peaks):
+            finalize(y[v], fs, peak=peak, stage=stage, log=False)
+
+    return y
@@ -1,6 +1,33 @@
 import numpy as np
-from pitch_shift.notes import get_freq
-from pitch_shift.pitch_shift import change_pitch
+from pitch_shift.notes import get_freq, to_freq, freq_to_midi, note_name, semitones_between
+from pitch_shift.pitch_shift import change_pitch, change_pitch_voices
+from pitch_shift.detection import detect_root
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
+
+# Valor de root_note / root_freq que pede a detecção automática da raiz (pitch_shift.detection)
+AUTO_ROOT = "auto"
+
+def is_auto_root(root):
+    """True se root_note / root_freq pede a detecção automática ("auto", sem diferenciar maiúsculas)."""
+    return isinstance(root, str) and root.lower() == AUTO_ROOT
+
+def _detect_root(audio, fs):
+    """Frequência raiz detectada no áudio (Hz), ou None (com aviso) se nenhum trecho tem altura definida."""
+    freq = detect_root(audio, fs)
+    if freq is None:
+        logger.warning("Erro: não foi possível detectar a nota raiz do áudio.")
+    else:
+        logger.info(f" > Raiz detectada: {note_name(freq_to_midi(freq))} ({freq:.2f}Hz)")
+    return freq
+
+def _root_note(audio, fs, root_note):
+    """Nota raiz informada ou, com "auto", o número MIDI detectado (None se a detecção falhar)."""
+    if not is_auto_root(root_note):
+        return root_note
+    freq = _detect_root(audio, fs)
+    return None if freq is None else float(freq_to_midi(freq))
 
 def shift_to_note(audio, fs, target_note, root_note="C4"):
     """
@@ -8,28 +35,30 @@ def shift_to_note(audio, fs, target_note, root_note="C4"):
     
     Args:
         audio: Array de áudio.
-        target_note (str): Nota desejada (ex: 'G#4', 'E5').
-        root_note (str): Nota original do áudio. Padrão é 'C4'.
+        target_note (str): Nota desejada (ex: 'G#4', 'Eb5', 'A4+20c', '432Hz'; ver notes.to_midi).
+        root_note (str): Nota original do áudio. Padrão é 'C4'; "auto" detecta a raiz
+                         no próprio áudio (ver pitch_shift.detection).
     Returns:
         np.array: Áudio com nova afinação (duração alterada).
     """
-    freq_root = get_freq(root_note)
-    freq_target = get_freq(target_note)
-    
-    if freq_root is None or freq_target is None:
-        print(f"Erro: Nota '{root_note}' ou '{target_note}' inválida.")
+    root_note = _root_note(audio, fs, root_note)
+    if root_note is None:
         return audio
     
+    semitones_diff = float(semitones_between(target_note, root_note))
     
-    # Cálculo da diferença em semitons
+    if np.isnan(semitones_diff):
+        logger.warning(f"Erro: Nota '{root_note}' ou '{target_note}' inválida.")
+        return audio
+    
+    # Diferença em semitons (ver notes.semitones_between)
     # f_target = f_root * 2^(n/12)
     # n = 12 * log2(f_target / f_root)
+    freq_root, freq_target = to_freq([root_note, target_note])
     
-    ratio = freq_target / freq_root
-    semitones_diff = 12.0 * np.log2(ratio)
-    
-    print(f"--- Musical Shift: {root_note} ({freq_root:.1f}Hz) -> {target_note} ({freq_target:.1f}Hz) ---")
-    print(f" > Diferença: {semitones_diff:.2f} semitons")
+    root_label = note_name(root_note) if isinstance(root_note, float) else root_note
+    logger.info(f"--- Musical Shift: {root_label} ({freq_root:.1f}Hz) -> {target_note} ({freq_target:.1f}Hz) ---")
+    logger.info(f" > Diferença: {semitones_diff:.2f} semitons")
     
     return change_pitch(audio, fs, semitones_diff)
 
@@ -40,11 +69,15 @@ def shift_to_freq(audio, fs, target_freq, root_freq=261.63):
     Args:
         audio: Array de áudio.
         target_freq (float): Frequência desejada em Hz.
-        root_freq (float): Frequência original do áudio em Hz.
+        root_freq (float): Frequência original do áudio em Hz ("auto" = detectada no áudio).
     
     Returns:
         np.array: Áudio com nova afinação (duração alterada).
     """
+    if is_auto_root(root_freq):
+        root_freq = _detect_root(audio, fs)
+        if root_freq is None:
+            return audio
     
     # Cálculo da diferença em semitons
     # f_target = f_root * 2^(n/12)
@@ -53,7 +86,68 @@ def shift_to_freq(audio, fs, target_freq, root_freq=261.63):
     ratio = target_freq / root_freq
     semitones_diff = 12.0 * np.log2(ratio)
     
-    print(f"--- Frequency Shift: {root_freq:.1f}Hz -> {target_freq:.1f}Hz ---")
-    print(f" > Diferença: {semitones_diff:.2f} semitons")
+    logger.info(f"--- Frequency Shift: {root_freq:.1f}Hz -> {target_freq:.1f}Hz ---")
+    logger.info(f" > Diferença: {semitones_diff:.2f} semitons")
+    
+    return change_pitch(audio, fs, semitones_diff)
+
+def shift_to_notes(audio, fs, target_notes, root_note="C4"):
+    """
+    Gera várias notas (ex: um acorde ou as 12 notas cromáticas) em uma única passada.
+    
+    Args:
+        audio: Array de áudio.
+        target_notes (list): Notas desejadas (ex: ['C4', 'E4', 'G4']).
+        root_note (str): Nota original do áudio. Padrão é 'C4'; "auto" detecta a raiz.
+    Returns:
+        np.array: (vozes, N), uma linha por nota, na ordem de `target_notes`.
+                  Notas inválidas mantêm o áudio original (como em shift_to_note).
+    """
+    root_note = _root_note(audio, fs, root_note)
+    freq_root = None if root_note is None else get_freq(root_note)
+    if freq_root is None:
+        logger.warning(f"Erro: Nota '{root_note}' inválida.")
+        return np.stack([audio] * len(target_notes))
+    
+    # Todas as notas resolvidas em uma única chamada (NaN = inválida)
+    semitones = semitones_between(list(target_notes), root_note)
+    for note in np.asarray(target_notes)[np.isnan(semitones)]:
+        logger.warning(f"Erro: Nota '{note}' inválida.")
+    
+    root_label = note_name(root_note) if isinstance(root_note, float) else root_note
+    logger.info(f"--- Musical Shift: {root_label} ({freq_root:.1f}Hz) -> {', '.join(map(str, target_notes))} ---")
+    
+    return _shift_voices(audio, fs, semitones)
+
+def shift_to_freqs(audio, fs, target_freqs, root_freq=261.63):
+    """
+    Muda o tom para várias frequências em uma única passada.
+    
+    Args:
+        audio: Array de áudio.
+        target_freqs (list): Frequências desejadas em Hz.
+        root_freq (float): Frequência original do áudio em Hz ("auto" = detectada no áudio).
+    Returns:
+        np.array: (vozes, N), uma linha por frequência.
+    """
+    if is_auto_root(root_freq):
+        root_freq = _detect_root(audio, fs)
+        if root_freq is None:
+            return np.stack([audio] * len(list(target_freqs)))
+    
+    logger.info(f"--- Frequency Shift: {root_freq:.1f}Hz -> {', '.join(f'{f:.1f}Hz' for f in target_freqs)} ---")
+    
+    # n = 12 * log2(f_target / f_root)
+    semitones = 12.0 * np.log2(np.asarray(list(target_freqs), dtype=np.float64) / root_freq)
+    return _shift_voices(audio, fs, semitones)
+
+def _shift_voices(audio, fs, semitones):
+    """Renderiza os deslocamentos válidos juntos; os inválidos (NaN) recebem o áudio original."""
+    valid = np.flatnonzero(~np.isnan(semitones))
+    logger.info(f" > Diferenças: {', '.join(f'{s:.2f}' for s in semitones[valid])} semitons")
     
-    return change_pitch(audio, fs, semitones_diff)
\ No newline at end of file
+    out = np.empty((len(semitones),) + np.shape(audio), dtype=np.float32)
+    out[:] = audio
+    if len(valid):
+        out[valid] = change_pitch_voices(audio, fs, semitones[valid].tolist())
+    return out
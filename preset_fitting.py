@@ -0,0 +1,228 @@
+import os
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.signal import decimate
+from file_manager import AudioManager, EFFECTS_MAP
+from effects.reverb import ReverbProcessor
+from pipeline import load_presets
+from alignment import estimate_alignment, overlap
+from metrics import calculate_mse
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
+
+# Ajuste automático dos parâmetros do reverb de Schroeder (delays e ganhos dos
+# combs/all-pass e wet_gain) contra as gravações da mesa (get_target_audio).
+# Cada candidato é avaliado em um trecho curto e decimado, em paralelo (um
+# processo por núcleo), e abandonado assim que o erro acumulado já garante que
+# ele não supera o melhor candidato atual.
+
+EXCERPT_S = 4.0 # Duração do trecho usado no ajuste
+DECIMATION = 4 # Fator de decimação (44.1 kHz -> 11.025 kHz)
+CHUNK_SIZE = 2048 # Blocos em que o erro é acumulado (granularidade da parada antecipada)
+FRAME_SIZE = 512 # Quadro da distância espectral (divisor de CHUNK_SIZE)
+NUM_BANDS = 24 # Bandas (espaçamento logarítmico) da distância espectral
+DYNAMIC_RANGE_DB = 60.0 # Energias abaixo de (máximo do alvo - 60 dB) são limitadas (ruído de fundo)
+
+# Limites de busca: (mínimo, máximo)
+BOUNDS = {
+    "combs_ms": (5.0, 500.0),
+    "combs_gains": (0.2, 0.95), # < 1.0 mantém os combs estáveis
+    "aps_ms": (0.5, 10.0),
+    "aps_gains": (0.4, 0.8),
+    "wet_gain": (0.05, 1.0),
+}
+
+def prepare_excerpt(dry, target, fs, excerpt_s=EXCERPT_S, decimation=DECIMATION, offset_s=0.0):
+    """
+    Alinha o alvo ao seco, recorta o mesmo trecho dos dois e decima.
+
+    O alvo é escalado para que o caminho direto tenha ganho unitário (projeção
+    sobre o seco), como em y = x + wet * reverb. `offset_s` conta a partir do
+    início do trecho comum após o alinhamento (atrasos negativos inclusive).
+
+    Returns:
+        (fs_ajuste, x, alvo): Taxa decimada e trechos float64.
+    """
+    lag, _ = estimate_alignment(dry, target)
+    dry_start, target_start, common = overlap(len(dry), len(target), lag)
+    start = int(offset_s * fs)
+    n = min(int(excerpt_s * fs), common - start)
+    if n <= 0:
+        raise ValueError(f"Trecho vazio: offset de {offset_s}s além do trecho comum ({common / fs:.2f}s).")
+
+    x = np.asarray(dry[dry_start + start:dry_start + start + n], dtype=np.float64)
+    t = np.asarray(target[target_start + start:target_start + start + n], dtype=np.float64)
+    projection = np.dot(x, t)
+    if projection <= 0.0:
+        raise ValueError("Trecho sem correlação positiva com o seco (silêncio ou alinhamento inválido).")
+    t *= np.dot(x, x) / projection
+
+    if decimation > 1:
+        x = decimate(x, decimation, zero_phase=True)
+        t = decimate(t, decimation, zero_phase=True)
+    return fs / decimation, x, t
+
+def _band_edges(frame_size=FRAME_SIZE, num_bands=NUM_BANDS):
+    """Índices dos bins que delimitam bandas logarítmicas do espectro do quadro."""
+    edges = np.unique(np.geomspace(2, frame_size // 2 + 1, num_bands + 1).astype(int))
+    return edges
+
+def _band_db(frames, edges, floor_db=-120.0):
+    """Energia em dB por banda de cada quadro (quadros x bandas), limitada a `floor_db`."""
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]), axis=1)) ** 2
+    bands = np.add.reduceat(spectrum, edges[:-1], axis=1)
+    return np.maximum(10.0 * np.log10(bands + 1e-12), floor_db)
+
+def candidate_distance(params, x, t, fs, metric="spectral", limit=np.inf):
+    """
+    Distância entre o reverb com `params` aplicado a `x` e o alvo `t`.
+
+    O erro é acumulado bloco a bloco (processamento em streaming); como a soma só
+    cresce, o candidato é abandonado (retorna inf) assim que a média final não
+    puder mais ficar abaixo de `limit`.
+
+    Args:
+        params: Dict no formato dos presets (combs_ms, combs_gains, aps_ms, aps_gains, wet_gain).
+        metric: "mse" (metrics.calculate_mse) ou "spectral" (erro quadrático médio
+                das energias por banda, em dB).
+        limit: Melhor distância conhecida (parada antecipada).
+    """
+    reverb = ReverbProcessor(fs, params["combs_ms"], params["combs_gains"],
+                             params["aps_ms"], params["aps_gains"], params["wet_gain"])
+    edges = _band_edges()
+
+    n = len(x) - len(x) % FRAME_SIZE
+    if metric == "spectral":
+        # O ruído de fundo da gravação não deve pesar contra o silêncio digital do seco
+        t_db = _band_db(t[:n].reshape(-1, FRAME_SIZE), edges)
+        floor_db = np.max(t_db) - DYNAMIC_RANGE_DB
+    total = n if metric == "mse" else (n // FRAME_SIZE) * (len(edges) - 1)
+    error = 0.0
+
+    for start in range(0, n, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, n)
+        y = reverb.process(x[start:stop].astype(np.float32))
+
+        if metric == "mse":
+            error += calculate_mse(t[start:stop], y, align=False) * (stop - start)
+        else:
+            frames_y = y.reshape(-1, FRAME_SIZE)
+            frames_t = t[start:stop].reshape(-1, FRAME_SIZE)
+            error += np.sum((_band_db(frames_y, edges, floor_db) - _band_db(frames_t, edges, floor_db)) ** 2)
+
+        if error > limit * total:
+            return np.inf
+
+    return error / total
+
+def clip_params(params):
+    """Limita os parâmetros aos BOUNDS."""
+    return {key: (np.clip(value, *BOUNDS[key]).tolist() if isinstance(value, list)
+                  else float(np.clip(value, *BOUNDS[key])))
+            for key, value in params.items() if key in BOUNDS}
+
+def perturb(center, sigma, rng):
+    """
+    Novo candidato ao redor de `center`: delays com ruído multiplicativo
+    (log-normal) e ganhos com ruído aditivo, ambos proporcionais a `sigma`.
+    """
+    candidate = {}
+    for key, value in center.items():
+        value = np.asarray(value, dtype=np.float64)
+        if key.endswith("_ms"):
+            new = value * np.exp(sigma * rng.standard_normal(value.shape))
+        else:
+            new = value + 0.25 * sigma * rng.standard_normal(value.shape)
+        candidate[key] = new.tolist() if value.ndim else float(new)
+    return clip_params(candidate)
+
+# Trechos do alvo atual, enviados uma vez para cada processo do pool
+_worker_data = {}
+
+def _init_worker(x, t, fs, metric):
+    _worker_data.update(x=x, t=t, fs=fs, metric=metric)
+
+def _evaluate(params, limit):
+    d = _worker_data
+    return candidate_distance(params, d["x"], d["t"], d["fs"], d["metric"], limit)
+
+def fit_preset(effect_key, manager, initial, metric="spectral", generations=20, population=16,
+               sigma=0.3, seed=0, max_workers=None):
+    """
+    Ajusta um preset a uma gravação da mesa com uma estratégia evolutiva simples.
+
+    A cada geração, `population` candidatos são gerados ao redor do melhor atual
+    e avaliados em paralelo. Se nenhum melhora, a perturbação (sigma) diminui.
+
+    Args:
+        effect_key: Chave do alvo no EFFECTS_MAP (ex.: "REV-HALL1").
+        manager: AudioManager com o seco e as gravações.
+        initial: Preset inicial (dict no formato dos presets).
+        metric: "spectral" ou "mse" (ver candidate_distance).
+        generations: Número de gerações.
+        population: Candidatos por geração.
+        sigma: Tamanho inicial da perturbação.
+        seed: Semente do gerador aleatório.
+        max_workers: Número de processos (padrão: os.cpu_count()).
+    Returns:
+        (preset, distância): Melhor preset encontrado e sua distância.
+    """
+    fs, dry = manager.get_dry_audio()
+    _, target = manager.get_target_audio(effect_key)
+    fs_fit, x, t = prepare_excerpt(dry, target, fs)
+
+    rng = np.random.default_rng(seed)
+    best = clip_params(initial)
+    best_distance = candidate_distance(best, x, t, fs_fit, metric)
+
+    logger.info(f"--- Ajuste: {effect_key} ({metric}), distância inicial {best_distance:.4f} ---")
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                             initializer=_init_worker, initargs=(x, t, fs_fit, metric)) as executor:
+        for generation in range(generations):
+            candidates = [perturb(best, sigma, rng) for _ in range(population)]
+            distances = list(executor.map(_evaluate, candidates, [best_distance] * population))
+
+            i = int(np.argmin(distances))
+            aborted = sum(np.isinf(distances))
+            if distances[i] < best_distance:
+                best, best_distance = candidates[i], distances[i]
+            else:
+                sigma *= 0.7
+
+            logger.info(f" > Geração {generation + 1}: {best_distance:.4f} (sigma={sigma:.3f}, {aborted} abandonados)")
+
+    return best, best_distance
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajusta presets de reverb às gravações da mesa.")
+    parser.add_argument("targets", nargs="*", help="Chaves do EFFECTS_MAP (padrão: todos os REV-*)")
+    parser.add_argument("--initial", default="REV-HALL", help="Preset inicial (specs/reverb_presets.json)")
+    parser.add_argument("--metric", choices=["spectral", "mse"], default="spectral")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--population", type=int, default=16)
+    parser.add_argument("--output", default="specs/fitted_presets.json")
+    args = parser.parse_args()
+
+    targets = args.targets or [key for key in EFFECTS_MAP if key.startswith("REV-")]
+    initial = load_presets("specs/reverb_presets.json")[args.initial]
+    manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL")
+
+    # Resultados anteriores são mantidos (permite ajustar os alvos em várias execuções)
+    fitted = load_presets(args.output) if os.path.exists(args.output) else {}
+
+    for key in targets:
+        preset, distance = fit_preset(key, manager, initial, args.metric, args.generations, args.population)
+        fitted[key] = {k: np.round(v, 3).tolist() for k, v in preset.items()}
+        logger.info(f" > {key}: distância final {distance:.4f}")
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(fitted, f, indent=4)
+
+    logger.info(f"\nPresets salvos em '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import copy
+import time
+import argparse
+import itertools
+import numpy as np
+from audio_io import iter_wav_blocks, wav_info, WavWriter
+from pipeline import EffectChain, load_spec, build_chain, uses_auto_root
+from effects.assets import WorkBuffers
+from instrumentation import get_logger
+
+logger = get_logger(__name__)
+
+# Modo ao vivo: um BlockScheduler roda uma cadeia de processadores com estado
+# dentro do callback de áudio, em blocos de tamanho fixo. O FakeDevice simula a
+# placa de som (entrada de um array/WAV, saída capturada em memória ou WAV), no
+# ritmo do relógio ou o mais rápido possível, para medir prazos perdidos e a
+# latência por bloco sem hardware (ex.: Linux headless). Com o pacote opcional
+# `sounddevice`, run_live usa a placa de som real.
+#
+# Alocações: o scheduler cria uma vez os buffers de entrada e saída e o anel de
+# estatísticas. Reverb, flanger, tremolo, pitch shift e limitador aceitam `out` e
+# guardam seus temporários em WorkBuffers; após o warmup (e o primeiro bloco,
+# que cria o estado do limitador), um bloco não aloca memória com os kernels
+# compilados e deslocamento fixo. Ainda alocam: a reverb por convolução, o
+# pitch shift com envelope e o fallback NumPy dos kernels.
+
+BLOCK_SIZE = 256 # ~5.8 ms a 44.1 kHz
+STATS_HISTORY = 4096 # Blocos guardados para as estatísticas de tempo (anel)
+
+class BlockScheduler:
+    def __init__(self, chain, fs, block_size=BLOCK_SIZE, channels=None, out_channels=None, host_block=None):
+        """
+        Executa uma cadeia de efeitos em blocos fixos a partir de um callback.
+
+        Se o host entrega blocos do mesmo tamanho (host_block = block_size), cada
+        callback processa diretamente um bloco, sem latência extra. Caso
+        contrário, a entrada é acumulada em um buffer de um bloco e a saída sai
+        atrasada de `block_size` amostras. Os buffers de entrada/saída e as
+        estatísticas são alocados aqui, uma única vez; as saídas e temporários dos
+        processadores são reutilizados entre blocos (ver o início do módulo).
+
+        Args:
+            chain: EffectChain (ou lista de processadores).
+            fs: Taxa de amostragem.
+            block_size: Amostras por bloco processado.
+            channels: Canais da entrada (None = mono).
+            out_channels: Canais da saída (None = mono). Ver warmup().
+            host_block: Tamanho dos blocos do host (None = block_size).
+        """
+        self.chain = chain if isinstance(chain, EffectChain) else EffectChain(list(chain), fs=fs)
+        self.fs = fs
+        self.block_size = block_size
+        self.channels = channels
+        self.out_channels = out_channels
+        self.buffered = host_block not in (None, block_size)
+
+        in_shape = (block_size,) if channels is None else (block_size, channels)
+        out_shape = (block_size,) if out_channels is None else (block_size, out_channels)
+        self._in = np.zeros(in_shape, dtype=np.float32)
+        self._out = np.zeros(out_shape, dtype=np.float32)
+        self._fill = 0
+
+        self.deadline = block_size / fs
+        self.times = np.zeros(STATS_HISTORY)
+        self.blocks = 0
+        self.misses = 0
+        self.max_time = 0.0
+
+    @property
+    def latency(self):
+        """Latência entrada -> saída em amostras (buffer do scheduler + estágios por blocos)."""
+        return (self.block_size if self.buffered else 0) + self.chain.latency
+
+    def warmup(self, blocks=2):
+        """
+        Processa blocos de silêncio antes do início (ex.: compilação JIT dos kernels)
+        e zera as estatísticas. O número de canais da saída (out_channels) passa a
+        ser o da cadeia, e o buffer de saída é realocado se necessário.
+
+        Os blocos passam por uma cópia da cadeia: o estado dos processadores (fase
+        dos LFOs, posição dos envelopes, buffers de atraso) não avança, e o
+        primeiro bloco real sai igual ao de um render sem warmup.
+
+        Returns:
+            Número de canais da saída (None = mono), para alocar o dispositivo.
+        """
+        with WorkBuffers.shared(): # A cópia aloca os buffers de trabalho da cadeia original
+            chain = copy.deepcopy(self.chain)
+        y = None
+        for _ in range(max(blocks, 1)):
+            self._in[:] = 0.0
+            y = chain.process(self._in, reuse=True)
+
+        self.out_channels = y.shape[1] if y.ndim > 1 else None
+        if self._out.shape != y.shape:
+            self._out = np.zeros(y.shape, dtype=np.float32)
+        self.reset_stats()
+        return self.out_channels
+
+    def reset_stats(self):
+        self.times[:] = 0.0
+        self.blocks = 0
+        self.misses = 0
+        self.max_time = 0.0
+
+    def _run_block(self, block, out):
+        """Processa um bloco e escreve o resultado (limitado a [-1, 1]) em `out`, medindo o tempo."""
+        t0 = time.perf_counter()
+
+        y = self.chain.process(block, reuse=True)
+        if out.ndim > y.ndim:
+            out[:] = y[:, None] # Saída mono em todos os canais do dispositivo
+        else:
+            out[:] = y
+        np.clip(out, -1.0, 1.0, out=out)
+
+        elapsed = time.perf_counter() - t0
+        self.times[self.blocks % STATS_HISTORY] = elapsed
+        self.blocks += 1
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed > self.deadline:
+            self.misses += 1
+
+    def callback(self, indata, outdata):
+        """
+        Callback de áudio: consome `indata` e preenche `outdata` (mesmo número de amostras).
+        """
+        if not self.buffered:
+            if len(indata) != self.block_size:
+                raise ValueError(f"Bloco do host ({len(indata)}) diferente de block_size ({self.block_size}).")
+            self._in[:] = indata
+            self._run_block(self._in, outdata)
+            return
+
+        # Blocos do host de outro tamanho: entrada acumulada, saída do bloco anterior
+        n = len(indata)
+        done = 0
+        while done < n:
+            k = min(self.block_size - self._fill, n - done)
+            self._in[self._fill:self._fill + k] = indata[done:done + k]
+            outdata[done:done + k] = self._out[self._fill:self._fill + k]
+            self._fill += k
+            done += k
+            if self._fill == self.block_size:
+                self._run_block(self._in, self._out)
+                self._fill = 0
+
+    def stats(self):
+        """
+        Estatísticas dos blocos processados: prazo (deadline_ms), tempos médio,
+        p99 e máximo (ms), carga (tempo médio / prazo), prazos perdidos e latência.
+        """
+        times = self.times[:min(self.blocks, STATS_HISTORY)]
+        return {
+            "blocks": self.blocks,
+            "block_size": self.block_size,
+            "deadline_ms": self.deadline * 1000,
+            "mean_ms": float(np.mean(times)) * 1000 if len(times) else 0.0,
+            "p99_ms": float(np.percentile(times, 99)) * 1000 if len(times) else 0.0,
+            "max_ms": self.max_time * 1000,
+            "load": float(np.mean(times)) / self.deadline if len(times) else 0.0,
+            "misses": self.misses,
+            "latency_samples": self.latency,
+            "latency_ms": self.latency / self.fs * 1000,
+        }
+
+class FakeDevice:
+    def __init__(self, fs, frames=BLOCK_SIZE, source=None, channels=None, out_channels=None, realtime=False):
+        """
+        Placa de som simulada: chama o callback a cada `frames` amostras.
+
+        Args:
+            fs: Taxa de amostragem.
+            frames: Amostras por callback (período do dispositivo).
+            source: Entrada: array (N,) / (N, C), caminho de um WAV ou None (silêncio).
+            channels: Canais da entrada (None = mono; WAVs são lidos em mono).
+            out_channels: Canais da saída (None = mono).
+            realtime: Se True, respeita o período (dorme entre callbacks, como o
+                      hardware); se False, roda o mais rápido possível.
+        """
+        self.fs = fs
+        self.frames = frames
+        self.source = source
+        self.realtime = realtime
+
+        self._indata = np.zeros((frames,) if channels is None else (frames, channels), dtype=np.float32)
+        self._outdata = np.zeros((frames,) if out_channels is None else (frames, out_channels), dtype=np.float32)
+
+        self.xruns = 0 # Callbacks que terminaram depois do período (com realtime)
+        self.late_s = 0.0 # Atraso acumulado em relação ao relógio do dispositivo
+
+    def _input_blocks(self, duration_s):
+        """Blocos de entrada de `frames` amostras (o último completado com zeros)."""
+        limit = None if duration_s is None else int(duration_s * self.fs)
+        if isinstance(self.source, str):
+            blocks = (block for _, block in iter_wav_blocks(self.source, self.frames))
+        elif self.source is not None:
+            blocks = (self.source[i:i + self.frames] for i in range(0, len(self.source), self.frames))
+        else:
+            if limit is None:
+                raise ValueError("Sem entrada: informe duration_s.")
+            blocks = itertools.repeat(self._indata[:0]) # Silêncio indefinido
+
+        produced = 0
+        for block in blocks:
+            if limit is not None and produced >= limit:
+                return
+            n = len(block)
+            self._indata[:n] = block
+            self._indata[n:] = 0.0
+            produced += self.frames
+            yield self._indata
+
+    def run(self, callback, duration_s=None, output_path=None):
+        """
+        Executa o dispositivo até o fim da entrada (ou por `duration_s` segundos).
+
+        Args:
+            callback: callback(indata, outdata), ex.: BlockScheduler.callback.
+            duration_s: Duração máxima em segundos (obrigatória sem entrada).
+            output_path: WAV onde a saída é escrita bloco a bloco; se None, a
+                         saída é devolvida como array.
+        Returns:
+            Array com a saída, ou o número de amostras escritas em `output_path`.
+        """
+        writer = None
+        if output_path is not None:
+            writer = WavWriter(output_path, self.fs, channels=1 if self._outdata.ndim == 1 else self._outdata.shape[1])
+        chunks = []
+        written = 0
+        period = self.frames / self.fs
+        next_time = time.perf_counter()
+
+        try:
+            for indata in self._input_blocks(duration_s):
+                callback(indata, self._outdata)
+
+                if writer is not None:
+                    writer.write(self._outdata)
+                else:
+                    chunks.append(self._outdata.copy())
+                written += self.frames
+
+                if self.realtime:
+                    next_time += period
+                    now = time.perf_counter()
+                    if now > next_time:
+                        # O callback passou do período: o hardware teria tocado um buraco (xrun)
+                        self.xruns += 1
+                        self.late_s += now - next_time
+                        next_time = now
+                    else:
+                        time.sleep(next_time - now)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is not None:
+            return written
+        return np.concatenate(chunks) if chunks else np.zeros((0,) + self._outdata.shape[1:], dtype=np.float32)
+
+def device_rate(device=None):
+    """Taxa de amostragem padrão do dispositivo de entrada do sounddevice (None = padrão)."""
+    try:
+        import sounddevice as sd
+    except ImportError:
+        raise ImportError("O pacote sounddevice é necessário para o modo ao vivo.")
+    return int(sd.query_devices(device, kind="input")["default_samplerate"])
+
+def run_live(scheduler, duration_s, device=None):
+    """
+    Roda o scheduler na placa de som real (requer o pacote `sounddevice`).
+
+    Args:
+        scheduler: BlockScheduler (a entrada e a saída do dispositivo usam os
+                   canais do scheduler).
+        duration_s: Duração em segundos.
+        device: Dispositivo do sounddevice (None = padrão).
+    """
+    try:
+        import sounddevice as sd
+    except ImportError:
+        raise ImportError("O pacote sounddevice é necessário para o modo ao vivo.")
+
+    def callback(indata, outdata, frames, time_info, status):
+        if status:
+            logger.warning(f" > Dispositivo: {status}")
+        scheduler.callback(indata if scheduler.channels else indata[:, 0],
+                           outdata if scheduler.out_channels else outdata[:, 0])
+
+    with sd.Stream(samplerate=scheduler.fs, blocksize=scheduler.block_size, dtype="float32", device=device,
+                   channels=(scheduler.channels or 1, scheduler.out_channels or 1), callback=callback):
+        sd.sleep(int(duration_s * 1000))
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa uma cadeia de efeitos em modo ao vivo (blocos fixos).")
+    parser.add_argument("task", help="Nome da tarefa na especificação")
+    parser.add_argument("--spec", default="specs/final_effects.json")
+    parser.add_argument("--input", default="audio_files/original.wav", help="WAV de entrada do dispositivo simulado")
+    parser.add_argument("--output", help="WAV de saída (dispositivo simulado)")
+    parser.add_argument("--block", type=int, default=BLOCK_SIZE, help="Tamanho do bloco do scheduler")
+    parser.add_argument("--frames", type=int, help="Amostras por callback do dispositivo (padrão: --block)")
+    parser.add_argument("--duration", type=float, help="Duração máxima em segundos")
+    parser.add_argument("--realtime", action="store_true", help="Respeita o período do dispositivo simulado")
+    parser.add_argument("--live", action="store_true", help="Usa a placa de som real (sounddevice)")
+    parser.add_argument("--rate", type=int, help="Taxa de amostragem no modo --live (padrão: a do dispositivo)")
+    parser.add_argument("--root-from", help="WAV de onde detectar a raiz \"auto\" no modo --live")
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    task = next(t for t in spec["tasks"] if t["name"] == args.task)
+    if args.live and uses_auto_root(task["chain"]) and not args.root_from:
+        parser.error(f"A tarefa '{args.task}' usa raiz \"auto\": no modo --live, informe --root-from.")
+    if args.live:
+        fs = args.rate or device_rate()
+    else:
+        fs = wav_info(args.input)[0]
+
+    chain = build_chain(task["chain"], fs, spec["presets"], source=args.root_from if args.live else args.input)
+    frames = args.frames or args.block
+    scheduler = BlockScheduler(chain, fs, args.block, host_block=frames)
+    scheduler.warmup()
+
+    logger.info(f"--- Ao vivo: {args.task}, bloco {args.block} ({scheduler.deadline * 1000:.2f} ms), "
+                f"latência {scheduler.latency} amostras ---")
+
+    if args.live:
+        run_live(scheduler, args.duration or 10.0)
+    else:
+        device = FakeDevice(fs, frames, args.input, out_channels=scheduler.out_channels, realtime=args.realtime)
+        device.run(scheduler.callback, args.duration, args.output)
+        if args.realtime:
+            logger.info(f" > Dispositivo: {device.xruns} xrun(s), atraso total {device.late_s * 1000:.1f} ms")
+
+    s = scheduler.stats()
+    logger.info(f" > {s['blocks']} blocos: médio {s['mean_ms']:.3f} ms, p99 {s['p99_ms']:.3f} ms, "
+                f"máx {s['max_ms']:.3f} ms (prazo {s['deadline_ms']:.3f} ms, carga {s['load']:.0%})")
+    logger.info(f" > Prazos perdidos: {s['misses']}, latência {s['latency_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
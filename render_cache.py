@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import inspect
+import numpy as np
+from effects import dynamics
+from instrumentation import get_logger, default_profiler
+
+logger = get_logger(__name__)
+
+# Cache em disco das saídas dos efeitos, endereçado pelo conteúdo:
+# chave = sha256(áudio de entrada + efeito + parâmetros normalizados).
+# Cada resultado é um .npy float32, carregado de volta mapeado em memória.
+# Desabilite com RENDER_CACHE=off (ou `enabled=False`) para sempre renderizar.
+
+CACHE_DIR = "output/cache"
+MAX_BYTES = 2 * 1024 ** 3 # Orçamento total do cache (2 GB)
+
+# Incrementar quando a saída dos efeitos mudar, invalidando as entradas antigas
+CACHE_VERSION = 2
+
+ENABLED = os.environ.get("RENDER_CACHE", "").lower() not in ("0", "off", "false")
+
+def audio_digest(audio):
+    """sha256 do áudio (forma, tipo e amostras). Calcule uma vez e reutilize nas chaves."""
+    audio = np.ascontiguousarray(audio)
+    h = hashlib.sha256(f"{audio.shape}{audio.dtype.str}".encode())
+    h.update(memoryview(audio).cast("B"))
+    return h.hexdigest()
+
+def _normalize(value):
+    """Converte os parâmetros para uma forma canônica serializável em JSON."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return {"ndarray": audio_digest(value)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value) # 0.5 == 0.50 e 1.0 == 1 geram a mesma chave
+    return value
+
+def make_key(digest, effect, params):
+    """
+    Chave do cache para um áudio (digest), um efeito (nome) e seus parâmetros.
+
+    Args:
+        digest: Resultado de audio_digest() do áudio de entrada.
+        effect: Identificador do efeito (ex.: "effects.reverb.apply_reverb").
+        params: Dict com os parâmetros do efeito.
+    """
+    # A política de nível da saída (effects.dynamics) também muda o resultado
+    payload = json.dumps([CACHE_VERSION, dynamics.NORMALIZATION, digest, effect, _normalize(params)],
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RenderCache:
+    def __init__(self, folder=CACHE_DIR, max_bytes=MAX_BYTES, enabled=None):
+        """
+        Cache em disco de renders (.npy float32) com despejo LRU pelo tamanho total.
+
+        O "último uso" de cada entrada é o mtime do arquivo, atualizado a cada
+        acerto; quando o total passa de `max_bytes`, as entradas usadas há mais
+        tempo são apagadas.
+
+        Args:
+            folder: Pasta dos arquivos do cache.
+            max_bytes: Tamanho máximo total em bytes.
+            enabled: False ignora o cache (nada é lido nem escrito). Padrão: ENABLED.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.enabled = ENABLED if enabled is None else enabled
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.npy")
+
+    def get(self, key):
+        """Retorna o resultado em cache (memmap somente leitura) ou None."""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            data = np.load(path, mmap_mode="r")
+            os.utime(path) # Marca como usado recentemente (LRU)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return data
+
+    def put(self, key, data):
+        """Salva um resultado (como float32) e aplica o limite de tamanho. Retorna o array salvo."""
+        data = np.asarray(data, dtype=np.float32)
+        if not self.enabled:
+            return data
+
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+
+        # Escrita atômica: um processo concorrente nunca vê um .npy incompleto
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+
+        self.evict()
+        return data
+
+    def evict(self):
+        """Apaga as entradas menos usadas até o total caber em `max_bytes`."""
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.folder, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass # Já removido por outro processo
+            total -= size
+
+    def clear(self):
+        """Remove todas as entradas do cache."""
+        if os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.folder, name))
+
+    def render(self, effect, params, digest, render_fn):
+        """
+        Retorna o resultado em cache para (digest, effect, params) ou chama
+        `render_fn()`, salva e retorna o resultado.
+        """
+        key = make_key(digest, effect, params)
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f" > Cache: {effect} ({key[:12]})")
+            default_profiler.event("cache_hit", effect=effect, key=key[:12])
+            return cached
+        return self.put(key, render_fn())
+
+    def call(self, fn, audio, *args, digest=None, **kwargs):
+        """
+        Executa fn(audio, *args, **kwargs) através do cache.
+
+        Os argumentos são associados à assinatura de `fn` (com os valores padrão),
+        então chamadas posicionais e nomeadas equivalentes usam a mesma entrada.
+        Argumentos que só afetam mensagens (print_info) não entram na chave.
+
+        Args:
+            fn: Função do efeito, com o áudio como primeiro argumento.
+            audio: Áudio de entrada.
+            digest: audio_digest(audio), se já calculado.
+        """
+        bound = inspect.signature(fn).bind(audio, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(list(bound.arguments.items())[1:])
+        params.pop("print_info", None)
+
+        effect = f"{fn.__module__}.{fn.__qualname__}"
+        digest = digest or audio_digest(audio)
+        return self.render(effect, params, digest, lambda: fn(audio, *args, **kwargs))
+
+# Cache padrão compartilhado pelos scripts
+default_cache = RenderCache()
+
+def cached_call(fn, audio, *args, **kwargs):
+    """Atalho para default_cache.call (ver RenderCache.call)."""
+    return default_cache.call(fn, audio, *args, **kwargs)
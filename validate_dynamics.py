@@ -0,0 +1,56 @@
+import numpy as np
+from file_manager import AudioManager
+from effects.dynamics import LookaheadLimiter, limit
+
+# Verifica o LookaheadLimiter: a saída nunca passa do teto (com e sem detecção de
+# true peak) e não depende da divisão em blocos.
+
+CEILINGS = [1.0, 0.5]
+CHUNK_SIZE = 333 # Bloco "estranho" para testar a continuidade do estado
+TOLERANCE = 1e-6 # Diferença máxima entre o processamento em blocos e de uma vez (arredondamento float32)
+EXCERPT_S = 5.0
+
+def test_signals(audio, fs):
+    """Sinais de teste: impulso isolado, ruído com picos e o áudio seco amplificado."""
+    rng = np.random.default_rng(0)
+
+    impulse = np.zeros(fs, dtype=np.float32)
+    impulse[1000] = 5.0
+
+    spikes = (0.3 * rng.standard_normal(fs)).astype(np.float32)
+    spikes[rng.integers(0, fs, 8)] = rng.uniform(-5.0, 5.0, 8)
+
+    dry = np.array(audio[:int(EXCERPT_S * fs)], dtype=np.float32)
+    dry *= 4.0 / max(np.max(np.abs(dry)), 1e-12)
+
+    return {"Impulso": impulse, "Ruído com picos": spikes, "Áudio seco (+12 dB)": dry}
+
+def main():
+    manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL")
+    fs, audio = manager.get_dry_audio()
+
+    failures = 0
+    for name, x in test_signals(audio, fs).items():
+        for true_peak in (False, True):
+            for ceiling in CEILINGS:
+                y = limit(x.copy(), fs, ceiling=ceiling, true_peak=true_peak)
+                peak = np.max(np.abs(y))
+
+                limiter = LookaheadLimiter(fs, ceiling=ceiling, true_peak=true_peak)
+                whole = limiter.process(x)
+                limiter = LookaheadLimiter(fs, ceiling=ceiling, true_peak=true_peak)
+                chunked = np.concatenate([limiter.process(x[i:i + CHUNK_SIZE])
+                                          for i in range(0, len(x), CHUNK_SIZE)])
+                err = np.max(np.abs(whole - chunked))
+
+                ok = peak <= ceiling and err < TOLERANCE
+                failures += not ok
+                print(f"{name:<20} true_peak={str(true_peak):<5} teto={ceiling:.2f} pico={peak:.4f} "
+                      f"erro_blocos={err:.2e} {'OK' if ok else 'FALHOU'}")
+
+    if failures:
+        raise SystemExit(f"{failures} caso(s) acima do teto ou dependentes dos blocos.")
+    print("\nLimitador dentro do teto em todos os casos.")
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from pitch_shift.shift_assets import shift_to_note
 import numpy as np
 
 from audio_io import save_wav
+from render_cache import cached_call
 
 def main():
     manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL") 
@@ -22,7 +23,8 @@ def main():
 
     print("Aplicando Reverb...")
     
-    processed_audio_reverb = apply_reverb(
+    processed_audio_reverb = cached_call(
+        apply_reverb,
         audio_original, 
         fs, 
         combs_ms,    
@@ -32,7 +34,8 @@ def main():
         wet_gain=0.5
     )
     
-    processed_audio_reverb_stereo = apply_reverb_stereo(
+    processed_audio_reverb_stereo = cached_call(
+        apply_reverb_stereo,
         audio_original, 
         fs, 
         combs_ms,    
@@ -0,0 +1,85 @@
+import time
+import numpy as np
+from file_manager import AudioManager
+from effects import kernels
+from effects.reverb import ReverbProcessor
+from pitch_shift.pitch_shift import PitchShiftProcessor
+
+# Compara o backend compilado (Numba) com as implementações em Python/NumPy.
+# Os kernels devem reproduzir a saída de referência dentro da tolerância de float32.
+
+TOLERANCE = 1e-5 # Erro máximo relativo ao pico da referência
+EXCERPT_S = 2.0 # Trecho usado (o backend Python é lento)
+CHUNK_SIZES = [1, 64, 1000, 4096] # Divisão em blocos para testar a continuidade do estado
+
+def run_chunked(processor, x):
+    """Processa `x` em blocos de tamanhos variados."""
+    out = []
+    start = 0
+    i = 0
+    while start < len(x):
+        n = CHUNK_SIZES[i % len(CHUNK_SIZES)]
+        out.append(processor.process(x[start:start + n]))
+        start += n
+        i += 1
+    return np.concatenate(out)
+
+def render(make_processor, x, backend, chunked=False):
+    """Renderiza com o backend indicado e retorna (saída, tempo em s)."""
+    previous = kernels.BACKEND
+    kernels.BACKEND = backend
+    try:
+        processor = make_processor()
+        t0 = time.perf_counter()
+        y = run_chunked(processor, x) if chunked else processor.process(x)
+        return y, time.perf_counter() - t0
+    finally:
+        kernels.BACKEND = previous
+
+def main():
+    if kernels.BACKEND != "numba":
+        print("Numba não disponível: os kernels rodam como Python puro (apenas equivalência).")
+
+    manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL")
+    fs, audio = manager.get_dry_audio()
+
+    x = np.array(audio[:int(EXCERPT_S * fs)], dtype=np.float32) # Cópia (o áudio pode ser somente leitura)
+    peak = np.max(np.abs(x))
+    if peak > 0:
+        x /= peak
+
+    processors = {
+        "Reverb (REV-HALL)": lambda: ReverbProcessor(fs, [26.84, 28.02, 45.82, 33.63], [0.758, 0.854, 0.796, 0.825],
+                                                     [2.35, 6.9], [0.653, 0.659], wet_gain=0.4),
+        "Reverb (REV-ROOM)": lambda: ReverbProcessor(fs, [419, 359, 251, 467], [0.50, 0.48, 0.56, 0.44],
+                                                     [7.06, 6.46], [0.716, 0.613], wet_gain=0.2),
+        "Pitch Shift (+4)": lambda: PitchShiftProcessor(fs, 4.0),
+        "Pitch Shift (-7)": lambda: PitchShiftProcessor(fs, -7.0),
+        "Pitch Shift (glide)": lambda: PitchShiftProcessor(fs, [[0.0, -7.0], [EXCERPT_S, 7.0]]),
+    }
+
+    failures = 0
+    for name, make_processor in processors.items():
+        # Aquecimento (compilação JIT fora da medição)
+        render(make_processor, x[:256], "numba")
+
+        y_ref, t_ref = render(make_processor, x, "python")
+        y_jit, t_jit = render(make_processor, x, "numba")
+        y_chunk, _ = render(make_processor, x, "numba", chunked=True)
+
+        scale = max(np.max(np.abs(y_ref)), 1e-12)
+        err = np.max(np.abs(y_jit - y_ref)) / scale
+        err_chunk = np.max(np.abs(y_chunk - y_ref)) / scale
+        ok = err < TOLERANCE and err_chunk < TOLERANCE
+        failures += not ok
+
+        print(f"{name:<20} erro={err:.2e} erro_blocos={err_chunk:.2e} "
+              f"python={t_ref * 1000:.1f}ms kernel={t_jit * 1000:.1f}ms "
+              f"speedup={t_ref / max(t_jit, 1e-9):.1f}x {'OK' if ok else 'FALHOU'}")
+
+    if failures:
+        raise SystemExit(f"{failures} efeito(s) fora da tolerância.")
+    print("\nTodos os kernels equivalentes à implementação de referência.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+from metrics import calculate_mse, calculate_snr, calculate_prd, compute_metrics
+
+# Verifica as métricas contra as fórmulas originais (np.mean / np.sum sobre o
+# trecho comum, align=False): sinais mono, estéreo (N, C) e pilhas (batched=True).
+# Com o alinhamento padrão, uma cópia atrasada e atenuada do sinal tem erro ~0.
+
+TOLERANCE = 1e-9 # Diferença relativa máxima
+
+def reference_metrics(original, processed):
+    """MSE, SNR e PRD pelas fórmulas originais (corte ao menor tamanho, todas as amostras)."""
+    n = min(len(original), len(processed))
+    original, processed = original[:n], processed[:n]
+    noise = np.sum((original - processed) ** 2)
+    power = np.sum(original ** 2)
+    return np.mean((original - processed) ** 2), 10 * np.log10(power / noise), np.sqrt(noise / power) * 100
+
+def close(a, b):
+    return np.allclose(a, b, rtol=TOLERANCE, atol=0.0)
+
+def main():
+    rng = np.random.default_rng(0)
+    failures = 0
+
+    cases = {
+        "Mono": (rng.standard_normal(1000), 1000),
+        "Estéreo (N, C)": (rng.standard_normal((1000, 2)), 1000),
+        "Estéreo, tamanhos diferentes": (rng.standard_normal((1200, 2)), 1000),
+    }
+    for name, (original, n) in cases.items():
+        processed = original[:n] + 0.1 * rng.standard_normal((n,) + original.shape[1:])
+        expected = reference_metrics(original, processed)
+        result = (calculate_mse(original, processed, align=False), calculate_snr(original, processed, align=False),
+                  calculate_prd(original, processed, align=False))
+        ok = close(result, expected)
+        failures += not ok
+        print(f"{name:<30} mse={result[0]:.5f} snr={result[1]:.2f}dB prd={result[2]:.2f}% "
+              f"{'OK' if ok else 'FALHOU'}")
+
+    # Alinhamento automático: atraso e ganho compensados antes das métricas
+    original = rng.standard_normal(20000)
+    delayed = np.concatenate((np.zeros(700), 0.5 * original))
+    mse = calculate_mse(original, delayed)
+    ok = mse < TOLERANCE
+    failures += not ok
+    print(f"{'Atrasado 700 amostras, -6 dB':<30} mse={mse:.2e} {'OK' if ok else 'FALHOU'}")
+
+    # Pilha de candidatos (K, N, C) contra a mesma referência: igual a K chamadas separadas
+    original = rng.standard_normal((1000, 2))
+    stack = original + rng.uniform(0.05, 0.5, (4, 1, 1)) * rng.standard_normal((4, 1000, 2))
+    batched = compute_metrics(original, stack, frame_size=256, spectral=True, align=False, batched=True)
+    single = [compute_metrics(original, row, frame_size=256, spectral=True, align=False) for row in stack]
+    ok = all(close(batched[key], [s[key] for s in single])
+             for key in ("mse", "snr", "prd", "segmental_snr", "lsd", "spectral_convergence"))
+    failures += not ok
+    print(f"{'Pilha (K, N, C)':<30} mse={np.round(batched['mse'], 4)} {'OK' if ok else 'FALHOU'}")
+
+    if failures:
+        raise SystemExit(f"{failures} caso(s) diferentes das fórmulas originais.")
+    print("\nMétricas iguais às fórmulas originais em todos os casos.")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import time
+import numpy as np
 from file_manager import AudioManager
 from audio_io import save_wav
-from pitch_shift.shift_assets import shift_to_note, shift_to_freq
+from pitch_shift.shift_assets import shift_to_note, shift_to_freq, shift_to_notes, shift_to_freqs
+from pitch_shift.detection import detect_file_root
+from pitch_shift.notes import freq_to_midi, note_name
 
 output_folder = "output"
 
@@ -8,7 +12,11 @@ def main():
     manager = AudioManager(base_folder="audio_files", dry_key="ORIGINAL") 
     fs, audio = manager.get_dry_audio()
     
-    ROOT_NOTE = "C4" 
+    # Raiz detectada no próprio arquivo (f0 por quadro, com cache por arquivo)
+    ROOT_FREQ = detect_file_root(manager.dry_path)
+    if ROOT_FREQ is None:
+        raise SystemExit(f"Não foi possível detectar a raiz de '{manager.dry_path}'.")
+    ROOT_NOTE = note_name(freq_to_midi(ROOT_FREQ)) # Nota mais próxima com o desvio em cents (ex: 'D#4-21c')
     
     # 1. Criar uma Tríade Maior (Dó - Mi - Sol)
     #note_C4 = shift_to_note(audio, fs,target_note="C4", root_note=ROOT_NOTE) # Original
@@ -30,15 +38,26 @@ def main():
     freq_432 = shift_to_freq(audio, fs, target_freq=432.0, root_freq=440.0)
     #save_wav(f"{output_folder}/freq_432.wav", fs, freq_432)
 
-    ROOT_FREQ = 261.63
+    # Todas as frequências em uma única passada (buffer compartilhado)
+    processed = shift_to_freqs(audio, fs, target_frequencies.values(), root_freq=ROOT_FREQ)
 
-    for name, freq_target in target_frequencies.items():
-        print(f"Processando: {name} ({freq_target} Hz)...")
-
-        processed_audio = shift_to_freq(audio, fs, target_freq=freq_target, root_freq=ROOT_FREQ)
-        
+    for name, processed_audio in zip(target_frequencies, processed):
         filename = f"{output_folder}/freq_{name}.wav"
         save_wav(filename, fs, processed_audio)
 
+    # 2. Conjunto cromático (12 notas): uma passada vs. 12 chamadas separadas
+    chromatic = ["C4", "C#4", "D4", "D#4", "E4", "F4", "F#4", "G4", "G#4", "A4", "A#4", "B4"]
+
+    t0 = time.perf_counter()
+    voices = shift_to_notes(audio, fs, chromatic, root_note=ROOT_NOTE)
+    t_multi = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    separate = [shift_to_note(audio, fs, target_note=note, root_note=ROOT_NOTE) for note in chromatic]
+    t_separate = time.perf_counter() - t0
+
+    error = max(np.max(np.abs(v - s)) for v, s in zip(voices, separate))
+    print(f"\nCromático: uma passada={t_multi:.3f}s, separado={t_separate:.3f}s, erro máximo={error:.2e}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
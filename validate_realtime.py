@@ -0,0 +1,72 @@
+import tracemalloc
+import numpy as np
+from realtime import BlockScheduler
+from pipeline import EffectChain
+from effects.reverb import ReverbProcessor, StereoReverbProcessor
+from effects.flanger import FlangerProcessor
+from effects.tremolo import TremoloProcessor
+from effects.dynamics import LookaheadLimiter
+from pitch_shift.pitch_shift import PitchShiftProcessor
+from effects.kernels import BACKEND
+
+# Verifica o caminho de tempo real: após o warmup (e o primeiro bloco), os blocos
+# do BlockScheduler não alocam memória do NumPy, e a saída é igual à da mesma
+# cadeia processada nos mesmos blocos sem buffers reutilizados.
+
+FS = 44100
+BLOCK_SIZE = 256
+BLOCKS = 200
+COMBS_MS, COMB_GAINS = [29.7, 37.1, 41.1, 43.7], [0.80, 0.78, 0.76, 0.74]
+ALLPASS_MS, ALLPASS_GAINS = [5.0, 1.7], [0.7, 0.7]
+
+def make_chains():
+    """Cadeias com os processadores que o scheduler executa (deslocamento fixo)."""
+    return {
+        "Mono": lambda: [PitchShiftProcessor(FS, 3.0), FlangerProcessor(FS),
+                         ReverbProcessor(FS, COMBS_MS, COMB_GAINS, ALLPASS_MS, ALLPASS_GAINS),
+                         TremoloProcessor(FS), LookaheadLimiter(FS, ceiling=0.5, true_peak=True)],
+        "Estéreo": lambda: [StereoReverbProcessor(FS, COMBS_MS, COMB_GAINS, ALLPASS_MS, ALLPASS_GAINS, spread=23),
+                            FlangerProcessor(FS, channels=2), TremoloProcessor(FS),
+                            LookaheadLimiter(FS, ceiling=0.3)],
+    }
+
+def numpy_bytes(snapshot):
+    """Bytes alocados pelo NumPy (domínio de rastreamento dos arrays) em um snapshot."""
+    domain = tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)
+    return sum(stat.size for stat in snapshot.filter_traces([domain]).statistics("filename"))
+
+def main():
+    rng = np.random.default_rng(0)
+    x = (0.5 * rng.standard_normal(BLOCKS * BLOCK_SIZE)).astype(np.float32)
+    x[len(x) // 3:2 * len(x) // 3] = 0.0 # Trecho em silêncio (cauda e detecção de silêncio da reverb)
+
+    failures = 0
+    for name, make in make_chains().items():
+        chain = EffectChain(make(), fs=FS)
+        expected = np.concatenate([chain.process(x[i:i + BLOCK_SIZE]) for i in range(0, len(x), BLOCK_SIZE)])
+
+        scheduler = BlockScheduler(make(), FS, block_size=BLOCK_SIZE)
+        scheduler.warmup()
+        out = np.zeros((len(x),) + scheduler._out.shape[1:], dtype=np.float32)
+        blocks = [(x[i:i + BLOCK_SIZE], out[i:i + BLOCK_SIZE]) for i in range(0, len(x), BLOCK_SIZE)]
+        scheduler.callback(*blocks[0]) # Cria o estado do limitador
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for block in blocks[1:]:
+            scheduler.callback(*block)
+        allocated = numpy_bytes(tracemalloc.take_snapshot()) - numpy_bytes(before)
+        tracemalloc.stop()
+
+        difference = np.max(np.abs(out - np.clip(expected, -1.0, 1.0)))
+        ok = allocated <= 0 and difference == 0.0
+        failures += not ok
+        print(f"{name:<10} alocado por bloco: {allocated / (len(blocks) - 1):.0f} B  "
+              f"diferença: {difference:.1e}  {'OK' if ok else 'FALHOU'}")
+
+    if failures:
+        raise SystemExit(f"{failures} cadeia(s) com alocação por bloco ou saída diferente (backend {BACKEND}).")
+    print(f"\nBlocos sem alocação e saída igual sem buffers reutilizados (backend {BACKEND}).")
+
+if __name__ == "__main__":
+    main()